@@ -0,0 +1,118 @@
+"""
+Cost-aware admission control for the synchronous measurement endpoints.
+
+Each request's service time is estimated from its stages: decoding, which
+scales with the image's pixel count, and the pipeline itself, both tracked
+as exponentially weighted moving averages of observed latencies. Work that
+has been admitted but not finished forms a per-pipeline backlog; a request
+is expected to finish after that backlog drains (at the lane's concurrency)
+plus its own service time. If that is past the pipeline's deadline, the
+request is rejected right away with 429 and a Retry-After of roughly how
+long the backlog needs to drain far enough, so accepted requests still
+finish quickly instead of every request timing out in a growing queue.
+
+Configuration (environment):
+    ADMISSION_DIRECT_DEADLINE_S   Latency budget for /measure_person (default 10; 0 = admit all)
+    ADMISSION_SAM2_DEADLINE_S     Latency budget for /measure_person_sam2 (default 60; 0 = admit all)
+"""
+
+import math
+import os
+import threading
+
+# Starting estimates until latencies have been observed
+PRIOR_PIPELINE_S = {"direct": 1.0, "sam2": 6.0}
+PRIOR_DECODE_S_PER_MPX = 0.02
+DEFAULT_DEADLINES_S = {"direct": 10.0, "sam2": 60.0}
+
+
+class Overloaded(Exception):
+    """Request refused because it would miss its deadline; carries the Retry-After."""
+
+    def __init__(self, retry_after_s: int, detail: str):
+        super().__init__(detail)
+        self.retry_after_s = retry_after_s
+        self.detail = detail
+
+
+class AdmissionController:
+    """Estimates request cost and admits or rejects against per-pipeline deadlines."""
+
+    def __init__(self, deadlines_s, concurrency, alpha=0.2):
+        self.deadlines_s = dict(deadlines_s)
+        self.concurrency = dict(concurrency)
+        self.alpha = alpha
+        self.pipeline_s = dict(PRIOR_PIPELINE_S)
+        self.decode_s_per_mpx = PRIOR_DECODE_S_PER_MPX
+        self.backlog_s = {name: 0.0 for name in self.deadlines_s}
+        self.in_progress = {name: 0 for name in self.deadlines_s}
+        self.admitted = {name: 0 for name in self.deadlines_s}
+        self.rejected = {name: 0 for name in self.deadlines_s}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, concurrency):
+        deadlines = {
+            name: float(os.environ.get(f"ADMISSION_{name.upper()}_DEADLINE_S", str(default)))
+            for name, default in DEFAULT_DEADLINES_S.items()
+        }
+        return cls(deadlines, concurrency)
+
+    def _ewma(self, old, new):
+        return old + self.alpha * (new - old)
+
+    def observe_decode(self, seconds, pixels):
+        if pixels > 0:
+            with self._lock:
+                self.decode_s_per_mpx = self._ewma(self.decode_s_per_mpx, seconds / (pixels / 1e6))
+
+    def observe_pipeline(self, pipeline, seconds):
+        with self._lock:
+            self.pipeline_s[pipeline] = self._ewma(self.pipeline_s.get(pipeline, seconds), seconds)
+
+    def estimate(self, pipeline, pixels):
+        """Expected service time in seconds for one request."""
+        return self.decode_s_per_mpx * pixels / 1e6 + self.pipeline_s.get(pipeline, 0.0)
+
+    def admit(self, pipeline, pixels, deadline_s=None):
+        """Admit a request or raise Overloaded; returns the cost to pass to ``release``."""
+        deadline_s = self.deadlines_s.get(pipeline, 0.0) if deadline_s is None else deadline_s
+        with self._lock:
+            cost = self.estimate(pipeline, pixels)
+            wait_s = self.backlog_s.get(pipeline, 0.0) / max(1, self.concurrency.get(pipeline, 1))
+            finish_s = wait_s + cost
+            # With nothing ahead, waiting would not help: admit and let the deadline cut it short
+            if deadline_s > 0 and wait_s > 0 and finish_s > deadline_s:
+                self.rejected[pipeline] = self.rejected.get(pipeline, 0) + 1
+                raise Overloaded(
+                    max(1, math.ceil(finish_s - deadline_s)),
+                    f"Server busy: {pipeline} request would take ~{finish_s:.1f}s "
+                    f"(limit {deadline_s:.0f}s)",
+                )
+            self.backlog_s[pipeline] = self.backlog_s.get(pipeline, 0.0) + cost
+            self.in_progress[pipeline] = self.in_progress.get(pipeline, 0) + 1
+            self.admitted[pipeline] = self.admitted.get(pipeline, 0) + 1
+            return cost
+
+    def release(self, pipeline, cost):
+        """An admitted request finished (successfully or not)."""
+        with self._lock:
+            self.in_progress[pipeline] -= 1
+            # Reset when idle so estimate drift cannot accumulate in the backlog
+            remaining = self.backlog_s[pipeline] - cost
+            self.backlog_s[pipeline] = max(0.0, remaining) if self.in_progress[pipeline] else 0.0
+
+    def stats(self):
+        with self._lock:
+            pipelines = {
+                name: {
+                    "deadline_s": self.deadlines_s[name],
+                    "admitted": self.admitted[name],
+                    "rejected": self.rejected[name],
+                    "in_progress": self.in_progress[name],
+                    "backlog_s": round(self.backlog_s[name], 2),
+                    "estimated_service_s": round(self.pipeline_s.get(name, 0.0), 3),
+                }
+                for name in self.deadlines_s
+            }
+            return {"pipelines": pipelines, "decode_s_per_mpx": round(self.decode_s_per_mpx, 4)}
@@ -0,0 +1,72 @@
+"""
+Headless annotation renderer (OpenCV only, no matplotlib).
+
+Draws landmarks, measurement lines and an optional segmentation mask overlay
+on a reduced-size copy of the image and encodes it once to JPEG or WebP, so
+the API can attach a small visual QA preview to a response.
+"""
+
+import cv2
+import numpy as np
+
+ENCODINGS = {
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+MASK_COLOR = np.array([255, 144, 30], dtype=np.float32)  # BGR
+
+
+def render_annotation(image, landmarks_px=(), lines=(), mask=None, labels=(),
+                      fmt="jpeg", max_side=640, quality=80):
+    """Render an annotated preview and return the encoded bytes.
+
+    Parameters
+    ----------
+    image : np.ndarray
+        BGR image the coordinates refer to (not modified).
+    landmarks_px : iterable of (x, y)
+        Landmark positions in ``image`` pixel coordinates.
+    lines : iterable of ((x1, y1), (x2, y2))
+        Measurement lines (shoulders, hips, torso slices) in pixel coordinates.
+    mask : np.ndarray, optional
+        Boolean person mask with the same height/width as ``image``.
+    labels : iterable of str
+        Text lines drawn in the top-left corner.
+    fmt : str
+        "jpeg" or "webp".
+    max_side : int
+        Longest side of the preview; the image is downscaled before drawing.
+    quality : int
+        Encoder quality (0-100).
+    """
+    if fmt not in ENCODINGS:
+        raise ValueError(f"Unsupported annotation format: {fmt}")
+
+    h, w = image.shape[:2]
+    scale = min(1.0, max_side / float(max(h, w)))
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    canvas = cv2.resize(image, size, interpolation=cv2.INTER_AREA) if scale < 1.0 else image.copy()
+
+    if mask is not None:
+        small_mask = cv2.resize(mask.astype(np.uint8), size, interpolation=cv2.INTER_NEAREST).astype(bool)
+        region = canvas[small_mask].astype(np.float32)
+        canvas[small_mask] = (0.6 * region + 0.4 * MASK_COLOR).astype(np.uint8)
+
+    def pt(p):
+        return int(round(p[0] * scale)), int(round(p[1] * scale))
+
+    thickness = max(1, round(2 * max(size) / 640))
+    for p1, p2 in lines:
+        cv2.line(canvas, pt(p1), pt(p2), (0, 255, 255), thickness)
+    for p in landmarks_px:
+        cv2.circle(canvas, pt(p), thickness + 2, (0, 255, 0), -1)
+    for i, text in enumerate(labels):
+        cv2.putText(canvas, text, (10, 25 + 25 * i), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.6, (0, 255, 0), 2)
+
+    ext, quality_flag = ENCODINGS[fmt]
+    ok, encoded = cv2.imencode(ext, canvas, [quality_flag, int(quality)])
+    if not ok:
+        raise RuntimeError(f"Failed to encode annotation as {fmt}")
+    return encoded.tobytes()
@@ -5,51 +5,111 @@ Provides two measurement endpoints:
 1. /measure_person - Direct MediaPipe measurement
 2. /measure_person_sam2 - SAM2 segmentation + MediaPipe measurement
 
+Long-running measurements can also be submitted as jobs:
+3. POST /jobs - enqueue a measurement, returns a job id immediately
+4. GET /jobs/{job_id} - poll (or long-poll with ?wait=) for the result
+
 Usage:
     uvicorn api:app --reload --host 0.0.0.0 --port 8000
 """
 
+import asyncio
+import base64
+import hashlib
 import io
+import os
 import sys
+import time
+import uuid
 from typing import Optional
 from contextlib import asynccontextmanager
 import cv2
 import numpy as np
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, Header, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
 # Pre-download pose model at startup to avoid timeouts
-from measure_person import create_pose_landmarker
+from measure_person import pose_model_path
+
+# Import measurement pipelines
+from pipelines import PIPELINES, SAM2_AVAILABLE, rescale_result
+from coalescing import SingleFlight
+from lanes import LaneScheduler
+from admission import AdmissionController, Overloaded
+from deadlines import AbortStats, Deadline, DeadlineExceeded, RequestAborted
+from quality_gate import get_quality_gate
+from job_queue import JobQueue, JobWorker
+from debug_sink import get_debug_sink
+from image_ingest import MAX_UPLOAD_BYTES, UploadRejected, iter_upload, read_limited
+from traffic_capture import TrafficCapture
+
+if SAM2_AVAILABLE:
+    from model_lifecycle import ModelLifecycle
+
+# Opt-in traffic capture (enabled by CAPTURE_DIR, see traffic_capture.py)
+traffic_capture = TrafficCapture.from_env()
+
+# Identical concurrent uploads share one pipeline run
+single_flight = SingleFlight()
+
+# Per-pipeline worker lanes, so SAM2 bursts cannot starve the direct path (see lanes.py)
+lane_scheduler = LaneScheduler.from_env()
+
+# Rejects requests that would miss their latency budget with 429 (see admission.py)
+admission = AdmissionController.from_env(
+    {name: lane_scheduler.capacity(name) for name in lane_scheduler.lanes}
+)
+
+# Deadlines of the computations in flight, by coalescing key (see deadlines.py)
+computation_deadlines = {}
+abort_stats = AbortStats()
 
-# Global pose landmarker instance (created at startup)
-pose_landmarker = None
+# How often a waiting request checks whether its client is still connected
+DISCONNECT_POLL_S = 0.5
+
+# Persistent job queue and its worker threads (started in lifespan)
+job_queue = None
+job_workers = []
+
+# Unloads SAM2 when idle / over the memory budget (see model_lifecycle.py)
+model_lifecycle = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
-    global pose_landmarker
+    global job_queue, model_lifecycle
     print("🔄 Downloading MediaPipe pose model at startup...")
     try:
-        pose_landmarker = create_pose_landmarker()
-        print("✅ Pose model loaded successfully")
+        # Landmarkers are created per worker thread on first use (see measure_person.py)
+        pose_model_path()
+        print("✅ Pose model ready")
     except Exception as e:
         print(f"⚠️  Failed to load pose model: {e}")
-    yield
-    print("🛑 Shutting down...")
 
-# Import measurement functions
-from measure_person import measure_person as measure_person_basic
+    job_queue = JobQueue.from_env()
+    loop = asyncio.get_running_loop()
+
+    def execute_job(pipeline, img, height_cm):
+        return asyncio.run_coroutine_threadsafe(run_job(pipeline, img, height_cm), loop).result()
+
+    for i in range(int(os.environ.get("JOB_WORKERS", "1"))):
+        worker = JobWorker(job_queue, execute_job, image_to_cv2, name=f"job-worker-{i}")
+        worker.start()
+        job_workers.append(worker)
+    print(f"✅ Job queue at {job_queue.path} ({len(job_workers)} worker(s))")
 
-# Try to import SAM2 functions (optional)
-try:
-    from measure_person_sam2 import segment_person_sam2, measure_person_image
-    SAM2_AVAILABLE = True
-except ImportError:
-    print("⚠️  SAM2 not available - SAM2 endpoints will return error")
-    SAM2_AVAILABLE = False
-    segment_person_sam2 = None
-    measure_person_image = None
+    if SAM2_AVAILABLE:
+        model_lifecycle = ModelLifecycle.from_env()
+        model_lifecycle.start()
+    yield
+    print("🛑 Shutting down...")
+    if model_lifecycle is not None:
+        model_lifecycle.stop()
+    for worker in job_workers:
+        worker.stop()
+    job_queue.close()
+    lane_scheduler.shutdown()
 
 app = FastAPI(
     title="Person Measurement API",
@@ -58,6 +118,77 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Allowance for multipart boundaries and form fields on top of the image itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+class BodyTooLarge(Exception):
+    """Raised from ``receive`` once a request body passes the upload limit."""
+
+class RejectOversizedBodies:
+    """Refuse bodies larger than the upload limit before they are parsed or spooled.
+
+    A declared Content-Length is checked up front; bodies without one (chunked
+    uploads) are counted as they are received and cut off with 413 as soon as
+    they pass the limit.
+
+    Plain ASGI rather than ``@app.middleware("http")``: BaseHTTPMiddleware hides
+    client disconnects from ``request.is_disconnected()``.
+    """
+
+    limit = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+
+    def __init__(self, app):
+        self.app = app
+
+    async def reject(self, scope, receive, send):
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"Upload exceeds {MAX_UPLOAD_BYTES} bytes"}
+        )
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.limit:
+            await self.reject(scope, receive, send)
+            return
+
+        received = 0
+        too_large = False
+        response_started = False
+
+        async def counting_receive():
+            nonlocal received, too_large
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.limit:
+                    too_large = True
+                    raise BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            # Form parsing turns the exception into its own 400; answer 413 instead
+            if too_large and not response_started:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, guarded_send)
+        except BodyTooLarge:
+            if response_started:
+                raise
+        if too_large and not response_started:
+            await self.reject(scope, receive, send)
+
+app.add_middleware(RejectOversizedBodies)
+
 class MeasurementResponse(BaseModel):
     ok: bool
     error: Optional[str] = None
@@ -70,6 +201,29 @@ class MeasurementResponse(BaseModel):
     torso_slice_widths_cm: Optional[list] = None
     slice_fracs: Optional[list] = None
     visibility: Optional[dict] = None
+    annotated_image: Optional[str] = None  # base64, only when requested via `annotate`
+    annotated_image_format: Optional[str] = None
+    person_mask_rle: Optional[dict] = None  # COCO RLE, only when requested via `return_mask`
+    pose_roi: Optional[list] = None  # [x0, y0, x1, y1], only with two-stage pose inference (POSE_ROI=1)
+    quality: Optional[dict] = None  # quality gate verdict, reasons and metrics (see quality_gate.py)
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    pipeline: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    expires_at: Optional[float] = None
+    result: Optional[MeasurementResponse] = None
+    error: Optional[str] = None
+
+async def read_upload(file: UploadFile):
+    """Read an upload in chunks, enforcing byte and pixel limits from the header."""
+    try:
+        return await read_limited(iter_upload(file))
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 def image_to_cv2(image_bytes: bytes) -> np.ndarray:
     """Convert uploaded image bytes to OpenCV format."""
@@ -79,116 +233,386 @@ def image_to_cv2(image_bytes: bytes) -> np.ndarray:
         raise HTTPException(status_code=400, detail="Invalid image format")
     return img
 
+ANNOTATION_FORMATS = ("jpeg", "webp")
+
+def check_annotate(annotate: Optional[str]):
+    if annotate is not None and annotate not in ANNOTATION_FORMATS:
+        raise HTTPException(status_code=400, detail=f"annotate must be one of {ANNOTATION_FORMATS}")
+
+def request_timeout(pipeline: str, x_request_timeout: Optional[float]) -> Optional[float]:
+    """Seconds the client will wait: the X-Request-Timeout header, else the pipeline's default budget."""
+    if x_request_timeout is not None:
+        if x_request_timeout <= 0:
+            raise HTTPException(status_code=400, detail="X-Request-Timeout must be positive")
+        return x_request_timeout
+    return admission.deadlines_s.get(pipeline) or None
+
+async def watch_disconnect(request: Request, on_disconnect):
+    """Call ``on_disconnect()`` when this request's client goes away."""
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_S)
+    on_disconnect()
+
+async def measure_coalesced(pipeline: str, image_bytes: bytes, height_cm: float, pixels: int = 0,
+                            annotate: Optional[str] = None, return_mask: bool = False,
+                            timeout_s: Optional[float] = None, request: Optional[Request] = None) -> dict:
+    """Run a pipeline in its lane off the event loop, sharing work with identical in-flight uploads.
+
+    Requests are keyed by image content hash and pipeline; a request that joins
+    another's computation gets the result rescaled to its own height. Annotated
+    previews have the height printed on them, so those only coalesce at equal height.
+    A request that starts a new computation must first pass admission control
+    (429 with Retry-After when it would miss its deadline); joining is free.
+
+    Each request waits at most its own ``timeout_s`` (504), even when a
+    joiner with a longer budget keeps the shared computation going. The
+    computation stops at the next stage boundary once every waiting client's
+    ``timeout_s`` has passed or every client has disconnected.
+    """
+    key = (hashlib.sha256(image_bytes).hexdigest(), pipeline)
+    if annotate:
+        key += (annotate, height_cm)
+    if return_mask:
+        key += ("mask",)
+
+    deadline = computation_deadlines.get(key)
+    if deadline is not None and not deadline.add_waiter():
+        # It already stopped at a stage boundary and is unwinding: start a fresh one beside it
+        key += (uuid.uuid4().hex,)
+        deadline = None
+    if deadline is None:
+        deadline = Deadline(timeout_s)
+        deadline.add_waiter()
+        computation_deadlines[key] = deadline
+    else:
+        deadline.extend(timeout_s)  # joiners keep the shared computation alive for their own budget
+
+    left = False
+
+    def leave():
+        nonlocal left
+        if not left:
+            left = True
+            deadline.waiter_disconnected()
+
+    def compute():
+        deadline.check("queued")
+        t = time.perf_counter()
+        img = image_to_cv2(image_bytes)
+        admission.observe_decode(time.perf_counter() - t, pixels)
+        t = time.perf_counter()
+        result = PIPELINES[pipeline](img, height_cm, annotate=annotate, return_mask=return_mask,
+                                     deadline=deadline)
+        # Quality gate rejections skip inference and would drag the service estimate down
+        if not result.get("quality", {}).get("rejected"):
+            admission.observe_pipeline(pipeline, time.perf_counter() - t)
+        return result, height_cm
+
+    async def admitted_compute():
+        try:
+            remaining = deadline.remaining()
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded("admission")
+            try:
+                cost = admission.admit(pipeline, pixels, deadline_s=remaining or 0.0)
+            except Overloaded as e:
+                raise HTTPException(status_code=429, detail=e.detail,
+                                    headers={"Retry-After": str(e.retry_after_s)})
+            try:
+                return await lane_scheduler.run(pipeline, compute)
+            finally:
+                admission.release(pipeline, cost)
+        finally:
+            del computation_deadlines[key]
+
+    # The computation runs in its own task, so a request that gives up on its
+    # own budget does not cancel work that other requests are waiting for
+    flight, _ = single_flight.start(key, admitted_compute)
+    watcher = asyncio.create_task(watch_disconnect(request, leave)) if request is not None else None
+    try:
+        result, computed_height_cm = await asyncio.wait_for(asyncio.shield(flight), timeout_s)
+    except asyncio.TimeoutError:
+        leave()
+        e = DeadlineExceeded("result")
+        abort_stats.record(e)
+        raise HTTPException(status_code=504, detail=str(e))
+    except asyncio.CancelledError:
+        leave()
+        raise
+    except RequestAborted as e:
+        abort_stats.record(e)
+        # 499: client closed the request (nginx convention); nobody reads it anyway
+        status_code = 504 if isinstance(e, DeadlineExceeded) else 499
+        raise HTTPException(status_code=status_code, detail=str(e))
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+    result = rescale_result(result, computed_height_cm, height_cm)
+    if result.get("annotated_image") is not None:
+        result = dict(result)
+        result["annotated_image"] = base64.b64encode(result["annotated_image"]).decode("ascii")
+    return result
+
+async def run_job(pipeline: str, img: np.ndarray, height_cm: float) -> dict:
+    """Run a queued job in its pipeline's lane, counted in the admission backlog.
+
+    Jobs have no client waiting on a deadline, so they are always admitted,
+    but synchronous requests see the work they add ahead of them.
+    """
+    cost = admission.admit(pipeline, img.shape[0] * img.shape[1], deadline_s=0.0)
+    try:
+        t = time.perf_counter()
+        result = await lane_scheduler.run(pipeline, lambda: PIPELINES[pipeline](img, height_cm))
+        if not result.get("quality", {}).get("rejected"):
+            admission.observe_pipeline(pipeline, time.perf_counter() - t)
+        return result
+    finally:
+        admission.release(pipeline, cost)
+
+def job_to_response(job: dict) -> JobResponse:
+    fields = {k: v for k, v in job.items() if k not in ("id", "height_cm")}
+    return JobResponse(job_id=job["id"], **fields)
+
+ENDPOINTS = {"direct": "/measure_person", "sam2": "/measure_person_sam2"}
+
+# Content types accepted by the raw-body endpoints
+RAW_CONTENT_TYPES = ("application/octet-stream", "image/jpeg", "image/png", "image/webp", "image/bmp")
+
+def require_sam2():
+    if not SAM2_AVAILABLE:
+        raise HTTPException(
+            status_code=503,
+            detail="SAM2 is not available on this deployment. Use /measure_person endpoint instead."
+        )
+    # Start (re)loading SAM2 while the upload is read, if it was unloaded
+    model_lifecycle.note_demand()
+
+async def measure_upload(request: Request, pipeline: str, image_bytes, info, height_cm: float,
+                         arrival_time: float, annotate: Optional[str] = None, return_mask: bool = False,
+                         x_request_timeout: Optional[float] = None,
+                         x_replay: Optional[str] = None) -> MeasurementResponse:
+    """Shared tail of the multipart and raw-body endpoints, after the image has been read."""
+    if traffic_capture is not None and x_replay is None:
+        # Written by a background thread; a slow or full disk never affects the request
+        traffic_capture.submit(ENDPOINTS[pipeline], image_bytes, height_cm, arrival_time)
+
+    try:
+        result = await measure_coalesced(pipeline, image_bytes, height_cm, pixels=info.pixels,
+                                         annotate=annotate, return_mask=return_mask, request=request,
+                                         timeout_s=request_timeout(pipeline, x_request_timeout))
+
+        return MeasurementResponse(**result)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        label = "SAM2 measurement" if pipeline == "sam2" else "Measurement"
+        raise HTTPException(status_code=500, detail=f"{label} failed: {str(e)}")
+
+async def read_raw_body(request: Request):
+    """Read a raw image body with the same limits as multipart uploads, without multipart parsing."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in RAW_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail=f"Content-Type must be one of {RAW_CONTENT_TYPES}")
+    try:
+        return await read_limited(request.stream())
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+def raw_height(height_cm: Optional[float], x_height_cm: Optional[float]) -> float:
+    height = height_cm if height_cm is not None else x_height_cm
+    if height is None:
+        raise HTTPException(status_code=400, detail="height_cm query parameter or X-Height-Cm header is required")
+    return height
+
 @app.post("/measure_person", response_model=MeasurementResponse)
 async def measure_person_endpoint(
+    request: Request,
     file: UploadFile = File(...),
-    height_cm: float = Form(..., description="Known subject height in centimeters")
+    height_cm: float = Form(..., description="Known subject height in centimeters"),
+    annotate: Optional[str] = Form(None, description="'jpeg' or 'webp' to attach an annotated preview"),
+    x_request_timeout: Optional[float] = Header(None, description="Seconds the client will wait"),
+    x_replay: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Measure person dimensions using MediaPipe Pose directly.
 
     - **file**: Image file (JPEG, PNG, etc.)
     - **height_cm**: Known height of the person in centimeters
+    - **annotate**: Optional `jpeg`/`webp`; returns a base64 preview with landmarks and slice lines
+    - **X-Request-Timeout** header: seconds the client will wait (default: the server's budget);
+      work stops with 504 once it passes, or when the client disconnects
     """
-    try:
-        # Read image
-        image_bytes = await file.read()
-        img = image_to_cv2(image_bytes)
-
-        # Save temporarily for measure_person function (it expects a file path)
-        temp_path = f"/tmp/temp_{file.filename}"
-        cv2.imwrite(temp_path, img)
-
-        # Measure
-        result = measure_person_basic(
-            image_path=temp_path,
-            real_height_cm=height_cm,
-            draw=False,  # Don't show plots in API
-            verbose=False,  # Don't print to console
-            return_image=False  # Don't return image data
-        )
-
-        # Clean up temp file
-        import os
-        os.remove(temp_path)
+    check_annotate(annotate)
+
+    # Read image (bounded, rejected early if too large or not an image)
+    arrival_time = time.time()
+    image_bytes, info = await read_upload(file)
+    return await measure_upload(request, "direct", image_bytes, info, height_cm, arrival_time,
+                                annotate=annotate, x_request_timeout=x_request_timeout, x_replay=x_replay)
+
+@app.post("/measure_person/raw", response_model=MeasurementResponse, response_model_exclude_none=True)
+async def measure_person_raw_endpoint(
+    request: Request,
+    height_cm: Optional[float] = Query(None, description="Known subject height in centimeters"),
+    annotate: Optional[str] = Query(None, description="'jpeg' or 'webp' to attach an annotated preview"),
+    x_height_cm: Optional[float] = Header(None, description="Height, if not given as a query parameter"),
+    x_request_timeout: Optional[float] = Header(None, description="Seconds the client will wait"),
+    x_replay: Optional[str] = Header(None, include_in_schema=False)
+):
+    """
+    `/measure_person` with the image as the raw request body (no multipart).
 
-        return MeasurementResponse(**result)
+    - **body**: the image bytes, `Content-Type: application/octet-stream` or `image/*`
+    - **height_cm** (query) or **X-Height-Cm** (header): known height in centimeters
+    - **annotate** (query): optional `jpeg`/`webp` preview
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Measurement failed: {str(e)}")
+    Unset fields are left out of the response.
+    """
+    check_annotate(annotate)
+    height = raw_height(height_cm, x_height_cm)
+    arrival_time = time.time()
+    image_bytes, info = await read_raw_body(request)
+    return await measure_upload(request, "direct", image_bytes, info, height, arrival_time,
+                                annotate=annotate, x_request_timeout=x_request_timeout, x_replay=x_replay)
 
 @app.post("/measure_person_sam2", response_model=MeasurementResponse)
 async def measure_person_sam2_endpoint(
+    request: Request,
     file: UploadFile = File(...),
-    height_cm: float = Form(..., description="Known subject height in centimeters")
+    height_cm: float = Form(..., description="Known subject height in centimeters"),
+    annotate: Optional[str] = Form(None, description="'jpeg' or 'webp' to attach an annotated preview"),
+    return_mask: bool = Form(False, description="Attach the person mask as COCO RLE"),
+    x_request_timeout: Optional[float] = Header(None, description="Seconds the client will wait"),
+    x_replay: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Measure person dimensions using SAM2 segmentation + MediaPipe Pose.
 
     - **file**: Image file (JPEG, PNG, etc.)
     - **height_cm**: Known height of the person in centimeters
+    - **annotate**: Optional `jpeg`/`webp`; returns a base64 preview with the mask overlay
+    - **return_mask**: Optional; returns the person mask (full image) as COCO RLE
+    - **X-Request-Timeout** header: seconds the client will wait (default: the server's budget);
+      work stops with 504 once it passes, or when the client disconnects
     """
-    if not SAM2_AVAILABLE:
-        raise HTTPException(
-            status_code=503,
-            detail="SAM2 is not available on this deployment. Use /measure_person endpoint instead."
-        )
-
-    try:
-        # Read image
-        image_bytes = await file.read()
-        img = image_to_cv2(image_bytes)
+    require_sam2()
+    check_annotate(annotate)
+
+    # Read image (bounded, rejected early if too large or not an image)
+    arrival_time = time.time()
+    image_bytes, info = await read_upload(file)
+    return await measure_upload(request, "sam2", image_bytes, info, height_cm, arrival_time,
+                                annotate=annotate, return_mask=return_mask,
+                                x_request_timeout=x_request_timeout, x_replay=x_replay)
+
+@app.post("/measure_person_sam2/raw", response_model=MeasurementResponse, response_model_exclude_none=True)
+async def measure_person_sam2_raw_endpoint(
+    request: Request,
+    height_cm: Optional[float] = Query(None, description="Known subject height in centimeters"),
+    annotate: Optional[str] = Query(None, description="'jpeg' or 'webp' to attach an annotated preview"),
+    return_mask: bool = Query(False, description="Attach the person mask as COCO RLE"),
+    x_height_cm: Optional[float] = Header(None, description="Height, if not given as a query parameter"),
+    x_request_timeout: Optional[float] = Header(None, description="Seconds the client will wait"),
+    x_replay: Optional[str] = Header(None, include_in_schema=False)
+):
+    """
+    `/measure_person_sam2` with the image as the raw request body (no multipart).
 
-        # Save temporarily for SAM2 function (it expects a file path)
-        temp_path = f"/tmp/temp_{file.filename}"
-        cv2.imwrite(temp_path, img)
+    - **body**: the image bytes, `Content-Type: application/octet-stream` or `image/*`
+    - **height_cm** (query) or **X-Height-Cm** (header): known height in centimeters
+    - **annotate**, **return_mask** (query): as for `/measure_person_sam2`
 
-        # Segment with SAM2
-        segmented_img = segment_person_sam2(temp_path)
+    Unset fields are left out of the response.
+    """
+    require_sam2()
+    check_annotate(annotate)
+    height = raw_height(height_cm, x_height_cm)
+    arrival_time = time.time()
+    image_bytes, info = await read_raw_body(request)
+    return await measure_upload(request, "sam2", image_bytes, info, height, arrival_time,
+                                annotate=annotate, return_mask=return_mask,
+                                x_request_timeout=x_request_timeout, x_replay=x_replay)
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    height_cm: float = Form(..., description="Known subject height in centimeters"),
+    pipeline: str = Form("sam2", description="'sam2' or 'direct'"),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """
+    Enqueue a measurement and return its job id without waiting for the result.
 
-        # Measure with MediaPipe
-        result = measure_person_image(
-            segmented_img,
-            real_height_cm=height_cm,
-            draw=False,  # Don't show plots in API
-            verbose=False  # Don't print to console
+    - **file**: Image file (JPEG, PNG, etc.)
+    - **height_cm**: Known height of the person in centimeters
+    - **pipeline**: `sam2` (default) or `direct`
+    - **Idempotency-Key** header: resubmitting with the same key returns the same job
+    """
+    if pipeline not in PIPELINES:
+        raise HTTPException(status_code=400, detail=f"Unknown pipeline: {pipeline}")
+    if pipeline == "sam2" and not SAM2_AVAILABLE:
+        raise HTTPException(
+            status_code=503,
+            detail="SAM2 is not available on this deployment. Use pipeline=direct instead."
         )
 
-        # Clean up temp file
-        import os
-        os.remove(temp_path)
-
-        if result is None:
-            return MeasurementResponse(ok=False, error="No person detected in segmented image")
-
-        # Convert result to match the expected format
-        formatted_result = {
-            "ok": True,
-            "height_input_cm": height_cm,
-            "pixel_to_cm": result.get("px_to_cm"),
-            "shoulder_width_cm": result.get("shoulder_width_cm"),
-            "hip_width_cm": result.get("hip_bone_width_cm"),  # Note: different key name
-            "waist_width_cm": result.get("waist_width_cm"),
-            "chest_width_cm": result.get("chest_width_cm"),
-            "torso_slice_widths_cm": result.get("slice_widths_cm"),
-            "slice_fracs": [0.30, 0.40, 0.50, 0.60, 0.70],  # Default slice fractions
-        }
-
-        return MeasurementResponse(**formatted_result)
+    image_bytes, _ = await read_upload(file)
+    image_to_cv2(image_bytes)  # reject undecodable uploads before queueing
+    job, _ = job_queue.submit(pipeline, image_bytes, height_cm, idempotency_key=idempotency_key)
+    if pipeline == "sam2":
+        model_lifecycle.note_demand()
+    return job_to_response(job)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0.0, ge=0.0, le=60.0, description="Seconds to long-poll for completion")
+):
+    """
+    Return job status, and the measurement once the job is done.
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"SAM2 measurement failed: {str(e)}")
+    With `wait`, the request is held until the job finishes or `wait` seconds pass.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        job = job_queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired job")
+        if job["status"] in ("done", "failed") or time.monotonic() >= deadline:
+            return job_to_response(job)
+        await asyncio.sleep(min(0.25, max(0.0, deadline - time.monotonic())))
+
+@app.get("/metrics")
+async def metrics():
+    """Operational counters (queue depth, job counts, coalesced requests, lane waits, admission, aborts, quality gate, traffic capture, SAM2 memory)."""
+    return {
+        "jobs": job_queue.stats(),
+        "lanes": lane_scheduler.stats(),
+        "admission": admission.stats(),
+        "aborted": abort_stats.stats(),
+        "quality_gate": get_quality_gate().stats(),
+        "coalescing": single_flight.stats(),
+        "traffic_capture": traffic_capture.stats() if traffic_capture is not None else {"enabled": False},
+        "sam2_debug": get_debug_sink().stats(),
+        "sam2_model": model_lifecycle.stats() if model_lifecycle is not None else {"available": False},
+    }
 
 @app.get("/")
 async def root():
     """API information and available endpoints."""
     endpoints = {
         "/measure_person": "Direct MediaPipe measurement",
+        "/measure_person/raw": "Direct measurement, raw image body (no multipart)",
+        "/jobs": "Submit an asynchronous measurement job",
+        "/jobs/{job_id}": "Poll a job for its result",
+        "/metrics": "Queue depth, coalescing and other operational counters",
         "/docs": "Interactive API documentation"
     }
 
     if SAM2_AVAILABLE:
         endpoints["/measure_person_sam2"] = "SAM2 segmentation + MediaPipe measurement"
+        endpoints["/measure_person_sam2/raw"] = "SAM2 measurement, raw image body (no multipart)"
     else:
         endpoints["/measure_person_sam2"] = "SAM2 segmentation + MediaPipe measurement (NOT AVAILABLE)"
 
@@ -201,6 +625,5 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    import os
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=port)
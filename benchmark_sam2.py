@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Benchmark SAM 2 segmentation under different runtime profiles.
+
+Each profile (thread count, bfloat16 autocast, torch.compile, ...) runs in a
+fresh subprocess, because torch thread settings and compilation are
+process-wide. For every profile the harness reports model load time and the
+peak RSS reached while loading, the cold first call (compilation, lazy
+initialisation) separately from warm per-image latency, plus peak RSS, and
+names the fastest profile for this host. The bf16, compile and int8 profiles
+run at the thread count that measured fastest in the threads= profiles.
+
+With --weights, each weights file (.pt or memory-mapped .safetensors) is a
+profile instead.
+
+Usage:
+    python benchmark_sam2.py person1.jpg person2.jpg
+    python benchmark_sam2.py person.jpg --threads 1,2,4 --repeat 5 --json sam2_bench.json
+    python benchmark_sam2.py person.jpg --weights sam2.1_hiera_small.pt,sam2.1_hiera_small.safetensors
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+
+def thread_profiles(thread_counts):
+    """Baseline and one profile per thread count."""
+    profiles = [{"name": "baseline"}]
+    for n in thread_counts:
+        profiles.append({"name": f"threads={n}", "threads": n})
+    return profiles
+
+
+def fastest_threads(results):
+    """Thread count of the fastest successful threads= profile, or None."""
+    timed = [r for r in results if "error" not in r and r["profile"].get("threads")]
+    return min(timed, key=lambda r: r["warm_p50_s"])["profile"]["threads"] if timed else None
+
+
+def stacked_profiles(threads):
+    """bf16, compile and int8 on top of ``threads`` (the measured fastest count)."""
+    extra = {"threads": threads} if threads else {}
+    profiles = [{"name": "bf16", "bf16": True, **extra}]
+    profiles.append({"name": "compile", "compile": True, **extra})
+    profiles.append({"name": "bf16+compile", "bf16": True, "compile": True, **extra})
+    profiles.append({"name": "int8", "int8": True, **extra})
+    return profiles
+
+
+def run_profile_inline(profile, images, repeat):
+    """Run one profile in this process and return its measurements."""
+    import cv2
+    import numpy as np
+    import sam2_runtime
+    from measure_person_sam2 import segment_person_sam2
+
+    settings = {k: v for k, v in profile.items() if k in sam2_runtime.runtime_config}
+    sam2_runtime.configure(**settings)
+    decoded = [cv2.imread(p) for p in images]
+    if any(img is None for img in decoded):
+        raise FileNotFoundError("Could not read one of the benchmark images")
+
+    t = time.perf_counter()
+    with sam2_runtime.predictor_lock:
+        sam2_runtime.get_predictor()
+    load_s = time.perf_counter() - t
+    # ru_maxrss is KiB on Linux
+    load_peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    t = time.perf_counter()
+    segment_person_sam2(None, image=decoded[0])
+    cold_s = time.perf_counter() - t
+
+    latencies = []
+    for _ in range(repeat):
+        for img in decoded:
+            t = time.perf_counter()
+            segment_person_sam2(None, image=img)
+            latencies.append(time.perf_counter() - t)
+    latencies.sort()
+    return {
+        "profile": profile,
+        "load_s": round(load_s, 3),
+        "load_peak_rss_mb": round(load_peak_rss_mb, 1),
+        "cold_s": round(cold_s, 3),
+        "warm_p50_s": round(float(np.percentile(latencies, 50)), 3),
+        "warm_p95_s": round(float(np.percentile(latencies, 95)), 3),
+        "warm_mean_s": round(sum(latencies) / len(latencies), 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run_profile_subprocess(profile, images, repeat):
+    cmd = [sys.executable, os.path.abspath(__file__), "--inline", json.dumps(profile),
+           "--repeat", str(repeat), *images]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"profile": profile, "error": proc.stderr.strip().splitlines()[-1:] or ["failed"]}
+    # The measurement is the last line; segmentation may print warnings before it
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run_profiles(profiles, images, repeat):
+    results = []
+    for profile in profiles:
+        print(f"🔄 {profile['name']}...")
+        result = run_profile_subprocess(profile, images, repeat)
+        results.append(result)
+        if "error" in result:
+            print(f"   ❌ {result['error']}")
+        else:
+            print(f"   load={result['load_s']}s (peak RSS {result['load_peak_rss_mb']} MB) "
+                  f"cold={result['cold_s']}s warm p50={result['warm_p50_s']}s "
+                  f"p95={result['warm_p95_s']}s peak RSS={result['peak_rss_mb']} MB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SAM 2 runtime profiles")
+    parser.add_argument("images", nargs="+", help="Images to segment")
+    parser.add_argument("--threads", default=None,
+                        help="Comma-separated torch thread counts to try (default: 1,2,4,... up to cores)")
+    parser.add_argument("--weights", default=None,
+                        help="Comma-separated weights files to compare (.pt / .safetensors) instead of runtime profiles")
+    parser.add_argument("--repeat", type=int, default=3, help="Warm passes over the image set")
+    parser.add_argument("--json", default=None, help="Write all results to this JSON file")
+    parser.add_argument("--inline", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.inline:
+        result = run_profile_inline(json.loads(args.inline), args.images, args.repeat)
+        print(json.dumps(result))
+        return
+
+    if args.threads:
+        thread_counts = [int(n) for n in args.threads.split(",")]
+    else:
+        cores = os.cpu_count() or 1
+        thread_counts = [n for n in (1, 2, 4, 8, 16) if n <= cores]
+
+    print("⏱️  SAM 2 RUNTIME BENCHMARK")
+    print("=" * 70)
+    if args.weights:
+        profiles = [{"name": f"weights={os.path.basename(w)}", "weights": w} for w in args.weights.split(",")]
+        results = run_profiles(profiles, args.images, args.repeat)
+    else:
+        results = run_profiles(thread_profiles(thread_counts), args.images, args.repeat)
+        threads = fastest_threads(results)
+        if threads:
+            print(f"   Stacking bf16 / compile / int8 on threads={threads} (fastest above)")
+        results += run_profiles(stacked_profiles(threads), args.images, args.repeat)
+
+    ok = [r for r in results if "error" not in r]
+    if ok:
+        best = min(ok, key=lambda r: r["warm_p50_s"])
+        print("\n" + "=" * 70)
+        print(f"🏆 Fastest warm profile: {best['profile']['name']} ({best['warm_p50_s']}s p50)")
+        env = []
+        if best["profile"].get("threads"):
+            env.append(f"SAM2_TORCH_THREADS={best['profile']['threads']}")
+        if best["profile"].get("bf16"):
+            env.append("SAM2_BF16=1")
+        if best["profile"].get("compile"):
+            env.append("SAM2_COMPILE=1")
+        if best["profile"].get("int8"):
+            env.append("SAM2_INT8=1")
+        if best["profile"].get("weights"):
+            env.append(f"SAM2_WEIGHTS={best['profile']['weights']}")
+        print(f"   Environment: {' '.join(env) or '(defaults)'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
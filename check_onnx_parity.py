@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Compare SAM 2 masks from the ONNX Runtime backend against the torch path.
+
+For every image in a directory both predictors get the prompts
+segment_person_sam2 uses: the centre point, the upper/torso/lower points one
+at a time, and the upper/lower fallback points batched into one (B, 1, 2)
+call as _find_person_mask decodes them. The script reports mask IoU and the
+largest predicted-IoU score difference per image, encoder latency for each
+backend, and exits non-zero if any image falls below --min-iou or above
+--max-score-diff.
+
+Usage:
+    python check_onnx_parity.py test_images/ --onnx-dir sam2_onnx
+    python check_onnx_parity.py test_images/ --int8 --min-iou 0.9
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import sam2_runtime
+from sam2_onnx import DECODER_FILE, ENCODER_FILE, ONNXSAM2Predictor, int8_file
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def mask_iou(a, b):
+    a, b = a.astype(bool), b.astype(bool)
+    union = np.logical_or(a, b).sum()
+    if union == 0:
+        return 1.0
+    return float(np.logical_and(a, b).sum() / union)
+
+
+def prompts_for(h, w):
+    return [(w // 2, h // 2), (w // 2, h // 3), (w // 2, 2 * h // 3)]
+
+
+def fallback_prompts_for(h, w):
+    """The upper/lower fallback points, shaped (B, 1, 2) as _find_person_mask batches them."""
+    return np.array([[[w // 2, h // 3]], [[w // 2, 2 * h // 3]]])
+
+
+def run_backend(predictor, image_rgb):
+    """Encode once, decode every prompt; returns (masks, scores, set_image seconds).
+
+    ``masks`` and ``scores`` hold one entry per single-point prompt, then one
+    per point of the batched fallback call.
+    """
+    h, w = image_rgb.shape[:2]
+    with sam2_runtime.inference_context():
+        t = time.perf_counter()
+        predictor.set_image(image_rgb)
+        encode_s = time.perf_counter() - t
+        masks, scores = [], []
+        for x, y in prompts_for(h, w):
+            m, sc, _ = predictor.predict(point_coords=np.array([[x, y]]), point_labels=np.array([1]),
+                                         multimask_output=True)
+            masks.append(m)
+            scores.append(sc)
+        batch = fallback_prompts_for(h, w)
+        m, sc, _ = predictor.predict(point_coords=batch, point_labels=np.ones(batch.shape[:2]),
+                                     multimask_output=True)
+        masks += list(m)
+        scores += list(sc)
+    return masks, scores, encode_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check ONNX SAM 2 masks against the torch predictor")
+    parser.add_argument("images", help="Directory of test images")
+    parser.add_argument("--onnx-dir", default=sam2_runtime.runtime_config["onnx_dir"],
+                        help="Directory with sam2_encoder.onnx / sam2_decoder.onnx")
+    parser.add_argument("--min-iou", type=float, default=0.95, help="Fail below this mask IoU")
+    parser.add_argument("--max-score-diff", type=float, default=0.05,
+                        help="Fail above this difference in predicted IoU scores")
+    parser.add_argument("--int8", action="store_true", help="Check the *.int8.onnx graphs instead")
+    parser.add_argument("--limit", type=int, default=None, help="Only check the first N images")
+    args = parser.parse_args()
+
+    paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if args.limit:
+        paths = paths[:args.limit]
+    if not paths:
+        print(f"❌ No images found in {args.images}")
+        sys.exit(1)
+
+    print("🔍 SAM 2 ONNX PARITY CHECK")
+    print("=" * 70)
+    sam2_runtime.configure(backend="torch")
+    torch_predictor = sam2_runtime.build_predictor()
+    files = {}
+    if args.int8:
+        files = {"encoder_file": int8_file(ENCODER_FILE), "decoder_file": int8_file(DECODER_FILE)}
+    onnx_predictor = ONNXSAM2Predictor(args.onnx_dir, threads=sam2_runtime.runtime_config["threads"], **files)
+
+    failures = 0
+    ious, torch_times, onnx_times = [], [], []
+    for path in paths:
+        image = cv2.imread(str(path))
+        if image is None:
+            print(f"⚠️  {path.name}: unreadable, skipped")
+            continue
+        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        torch_masks, torch_scores, torch_s = run_backend(torch_predictor, image_rgb)
+        onnx_masks, onnx_scores, onnx_s = run_backend(onnx_predictor, image_rgb)
+        torch_times.append(torch_s)
+        onnx_times.append(onnx_s)
+
+        per_mask = [mask_iou(a, b) for tm, om in zip(torch_masks, onnx_masks) for a, b in zip(tm, om)]
+        # The mask segment_person_sam2 would pick from the centre prompt
+        picked = mask_iou(torch_masks[0][np.argmax(torch_masks[0].sum(axis=(1, 2)))],
+                          onnx_masks[0][np.argmax(onnx_masks[0].sum(axis=(1, 2)))])
+        worst = min(per_mask + [picked])
+        # The last two entries come from the batched fallback call
+        batched = min(mask_iou(a, b) for tm, om in zip(torch_masks[-2:], onnx_masks[-2:]) for a, b in zip(tm, om))
+        score_diff = max(float(np.max(np.abs(np.asarray(a) - np.asarray(b))))
+                         for a, b in zip(torch_scores, onnx_scores))
+        ious.append(worst)
+        ok = worst >= args.min_iou and score_diff <= args.max_score_diff
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {path.name}: person IoU={picked:.4f} min IoU={worst:.4f} "
+              f"batched IoU={batched:.4f} max score diff={score_diff:.4f} "
+              f"encode torch={torch_s:.2f}s onnx={onnx_s:.2f}s")
+
+    if not ious:
+        sys.exit(1)
+    print("\n" + "=" * 70)
+    print(f"Images: {len(ious)}  mean min IoU: {np.mean(ious):.4f}  worst: {min(ious):.4f}")
+    print(f"Encoder median: torch {np.median(torch_times):.2f}s  onnx {np.median(onnx_times):.2f}s "
+          f"({np.median(torch_times) / np.median(onnx_times):.2f}x)")
+    if failures:
+        print(f"❌ {failures} image(s) below IoU {args.min_iou} or above score diff {args.max_score_diff}")
+        sys.exit(1)
+    print("✅ ONNX backend matches torch")
+
+
+if __name__ == "__main__":
+    main()
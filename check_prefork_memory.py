@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Check that pre-forked workers share model weights instead of copying them.
+
+Starts the API under gunicorn (gunicorn_conf.py) with one worker, then with
+N workers, sends a few warm-up requests, and reads each process's memory
+from /proc/<pid>/smaps_rollup (Linux). RSS counts shared pages in every
+process, so the comparison uses PSS (shared pages split between the
+processes that map them): each extra worker should add much less than a
+whole single-worker footprint.
+
+Usage:
+    python check_prefork_memory.py --image person.jpg --workers 4
+    python check_prefork_memory.py --image person.jpg --sam2-requests 4 --max-extra-fraction 0.6
+"""
+
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def memory_mb(pid):
+    """Rss, Pss and private (Private_Clean + Private_Dirty) of a process, in MB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1]) / 1024
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "private": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; ppid follows the closing paren
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def measure(workers, image, height_cm, sam2_requests, startup_timeout):
+    port = free_port()
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port))
+    conf = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn_conf.py")
+    cmd = [sys.executable, "-m", "gunicorn", "api:app", "-c", conf, "--bind", f"127.0.0.1:{port}"]
+    master = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            try:
+                if requests.get(f"{base_url}/", timeout=2).ok and len(child_pids(master.pid)) >= workers:
+                    break
+            except requests.RequestException:
+                pass
+            if master.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"gunicorn with {workers} worker(s) did not start")
+            time.sleep(1)
+
+        with open(image, "rb") as f:
+            image_bytes = f.read()
+        # Warm-up: requests are spread over the workers by the kernel
+        for endpoint, count in (("/measure_person", 2 * workers), ("/measure_person_sam2", sam2_requests)):
+            for _ in range(count):
+                requests.post(f"{base_url}{endpoint}", files={"file": ("image.jpg", image_bytes)},
+                              data={"height_cm": str(height_cm)}, timeout=300)
+
+        return {"master": memory_mb(master.pid),
+                "workers": [memory_mb(pid) for pid in child_pids(master.pid)]}
+    finally:
+        master.send_signal(signal.SIGTERM)
+        try:
+            master.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            master.kill()
+
+
+def total(run, key):
+    return run["master"][key] + sum(w[key] for w in run["workers"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check copy-on-write model sharing across gunicorn workers")
+    parser.add_argument("--image", required=True, help="Image used for warm-up requests")
+    parser.add_argument("--height-cm", type=float, default=175.0)
+    parser.add_argument("--workers", type=int, default=2, help="Worker count to compare with one worker")
+    parser.add_argument("--sam2-requests", type=int, default=0, help="Warm-up requests to the SAM2 endpoint")
+    parser.add_argument("--max-extra-fraction", type=float, default=0.5,
+                        help="Fail if each extra worker adds more than this fraction of a single worker's PSS")
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    args = parser.parse_args()
+
+    print("🧠 PRE-FORK MEMORY CHECK")
+    print("=" * 70)
+    runs = {}
+    for n in (1, args.workers):
+        print(f"🔄 {n} worker(s)...")
+        runs[n] = measure(n, args.image, args.height_cm, args.sam2_requests, args.startup_timeout)
+        run = runs[n]
+        print(f"   master RSS={run['master']['rss']:.0f} MB PSS={run['master']['pss']:.0f} MB")
+        for i, w in enumerate(run["workers"]):
+            print(f"   worker {i}: RSS={w['rss']:.0f} MB PSS={w['pss']:.0f} MB private={w['private']:.0f} MB")
+        print(f"   total PSS={total(run, 'pss'):.0f} MB")
+
+    single_worker_pss = runs[1]["workers"][0]["pss"] + runs[1]["master"]["pss"]
+    extra_per_worker = (total(runs[args.workers], "pss") - total(runs[1], "pss")) / max(1, args.workers - 1)
+    fraction = extra_per_worker / single_worker_pss
+    print("\n" + "=" * 70)
+    print(f"Single-worker footprint: {single_worker_pss:.0f} MB PSS")
+    print(f"Each extra worker adds:  {extra_per_worker:.0f} MB PSS ({fraction:.0%} of a single worker)")
+    if fraction > args.max_extra_fraction:
+        print(f"❌ Above {args.max_extra_fraction:.0%}: weights are probably not shared")
+        sys.exit(1)
+    print("✅ Workers share model memory")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Single-flight request coalescing.
+
+Concurrent requests with the same key share one computation: the first caller
+(the leader) runs it, later callers attach to the in-flight result instead of
+starting their own. Nothing is cached once the computation finishes.
+"""
+
+import asyncio
+
+
+class SingleFlight:
+    """Deduplicates concurrent async computations by key."""
+
+    def __init__(self):
+        self._inflight = {}
+        self._tasks = set()
+        self.leaders = 0
+        self.joined = 0
+
+    def start(self, key, fn):
+        """Start ``fn()`` in its own task, or attach to the one in flight for ``key``.
+
+        Returns (future, shared) without awaiting anything, so callers can wait
+        on the future with their own timeout: a caller that stops waiting does
+        not cancel the computation for the others.
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            self.joined += 1
+            return future, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.leaders += 1
+        task = asyncio.ensure_future(self._run(key, fn, future))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return future, False
+
+    async def _run(self, key, fn, future):
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when every caller stopped waiting
+        else:
+            future.set_result(result)
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        total = self.leaders + self.joined
+        return {
+            "computations": self.leaders,
+            "coalesced_requests": self.joined,
+            "in_flight": len(self._inflight),
+            "saved_fraction": round(self.joined / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Convert the SAM 2 pickle checkpoint to memory-mappable safetensors.
+
+`build_sam2` unpickles `sam2.1_hiera_small.pt` into process memory on every
+load; the converted file is memory-mapped by sam2_runtime instead
+(SAM2_WEIGHTS=<file>.safetensors), which starts faster and keeps peak RSS
+near the model size. Compare both with:
+
+    python benchmark_sam2.py person.jpg --weights sam2.1_hiera_small.pt,sam2.1_hiera_small.safetensors
+
+Usage:
+    python convert_sam2_weights.py
+    python convert_sam2_weights.py --checkpoint sam2.1_hiera_small.pt --output weights/sam2_s.safetensors
+"""
+
+import argparse
+import os
+
+import torch
+from safetensors.torch import save_file
+
+from sam2_runtime import SAM2_CHECKPOINT
+
+
+def convert(checkpoint, output):
+    state = torch.load(checkpoint, map_location="cpu", weights_only=True)
+    state = state.get("model", state)  # SAM 2 checkpoints nest the weights under "model"
+    # safetensors needs contiguous tensors that do not share storage
+    tensors = {name: t.detach().contiguous().clone() for name, t in state.items()}
+    save_file(tensors, output, metadata={"source": os.path.basename(checkpoint)})
+    return len(tensors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a SAM 2 .pt checkpoint to safetensors")
+    parser.add_argument("--checkpoint", default=SAM2_CHECKPOINT, help="SAM 2 .pt checkpoint")
+    parser.add_argument("--output", default=None, help="Output file (default: checkpoint with .safetensors)")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.checkpoint)[0] + ".safetensors"
+    count = convert(args.checkpoint, output)
+    print(f"✅ Wrote {count} tensors to {output} ({os.path.getsize(output) / 1e6:.1f} MB)")
+    print(f"Use with: SAM2_WEIGHTS={output}")
+
+
+if __name__ == "__main__":
+    main()
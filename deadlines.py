@@ -0,0 +1,111 @@
+"""
+Per-request deadlines and cancellation, checked between pipeline stages.
+
+A Deadline travels with a measurement into the pipelines; each stage
+boundary (lane queue, SAM2 set_image, each predict, pose detection,
+annotation) calls ``check_deadline``, which raises once the time budget has
+run out or every client waiting for the result has disconnected. Work that
+nobody will receive stops at the next boundary instead of running to the end.
+
+Checks are cooperative: a stage already running (e.g. one SAM2 encoder
+pass) is not interrupted.
+"""
+
+import threading
+import time
+from collections import Counter
+
+
+class RequestAborted(Exception):
+    """A measurement stopped at a stage boundary."""
+
+    reason = "aborted"
+
+    def __init__(self, stage: str):
+        super().__init__(f"{self.reason.replace('_', ' ').capitalize()} before {stage}")
+        self.stage = stage
+
+
+class DeadlineExceeded(RequestAborted):
+    reason = "deadline_exceeded"
+
+
+class RequestCancelled(RequestAborted):
+    reason = "client_disconnected"
+
+
+class Deadline:
+    """Time budget and cancellation flag shared by everyone waiting on one computation."""
+
+    def __init__(self, timeout_s=None):
+        self.expires_at = time.monotonic() + timeout_s if timeout_s else None
+        self.cancelled = False
+        self.stopped = False
+        self._waiters = 0
+        self._lock = threading.Lock()
+
+    def extend(self, timeout_s):
+        """Keep the budget open for at least ``timeout_s`` more seconds (None: no limit)."""
+        with self._lock:
+            if self.expires_at is not None:
+                self.expires_at = max(self.expires_at, time.monotonic() + timeout_s) if timeout_s else None
+
+    def remaining(self):
+        """Seconds left, or None without a time limit."""
+        return None if self.expires_at is None else self.expires_at - time.monotonic()
+
+    def add_waiter(self) -> bool:
+        """Register a waiting client; False if the computation has already stopped.
+
+        Joining un-cancels a computation whose earlier clients all went away,
+        as long as it has not reached a stage boundary since.
+        """
+        with self._lock:
+            if self.stopped:
+                return False
+            self._waiters += 1
+            self.cancelled = False
+            return True
+
+    def waiter_disconnected(self):
+        """A waiting client went away; cancel once nobody is left."""
+        with self._lock:
+            self._waiters -= 1
+            if self._waiters <= 0:
+                self.cancelled = True
+
+    def check(self, stage: str):
+        with self._lock:
+            if self.cancelled:
+                error = RequestCancelled(stage)
+            elif self.expires_at is not None and time.monotonic() > self.expires_at:
+                error = DeadlineExceeded(stage)
+            else:
+                return
+            self.stopped = True
+        raise error
+
+
+def check_deadline(deadline, stage: str):
+    """``deadline.check(stage)``, or nothing when there is no deadline."""
+    if deadline is not None:
+        deadline.check(stage)
+
+
+class AbortStats:
+    """Counts aborted measurements by reason and stage."""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, error: RequestAborted):
+        with self._lock:
+            self._counts[(error.reason, error.stage)] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {}
+            for (reason, stage), n in sorted(self._counts.items()):
+                out.setdefault(reason, {})[stage] = n
+            return out
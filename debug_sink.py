@@ -0,0 +1,160 @@
+"""
+Debug artifact sinks for the SAM2 pipeline.
+
+By default artifacts are dropped (NullDebugSink), so segmentation does no
+disk I/O. Setting SAM2_DEBUG_DIR enables a DirectoryDebugSink that writes
+sampled artifacts (crops, masks, prompt points, timings) from a background
+thread and prunes old entries.
+
+Configuration (environment):
+    SAM2_DEBUG_DIR           Output directory (sink disabled if unset)
+    SAM2_DEBUG_SAMPLE_RATE   Fraction of requests to keep (default 1.0)
+    SAM2_DEBUG_MAX_MB        Total size kept on disk (default 200)
+    SAM2_DEBUG_MAX_AGE_H     Age after which entries are deleted (default 24)
+"""
+
+import json
+import os
+import queue
+import random
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class NullDebugSink:
+    """Discards everything; the hot path can skip building artifacts."""
+
+    enabled = False
+
+    def sampled(self):
+        return False
+
+    def submit(self, record, images=None):
+        pass
+
+    def stats(self):
+        return {"enabled": False}
+
+
+class DirectoryDebugSink:
+    """Writes sampled artifacts to ``directory`` on a background thread.
+
+    Each submission becomes ``<directory>/<timestamp>_<id>/`` holding
+    ``record.json`` and one PNG per image. Submissions are dropped (never
+    blocking the caller) when the write queue is full.
+    """
+
+    enabled = True
+
+    def __init__(self, directory, sample_rate=1.0, max_bytes=200 * 1024 * 1024,
+                 max_age_s=24 * 3600, max_pending=32):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        os.makedirs(directory, exist_ok=True)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._entries = deque(self._scan())  # (path, size, created_at), oldest first
+        self._total_bytes = sum(size for _, size, _ in self._entries)
+        self.written = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="sam2-debug-sink", daemon=True)
+        self._thread.start()
+
+    def _scan(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path):
+                size = sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+                entries.append((path, size, os.path.getmtime(path)))
+        return sorted(entries, key=lambda e: e[2])
+
+    def sampled(self):
+        """Decide whether to keep the current request; call before building artifacts."""
+        return random.random() < self.sample_rate
+
+    def submit(self, record, images=None):
+        """Queue a record (JSON-serialisable dict) and optional name -> array images.
+
+        Sampling is the caller's job (``sampled()``); every submission is kept.
+        """
+        try:
+            self._queue.put_nowait((time.time(), record, images or {}))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            created_at, record, images = self._queue.get()
+            try:
+                self._write(created_at, record, images)
+                self._prune()
+            except Exception as e:
+                print(f"⚠️  Debug sink write failed: {e}")
+
+    def _write(self, created_at, record, images):
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(created_at))
+        path = os.path.join(self.directory, f"{stamp}_{uuid.uuid4().hex[:8]}")
+        os.makedirs(path)
+        size = 0
+        with open(os.path.join(path, "record.json"), "w") as f:
+            json.dump(record, f, indent=2, default=float)
+        size += os.path.getsize(os.path.join(path, "record.json"))
+        for name, image in images.items():
+            if image is None:
+                continue
+            if image.dtype == bool:
+                image = image.astype(np.uint8) * 255
+            image_path = os.path.join(path, f"{name}.png")
+            cv2.imwrite(image_path, np.ascontiguousarray(image))
+            size += os.path.getsize(image_path)
+        self._entries.append((path, size, created_at))
+        self._total_bytes += size
+        self.written += 1
+
+    def _prune(self):
+        cutoff = time.time() - self.max_age_s
+        while self._entries and (self._total_bytes > self.max_bytes or self._entries[0][2] < cutoff):
+            path, size, _ = self._entries.popleft()
+            shutil.rmtree(path, ignore_errors=True)
+            self._total_bytes -= size
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "directory": self.directory,
+            "written": self.written,
+            "dropped": self.dropped,
+            "pending": self._queue.qsize(),
+            "disk_bytes": self._total_bytes,
+        }
+
+
+def sink_from_env():
+    directory = os.environ.get("SAM2_DEBUG_DIR")
+    if not directory:
+        return NullDebugSink()
+    return DirectoryDebugSink(
+        directory,
+        sample_rate=float(os.environ.get("SAM2_DEBUG_SAMPLE_RATE", "1.0")),
+        max_bytes=int(float(os.environ.get("SAM2_DEBUG_MAX_MB", "200")) * 1024 * 1024),
+        max_age_s=float(os.environ.get("SAM2_DEBUG_MAX_AGE_H", "24")) * 3600,
+    )
+
+
+_debug_sink = None
+
+
+def get_debug_sink():
+    """Process-wide sink configured from the environment on first use."""
+    global _debug_sink
+    if _debug_sink is None:
+        _debug_sink = sink_from_env()
+    return _debug_sink
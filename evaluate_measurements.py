@@ -1,9 +1,16 @@
 import argparse
 import csv
+import json
 import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
 from pathlib import Path
 from typing import List, Dict, Optional
 
+import cv2
 import pandas as pd
 
 from measure_person import measure_person
@@ -50,52 +57,172 @@ def load_ground_truth(csv_path: Path) -> pd.DataFrame:
     return df
 
 
-def evaluate(images_dir: Path, gt_df: pd.DataFrame, limit: Optional[int] = None) -> pd.DataFrame:
-    rows = []
-    for i, row in gt_df.iterrows():
-        if limit is not None and i >= limit:
-            break
-        fname = row["filename"]
-        height_cm = float(row["height_cm"])
+def evaluate_row(images_dir: Optional[Path], row, pipeline: str = "direct", roi: Optional[bool] = None,
+                 shard=None) -> Dict:
+    """Measure one ground-truth row; returns its results row."""
+    fname = row["filename"]
+    height_cm = float(row["height_cm"])
+    # Latency includes reading the image: a decode from disk, or a view of the shard
+    t = time.perf_counter()
+    if shard is not None:
+        img = shard.get(fname)
+    else:
         img_path = images_dir / fname
-        if not img_path.exists():
-            result = {"filename": fname, "error": "missing_image"}
-            rows.append(result)
-            continue
-        meas = measure_person(str(img_path), real_height_cm=height_cm, draw=False, verbose=False)
-        if not meas.get("ok"):
-            result = {"filename": fname, "error": meas.get("error", "unknown")}
-            rows.append(result)
-            continue
-        output = {
-            "filename": fname,
-            "height_cm": height_cm,
-            "pixel_to_cm": meas.get("pixel_to_cm"),
-            "confidence": meas.get("confidence"),
-        }
-        # Predictions
-        for dim, key in PRED_MAPPING.items():
-            output[f"pred_{dim}_cm"] = meas.get(key)
-            # Ground truth if present
-            gt_key = f"{dim}_cm"
-            if gt_key in row and not pd.isna(row[gt_key]):
-                output[gt_key] = float(row[gt_key])
-        rows.append(output)
-    return pd.DataFrame(rows)
+        img = cv2.imread(str(img_path)) if img_path.exists() else None
+    if img is None:
+        return {"filename": fname, "error": "missing_image"}
+    if pipeline == "sam2":
+        from pipelines import run_sam2
+        meas = run_sam2(img, height_cm)
+    else:
+        meas = measure_person(None, real_height_cm=height_cm, draw=False, verbose=False, image=img, roi=roi)
+    latency_s = time.perf_counter() - t
+    if not meas.get("ok"):
+        return {"filename": fname, "error": meas.get("error", "unknown")}
+    output = {
+        "filename": fname,
+        "height_cm": height_cm,
+        "pixel_to_cm": meas.get("pixel_to_cm"),
+        "confidence": meas.get("confidence"),
+        "latency_s": latency_s,
+    }
+    # Predictions
+    for dim, key in PRED_MAPPING.items():
+        output[f"pred_{dim}_cm"] = meas.get(key)
+        # Ground truth if present
+        gt_key = f"{dim}_cm"
+        if gt_key in row and not pd.isna(row[gt_key]):
+            output[gt_key] = float(row[gt_key])
+    return output
+
+
+# Set in each worker process by _init_worker (see evaluate's ``workers``)
+_worker_args = None
+
+
+def _init_worker(args):
+    global _worker_args
+    import prefork
+    prefork.after_fork()
+    _worker_args = args
+
+
+def _evaluate_row_in_worker(row) -> Dict:
+    return evaluate_row(row=row, **_worker_args)
+
+
+def evaluate(images_dir: Optional[Path], gt_df: pd.DataFrame, limit: Optional[int] = None,
+             pipeline: str = "direct", roi: Optional[bool] = None, shard=None, workers: int = 1) -> pd.DataFrame:
+    """Measure every row of ``gt_df``, reading images from ``images_dir`` or a pre-decoded ``shard``.
+
+    With ``workers`` > 1 the rows are measured in forked processes that share
+    the models loaded beforehand and the shard's mapped pages.
+    """
+    rows = [row for i, row in gt_df.iterrows() if limit is None or i < limit]
+    args = {"images_dir": images_dir, "pipeline": pipeline, "roi": roi, "shard": shard}
+    if workers <= 1:
+        return pd.DataFrame([evaluate_row(row=row, **args) for row in rows])
+    import multiprocessing
+    import prefork
+    if pipeline == "sam2":
+        prefork.load_shared_models()
+    else:
+        prefork.pose_model_path()
+    with multiprocessing.get_context("fork").Pool(workers, initializer=_init_worker, initargs=(args,)) as pool:
+        return pd.DataFrame(pool.map(_evaluate_row_in_worker, rows, chunksize=1))
+
+
+def resident_mb() -> float:
+    """Current resident set size (Linux), i.e. what stays loaded after warm-up."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def run_variant(args, int8: bool, out_path: str) -> Dict:
+    """Evaluate the SAM2 pipeline in a fresh process (so peak RSS is per model)."""
+    summary_path = out_path + ".json"
+    cmd = [sys.executable, os.path.abspath(__file__), "--out", out_path, "--pipeline", "sam2",
+           "--summary-json", summary_path]
+    for flag, value in (("--images", args.images), ("--csv", args.csv), ("--shard", args.shard)):
+        if value is not None:
+            cmd += [flag, value]
+    if args.limit is not None:
+        cmd += ["--limit", str(args.limit)]
+    # Set SAM2_INT8 explicitly: an inherited SAM2_INT8=1 would quantize the float run too
+    env = {**os.environ, "SAM2_INT8": "1" if int8 else "0"}
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, env=env)
+    with open(summary_path) as f:
+        return json.load(f)
+
+
+def compare_int8(args) -> None:
+    """Report width MAE, latency and memory of int8 SAM2 against the float model."""
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = {}
+        for name, int8 in (("float", False), ("int8", True)):
+            print(f"Evaluating SAM2 {name}...")
+            runs[name] = run_variant(args, int8, os.path.join(tmp, f"{name}.csv"))
+            runs[name]["results"] = pd.read_csv(os.path.join(tmp, f"{name}.csv"))
+
+    base, quant = runs["float"], runs["int8"]
+    print("\nSAM2 int8 vs float")
+    print(f"  {'metric':<22}{'float':>10}{'int8':>10}{'change':>10}")
+    for key in sorted(k for k in base["metrics"] if k.endswith("_mae_cm")):
+        if key in quant["metrics"]:
+            b, q = base["metrics"][key], quant["metrics"][key]
+            print(f"  {key:<22}{b:>10.3f}{q:>10.3f}{q - b:>+10.3f}")
+    # Agreement between the two models, usable without ground-truth widths
+    merged = base["results"].merge(quant["results"], on="filename", suffixes=("_float", "_int8"))
+    for dim in DIMENSIONS:
+        cols = [f"pred_{dim}_cm_float", f"pred_{dim}_cm_int8"]
+        if set(cols).issubset(merged.columns):
+            diff = (merged[cols[0]] - merged[cols[1]]).abs().dropna()
+            if not diff.empty:
+                print(f"  {dim + '_drift_cm':<22}{'':>10}{'':>10}{diff.mean():>10.3f}")
+    for key, label in (("latency_p50_s", "latency p50 (s)"), ("latency_mean_s", "latency mean (s)"),
+                       ("rss_mb", "resident (MB)"), ("peak_rss_mb", "peak RSS (MB)")):
+        b, q = base[key], quant[key]
+        print(f"  {label:<22}{b:>10.2f}{q:>10.2f}{(q - b) / b * 100:>+9.1f}%")
 
 
 def main():
     parser = argparse.ArgumentParser(description="Batch evaluate body measurement predictions.")
-    parser.add_argument("--images", required=True, help="Directory with input images")
-    parser.add_argument("--csv", required=True, help="Ground truth CSV (filename,height_cm, optional widths)")
+    parser.add_argument("--images", default=None, help="Directory with input images")
+    parser.add_argument("--csv", default=None,
+                        help="Ground truth CSV (filename,height_cm, optional widths); default with --shard: the packed rows")
+    parser.add_argument("--shard", default=None,
+                        help="Read pre-decoded images from a shard written by image_shard.py instead of --images")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Measure in this many forked processes (sharing models and the shard's pages)")
     parser.add_argument("--out", default="results.csv", help="Output CSV path")
     parser.add_argument("--limit", type=int, default=None, help="Optional limit on number of rows to process")
+    parser.add_argument("--pipeline", choices=["direct", "sam2"], default="direct", help="Measurement pipeline")
+    parser.add_argument("--int8", action="store_true", help="Use the int8-quantized SAM2 model (with --pipeline sam2)")
+    parser.add_argument("--compare-int8", action="store_true",
+                        help="Evaluate SAM2 float and int8 and report MAE, latency and memory differences")
+    parser.add_argument("--roi", action="store_true",
+                        help="Two-stage ROI pose inference (direct pipeline; see measure_person.detect_pose_roi)")
+    parser.add_argument("--summary-json", default=None, help="Also write metrics, latency and peak RSS as JSON")
     args = parser.parse_args()
+    if args.shard is None and (args.images is None or args.csv is None):
+        parser.error("--images and --csv are required without --shard")
 
-    images_dir = Path(args.images)
-    gt_df = load_ground_truth(Path(args.csv))
+    if args.compare_int8:
+        compare_int8(args)
+        return
+    if args.int8:
+        import sam2_runtime
+        sam2_runtime.configure(int8=True)
 
-    results_df = evaluate(images_dir, gt_df, limit=args.limit)
+    shard = None
+    if args.shard:
+        from image_shard import ImageShard
+        shard = ImageShard(args.shard)
+    images_dir = Path(args.images) if args.images else None
+    gt_df = load_ground_truth(Path(args.csv)) if args.csv else shard.ground_truth()
+
+    results_df = evaluate(images_dir, gt_df, limit=args.limit, pipeline=args.pipeline, roi=args.roi or None,
+                          shard=shard, workers=args.workers)
     metrics = compute_errors(results_df)
 
     # Aggregate confidence
@@ -103,6 +230,18 @@ def main():
         metrics["avg_confidence"] = round(results_df["confidence"].dropna().mean(), 3)
 
     results_df.to_csv(args.out, index=False)
+    if args.summary_json:
+        latencies = results_df["latency_s"].dropna() if "latency_s" in results_df.columns else pd.Series(dtype=float)
+        summary = {
+            "metrics": metrics,
+            "latency_p50_s": float(latencies.median()) if not latencies.empty else float("nan"),
+            "latency_mean_s": float(latencies.mean()) if not latencies.empty else float("nan"),
+            # ru_maxrss is KiB on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "rss_mb": resident_mb(),
+        }
+        with open(args.summary_json, "w") as f:
+            json.dump(summary, f, default=float)
 
     print("Saved results:", args.out)
     print("Image count:", len(results_df))
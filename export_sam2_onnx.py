@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Export the SAM 2 image encoder and prompt/mask decoder to ONNX.
+
+Produces two graphs in the output directory, loaded by sam2_onnx.py
+(SAM2_BACKEND=onnx):
+
+    sam2_encoder.onnx   image (1x3x1024x1024, normalised)
+                        -> image_embed, high_res_feat_0, high_res_feat_1
+    sam2_decoder.onnx   image features + point_coords (BxNx2, 1024-pixel space)
+                        + point_labels (BxN) -> low_res_masks (Bx4x256x256), iou (Bx4)
+
+The decoder returns all four mask tokens; the predictor applies SAM2's
+multimask / stability selection, so one graph serves both output modes.
+With --int8 both graphs are also written with dynamically quantized int8
+weights (*.int8.onnx, selected by SAM2_INT8=1).
+
+Usage:
+    python export_sam2_onnx.py
+    python export_sam2_onnx.py --checkpoint sam2.1_hiera_small.pt --output-dir sam2_onnx
+    python export_sam2_onnx.py --int8
+"""
+
+import argparse
+import os
+import time
+
+import torch
+from torch import nn
+
+from sam2.build_sam import build_sam2
+from sam2_onnx import DECODER_FILE, ENCODER_FILE, IMAGE_SIZE, int8_file
+from sam2_runtime import SAM2_CHECKPOINT, SAM2_CONFIG
+
+
+class EncoderWrapper(nn.Module):
+    """Image -> the features SAM2ImagePredictor.set_image stores."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+        hw = model.image_size // 4
+        self.feat_sizes = [(hw, hw), (hw // 2, hw // 2), (hw // 4, hw // 4)]
+
+    def forward(self, image):
+        backbone_out = self.model.forward_image(image)
+        _, vision_feats, _, _ = self.model._prepare_backbone_features(backbone_out)
+        if self.model.directly_add_no_mem_embed:
+            vision_feats[-1] = vision_feats[-1] + self.model.no_mem_embed
+        feats = [
+            feat.permute(1, 2, 0).reshape(1, -1, *size)
+            for feat, size in zip(vision_feats[::-1], self.feat_sizes[::-1])
+        ][::-1]
+        return feats[-1], feats[0], feats[1]
+
+
+class DecoderWrapper(nn.Module):
+    """Point prompts + image features -> low-res logits and IoU for all mask tokens."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.prompt_encoder = model.sam_prompt_encoder
+        self.mask_decoder = model.sam_mask_decoder
+
+    def forward(self, image_embed, high_res_feat_0, high_res_feat_1, point_coords, point_labels):
+        sparse, dense = self.prompt_encoder(points=(point_coords, point_labels), boxes=None, masks=None)
+        masks, iou, _, _ = self.mask_decoder.predict_masks(
+            image_embeddings=image_embed,
+            image_pe=self.prompt_encoder.get_dense_pe(),
+            sparse_prompt_embeddings=sparse,
+            dense_prompt_embeddings=dense,
+            repeat_image=True,  # no-op for a single prompt
+            high_res_features=[high_res_feat_0, high_res_feat_1],
+        )
+        return masks, iou
+
+
+def export(checkpoint, config, output_dir, opset=17):
+    os.makedirs(output_dir, exist_ok=True)
+    model = build_sam2(config, checkpoint, device="cpu")
+    model.eval()
+
+    encoder = EncoderWrapper(model)
+    image = torch.randn(1, 3, IMAGE_SIZE, IMAGE_SIZE)
+    encoder_path = os.path.join(output_dir, ENCODER_FILE)
+    print(f"🔄 Exporting encoder -> {encoder_path}")
+    t = time.perf_counter()
+    with torch.no_grad():
+        image_embed, feat_s0, feat_s1 = encoder(image)
+        torch.onnx.export(
+            encoder, (image,), encoder_path, opset_version=opset, dynamo=False,
+            input_names=["image"],
+            output_names=["image_embed", "high_res_feat_0", "high_res_feat_1"],
+        )
+    print(f"   done in {time.perf_counter() - t:.1f}s")
+
+    decoder = DecoderWrapper(model)
+    coords = torch.randint(0, IMAGE_SIZE, (2, 3, 2)).float()
+    labels = torch.ones(2, 3)
+    decoder_path = os.path.join(output_dir, DECODER_FILE)
+    print(f"🔄 Exporting decoder -> {decoder_path}")
+    t = time.perf_counter()
+    with torch.no_grad():
+        torch.onnx.export(
+            decoder, (image_embed, feat_s0, feat_s1, coords, labels), decoder_path,
+            opset_version=opset, dynamo=False,
+            input_names=["image_embed", "high_res_feat_0", "high_res_feat_1", "point_coords", "point_labels"],
+            output_names=["low_res_masks", "iou_predictions"],
+            dynamic_axes={
+                "point_coords": {0: "num_prompts", 1: "num_points"},
+                "point_labels": {0: "num_prompts", 1: "num_points"},
+                "low_res_masks": {0: "num_prompts"},
+                "iou_predictions": {0: "num_prompts"},
+            },
+        )
+    print(f"   done in {time.perf_counter() - t:.1f}s")
+
+    # Stability selection for single-mask output happens in the predictor
+    import onnx
+    graph = onnx.load(decoder_path)
+    for key, value in (
+        ("stability_delta", model.sam_mask_decoder.dynamic_multimask_stability_delta),
+        ("stability_thresh", model.sam_mask_decoder.dynamic_multimask_stability_thresh),
+        ("sam2_config", config),
+    ):
+        entry = graph.metadata_props.add()
+        entry.key, entry.value = key, str(value)
+    onnx.save(graph, decoder_path)
+    return encoder_path, decoder_path
+
+
+def quantize_int8(path):
+    """Write the dynamically quantized int8 variant of a graph (no calibration data needed)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    out_path = int8_file(path)
+    print(f"🔄 Quantizing -> {out_path}")
+    quantize_dynamic(path, out_path, weight_type=QuantType.QInt8)
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export SAM 2 to ONNX encoder/decoder graphs")
+    parser.add_argument("--checkpoint", default=SAM2_CHECKPOINT, help="SAM 2 checkpoint")
+    parser.add_argument("--config", default=SAM2_CONFIG, help="SAM 2 model config")
+    parser.add_argument("--output-dir", default="sam2_onnx", help="Directory for the .onnx files")
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset version")
+    parser.add_argument("--int8", action="store_true", help="Also write int8-quantized graphs")
+    args = parser.parse_args()
+
+    print("📦 SAM 2 ONNX EXPORT")
+    print("=" * 70)
+    paths = export(args.checkpoint, args.config, args.output_dir, args.opset)
+    if args.int8:
+        paths += tuple(quantize_int8(path) for path in paths)
+    for path in paths:
+        print(f"✅ {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    print(f"\nUse with: SAM2_BACKEND=onnx SAM2_ONNX_DIR={args.output_dir}")
+    print(f"Verify with: python check_onnx_parity.py <images_dir> --onnx-dir {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Gunicorn configuration: pre-forked uvicorn workers sharing model weights.
+
+    gunicorn api:app -c gunicorn_conf.py
+
+The app and its models are loaded once in the master (``preload_app``) and
+workers are forked from it, so SAM2 weights are shared copy-on-write instead
+of loaded once per worker. See prefork.py for what is re-initialised in each
+worker, and check_prefork_memory.py to measure the per-worker cost.
+
+Configuration (environment):
+    PORT               Listen port (default 8000)
+    WEB_CONCURRENCY    Number of workers (default 2)
+    GUNICORN_TIMEOUT   Worker timeout in seconds (default 120)
+Set SAM2_TORCH_THREADS to cores / workers so workers do not oversubscribe the CPU.
+
+Job queue: the API lifespan runs in every worker, so each one opens the
+JOB_DB_PATH queue and starts its own JOB_WORKERS job threads. They all drain
+the one SQLite file; claims are atomic and a running job is only requeued
+once its owner's lease runs out (see job_queue.py), so no job runs twice and
+a worker starting up never takes over another worker's jobs. Up to
+WEB_CONCURRENCY * JOB_WORKERS jobs run at once, each within its own worker's
+lanes; lower JOB_WORKERS accordingly. JOB_DB_PATH must be on a local disk
+shared by all workers (the default temp dir is), not a network filesystem.
+"""
+
+import os
+
+import prefork
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before workers spawn
+    prefork.load_shared_models()
+
+
+def post_fork(server, worker):
+    prefork.after_fork()
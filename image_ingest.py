@@ -0,0 +1,162 @@
+"""
+Bounded image upload ingestion.
+
+Uploads are read in chunks with a byte limit, and the format and dimensions
+are sniffed from the header bytes so oversized or unsupported images are
+rejected before they are fully buffered or decoded.
+
+Configuration (environment):
+    MAX_UPLOAD_BYTES   Largest accepted upload (default 20 MB)
+    MAX_IMAGE_PIXELS   Largest accepted width * height (default 40 MP)
+"""
+
+import os
+import struct
+from typing import NamedTuple, Optional
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", str(40_000_000)))
+CHUNK_SIZE = 64 * 1024
+# JPEG EXIF/ICC segments can push the frame header far into the file
+SNIFF_LIMIT = 512 * 1024
+
+# JPEG start-of-frame markers that carry the image dimensions
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# JPEG markers without a length field
+_JPEG_STANDALONE = {0x01, 0xD8} | set(range(0xD0, 0xD8))
+
+
+class ImageInfo(NamedTuple):
+    format: str
+    width: int
+    height: int
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+
+class UploadRejected(Exception):
+    """Upload refused before decoding; carries the HTTP status to return."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _sniff_jpeg(data) -> Optional[ImageInfo]:
+    pos = 2
+    n = len(data)
+    while True:
+        # Skip fill bytes up to the next marker
+        while pos < n and data[pos] == 0xFF:
+            pos += 1
+        if pos >= n:
+            return None
+        marker = data[pos]
+        pos += 1
+        if marker in _JPEG_STANDALONE:
+            continue
+        if pos + 2 > n:
+            return None
+        (length,) = struct.unpack(">H", data[pos:pos + 2])
+        if marker in _JPEG_SOF:
+            if pos + 7 > n:
+                return None
+            height, width = struct.unpack(">HH", data[pos + 3:pos + 7])
+            return ImageInfo("jpeg", width, height)
+        if marker == 0xDA:  # start of scan before any frame header
+            raise UploadRejected(415, "Malformed JPEG: no frame header")
+        pos += length
+
+
+def _sniff_webp(data) -> Optional[ImageInfo]:
+    if len(data) < 30:
+        return None
+    chunk = bytes(data[12:16])
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return ImageInfo("webp", width & 0x3FFF, height & 0x3FFF)
+    if chunk == b"VP8L":
+        b0, b1, b2, b3 = data[21:25]
+        width = 1 + (b0 | ((b1 & 0x3F) << 8))
+        height = 1 + ((b1 >> 6) | (b2 << 2) | ((b3 & 0x0F) << 10))
+        return ImageInfo("webp", width, height)
+    if chunk == b"VP8X":
+        width = 1 + int.from_bytes(data[24:27], "little")
+        height = 1 + int.from_bytes(data[27:30], "little")
+        return ImageInfo("webp", width, height)
+    raise UploadRejected(415, "Unsupported WebP variant")
+
+
+def sniff_image_header(data) -> Optional[ImageInfo]:
+    """Identify format and dimensions from the leading bytes of an image.
+
+    Returns None when more bytes are needed; raises UploadRejected (415) for
+    formats the pipelines do not accept.
+    """
+    if len(data) < 12:
+        return None
+    if data[:3] == b"\xff\xd8\xff":
+        return _sniff_jpeg(data)
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        if len(data) < 24:
+            return None
+        width, height = struct.unpack(">II", data[16:24])
+        return ImageInfo("png", width, height)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return _sniff_webp(data)
+    if data[:2] == b"BM":
+        if len(data) < 26:
+            return None
+        width, height = struct.unpack("<ii", data[18:26])
+        return ImageInfo("bmp", abs(width), abs(height))
+    raise UploadRejected(415, "Unsupported image format (expected JPEG, PNG, WebP or BMP)")
+
+
+def check_image_info(info: ImageInfo, max_pixels: int = MAX_IMAGE_PIXELS):
+    if info.width == 0 or info.height == 0:
+        raise UploadRejected(400, "Invalid image dimensions")
+    if info.pixels > max_pixels:
+        raise UploadRejected(
+            413, f"Image too large: {info.width}x{info.height} exceeds {max_pixels} pixels"
+        )
+
+
+async def read_limited(chunks, max_bytes: int = MAX_UPLOAD_BYTES,
+                       max_pixels: int = MAX_IMAGE_PIXELS):
+    """Consume an async iterator of byte chunks into a buffer with early rejection.
+
+    The header is sniffed as soon as enough bytes have arrived, so uploads
+    with too many pixels or an unsupported format stop being read right away.
+    Returns (buffer, ImageInfo); the buffer is a bytearray that decoders can
+    wrap without copying.
+    """
+    buf = bytearray()
+    info = None
+    async for chunk in chunks:
+        buf += chunk
+        if len(buf) > max_bytes:
+            raise UploadRejected(413, f"Upload exceeds {max_bytes} bytes")
+        if info is None:
+            info = sniff_image_header(buf)
+            if info is not None:
+                check_image_info(info, max_pixels)
+            elif len(buf) >= SNIFF_LIMIT:
+                raise UploadRejected(415, "Could not read image dimensions from header")
+    if info is None:
+        info = sniff_image_header(buf)
+        if info is None:
+            raise UploadRejected(400, "Truncated or empty image")
+        check_image_info(info, max_pixels)
+    return buf, info
+
+
+async def iter_upload(file, chunk_size: int = CHUNK_SIZE):
+    """Async chunk iterator over a FastAPI UploadFile."""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Pre-decoded, memory-mapped image shards for repeated evaluation runs.
+
+evaluate_measurements.py otherwise re-reads and re-decodes every JPEG on
+every run. Packing decodes each image once (optionally downscaled to the
+inference resolution) and writes the raw BGR pixels back to back into one
+file, plus a JSON index keyed by filename with each frame's offset and
+shape, and the ground-truth CSV rows (height and widths), so a shard is
+all an evaluation run needs.
+
+Reading maps the file read-only: ``ImageShard.get`` returns a numpy view
+of the mapped pages, with no decode and no copy. Pages come from the OS
+page cache, so any number of processes (e.g. evaluate_measurements.py
+--workers) reading the same shard share one copy of the pixels.
+
+Files: ``calib.shard`` (pixels) and ``calib.shard.json`` (index).
+
+Usage:
+    python image_shard.py --images imgs --csv gt.csv --out calib.shard
+    python image_shard.py --images imgs --csv gt.csv --out calib.shard --max-side 1280
+    python evaluate_measurements.py --shard calib.shard --out results.csv
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import numpy as np
+import pandas as pd
+
+SHARD_VERSION = 1
+# Frames start on cache-line boundaries
+ALIGN = 64
+
+
+def index_path(shard_path) -> Path:
+    return Path(str(shard_path) + ".json")
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    return None if isinstance(value, float) and value != value else value
+
+
+def pack_shard(images_dir: Path, gt_df: pd.DataFrame, out_path: Path, max_side: Optional[int] = None,
+               limit: Optional[int] = None) -> dict:
+    """Decode the images listed in ``gt_df`` into a shard at ``out_path``; returns the index.
+
+    Rows whose image is missing or unreadable are recorded under ``missing``.
+    With ``max_side``, larger images are downscaled (INTER_AREA) so their
+    longer side is at most ``max_side`` pixels.
+    """
+    entries, rows, missing = {}, [], []
+    offset = 0
+    with open(out_path, "wb") as f:
+        for i, row in gt_df.iterrows():
+            if limit is not None and i >= limit:
+                break
+            rows.append({k: _json_value(v) for k, v in row.items()})
+            fname = row["filename"]
+            if fname in entries:
+                continue
+            img = cv2.imread(str(images_dir / fname))
+            if img is None:
+                missing.append(fname)
+                continue
+            h, w = img.shape[:2]
+            scale = 1.0
+            if max_side and max(h, w) > max_side:
+                scale = max_side / max(h, w)
+                img = cv2.resize(img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+            pad = -offset % ALIGN
+            f.write(b"\0" * pad)
+            offset += pad
+            f.write(np.ascontiguousarray(img).data)
+            entries[fname] = {
+                "offset": offset,
+                "shape": list(img.shape),
+                "scale": scale,
+                "height_cm": float(row["height_cm"]),
+            }
+            offset += img.nbytes
+    index = {"version": SHARD_VERSION, "max_side": max_side, "columns": list(gt_df.columns),
+             "rows": rows, "entries": entries, "missing": missing}
+    with open(index_path(out_path), "w") as f:
+        json.dump(index, f)
+    return index
+
+
+class ImageShard:
+    """Read-only view of a packed shard; frames are zero-copy numpy views."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(index_path(self.path)) as f:
+            self.index = json.load(f)
+        if self.index.get("version") != SHARD_VERSION:
+            raise ValueError(f"Unsupported shard version: {self.index.get('version')}")
+        self.entries = self.index["entries"]
+        # An empty file cannot be mapped
+        self._data = np.memmap(self.path, dtype=np.uint8, mode="r") if self.entries else None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, filename):
+        return filename in self.entries
+
+    def get(self, filename) -> Optional[np.ndarray]:
+        """The decoded BGR frame (read-only view), or None if it is not in the shard."""
+        entry = self.entries.get(filename)
+        if entry is None:
+            return None
+        shape = tuple(entry["shape"])
+        size = int(np.prod(shape))
+        return self._data[entry["offset"]:entry["offset"] + size].reshape(shape)
+
+    def height_cm(self, filename) -> float:
+        return self.entries[filename]["height_cm"]
+
+    def ground_truth(self) -> pd.DataFrame:
+        """The packed CSV rows, in order and including missing images, like load_ground_truth's result."""
+        return pd.DataFrame(self.index["rows"], columns=self.index["columns"])
+
+
+def main():
+    from evaluate_measurements import load_ground_truth
+
+    parser = argparse.ArgumentParser(description="Pack images into a pre-decoded, memory-mapped shard")
+    parser.add_argument("--images", required=True, help="Directory with input images")
+    parser.add_argument("--csv", required=True, help="Ground truth CSV (filename,height_cm, optional widths)")
+    parser.add_argument("--out", required=True, help="Shard path (the index is written next to it as .json)")
+    parser.add_argument("--max-side", type=int, default=None,
+                        help="Downscale so the longer side is at most this many pixels (default: keep size)")
+    parser.add_argument("--limit", type=int, default=None, help="Optional limit on number of rows to pack")
+    args = parser.parse_args()
+
+    t = time.perf_counter()
+    out = Path(args.out)
+    index = pack_shard(Path(args.images), load_ground_truth(Path(args.csv)), out,
+                       max_side=args.max_side, limit=args.limit)
+    size_mb = out.stat().st_size / 1024 / 1024
+    print(f"✅ Packed {len(index['entries'])} image(s) into {out} ({size_mb:.1f} MB) "
+          f"in {time.perf_counter() - t:.1f}s")
+    if index["missing"]:
+        print(f"⚠️  {len(index['missing'])} missing or unreadable: {', '.join(index['missing'][:5])}")
+
+
+if __name__ == "__main__":
+    main()
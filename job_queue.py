@@ -0,0 +1,245 @@
+"""
+Persistent SQLite-backed job queue for long-running measurements.
+
+Several processes may share one database file (``uvicorn --workers N``, the
+gunicorn pre-fork mode): claiming is a single atomic UPDATE, so a job is
+only ever claimed once. A claimed job carries a lease that its queue renews
+every ``lease_s / 3`` seconds while the process is alive; a job whose lease
+has run out (its process crashed or was killed) is put back in the queue by
+whichever queue notices first. Finished jobs keep their result for
+`result_ttl_s` seconds; an idempotency key maps repeated submissions to the
+same job for as long as that job exists.
+
+Configuration (environment):
+    JOB_DB_PATH        SQLite file (default: <tmp>/smart_sizing_jobs.sqlite3)
+    JOB_RESULT_TTL_S   Seconds to keep finished results (default 3600)
+    JOB_LEASE_S        Seconds a running job survives its process (default 60)
+    JOB_WORKERS        Worker threads started by api.py (default 1)
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    idempotency_key TEXT UNIQUE,
+    pipeline TEXT NOT NULL,
+    height_cm REAL NOT NULL,
+    image BLOB,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL,
+    owner TEXT,
+    lease_expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+JOB_FIELDS = ("id", "pipeline", "height_cm", "status", "result", "error",
+              "created_at", "started_at", "finished_at", "expires_at")
+
+# Columns added after the first release, created on open if missing
+MIGRATIONS = {"owner": "TEXT", "lease_expires_at": "REAL"}
+
+
+class JobQueue:
+    """FIFO job queue stored in a single SQLite file."""
+
+    def __init__(self, path: str, result_ttl_s: float = 3600.0, lease_s: float = 60.0):
+        self.path = path
+        self.result_ttl_s = result_ttl_s
+        self.lease_s = lease_s
+        # Identifies this queue's claims across processes (and hosts, on a shared volume)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        # Other processes hold the write lock only for single statements
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in MIGRATIONS.items():
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        # Recover jobs whose process died; live claims keep renewing their lease
+        self.requeue_expired()
+        self._closed = threading.Event()
+        self._renewer = threading.Thread(target=self._renew_leases, name="job-lease", daemon=True)
+        self._renewer.start()
+
+    @classmethod
+    def from_env(cls) -> "JobQueue":
+        path = os.environ.get(
+            "JOB_DB_PATH", os.path.join(tempfile.gettempdir(), "smart_sizing_jobs.sqlite3")
+        )
+        return cls(path, float(os.environ.get("JOB_RESULT_TTL_S", "3600")),
+                   float(os.environ.get("JOB_LEASE_S", "60")))
+
+    def close(self):
+        """Stop renewing leases; jobs still running are requeued once their lease runs out."""
+        self._closed.set()
+
+    def _row_to_job(self, row) -> dict:
+        job = dict(zip(JOB_FIELDS, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _select(self, where: str, params: tuple) -> Optional[dict]:
+        row = self._conn.execute(
+            f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE {where}", params
+        ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def submit(self, pipeline: str, image_bytes: bytes, height_cm: float,
+               idempotency_key: Optional[str] = None):
+        """Enqueue a job; returns (job, created).
+
+        With an idempotency key that already names a live job, that job is
+        returned unchanged and nothing is enqueued.
+        """
+        with self._lock:
+            self._purge_expired()
+            job_id = uuid.uuid4().hex
+            # Atomic across processes: a concurrent submit with the same key inserts nothing
+            created = self._conn.execute(
+                "INSERT INTO jobs (id, idempotency_key, pipeline, height_cm, image, status, created_at)"
+                " VALUES (?, ?, ?, ?, ?, 'queued', ?) ON CONFLICT (idempotency_key) DO NOTHING",
+                (job_id, idempotency_key, pipeline, height_cm, image_bytes, time.time()),
+            ).rowcount == 1
+            if not created:
+                return self._select("idempotency_key = ?", (idempotency_key,)), False
+            self._available.notify()
+            return self._select("id = ?", (job_id,)), True
+
+    def claim(self, timeout: Optional[float] = None):
+        """Take the oldest queued job, waiting up to ``timeout`` seconds.
+
+        Returns (job, image_bytes) or None if the queue stayed empty.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                # One statement, so no other process can claim the same row in between
+                now = time.time()
+                rows = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, owner = ?, lease_expires_at = ?"
+                    " WHERE id = (SELECT id FROM jobs WHERE status = 'queued'"
+                    " ORDER BY created_at LIMIT 1) RETURNING id, image",
+                    (now, self.owner, now + self.lease_s),
+                ).fetchall()
+                if rows:
+                    job_id, image_bytes = rows[0]
+                    return self._select("id = ?", (job_id,)), image_bytes
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                # Jobs submitted by other processes do not notify; poll for them
+                self._available.wait(1.0 if remaining is None else min(remaining, 1.0))
+
+    def requeue_expired(self) -> int:
+        """Put running jobs whose lease ran out back in the queue; returns how many."""
+        return self._conn.execute(
+            "UPDATE jobs SET status = 'queued', started_at = NULL, owner = NULL, lease_expires_at = NULL"
+            " WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+            (time.time(),),
+        ).rowcount
+
+    def _renew_leases(self):
+        while not self._closed.wait(self.lease_s / 3.0):
+            try:
+                with self._lock:
+                    self._conn.execute(
+                        "UPDATE jobs SET lease_expires_at = ? WHERE status = 'running' AND owner = ?",
+                        (time.time() + self.lease_s, self.owner),
+                    )
+                    if self.requeue_expired():
+                        self._available.notify_all()
+            except sqlite3.Error as e:
+                print(f"⚠️  Job lease renewal failed: {e}")
+
+    def _finish(self, job_id: str, status: str, result=None, error=None):
+        now = time.time()
+        with self._lock:
+            # Only the current claim may finish a job: after a lost lease it may run elsewhere
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, image = NULL, finished_at = ?,"
+                " expires_at = ?, lease_expires_at = NULL WHERE id = ? AND owner = ? AND status = 'running'",
+                (status, json.dumps(result) if result is not None else None, error,
+                 now, now + self.result_ttl_s, job_id, self.owner),
+            )
+
+    def complete(self, job_id: str, result: dict):
+        self._finish(job_id, "done", result=result)
+
+    def fail(self, job_id: str, error: str):
+        self._finish(job_id, "failed", error=error)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._select("id = ?", (job_id,))
+        if job is not None and job["expires_at"] is not None and job["expires_at"] < time.time():
+            return None
+        return job
+
+    def _purge_expired(self):
+        self._conn.execute("DELETE FROM jobs WHERE expires_at < ?", (time.time(),))
+
+    def purge_expired(self):
+        with self._lock:
+            self._purge_expired()
+
+    def stats(self) -> dict:
+        """Queue depth and job counts by status."""
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(created_at) FROM jobs WHERE status = 'queued'"
+            ).fetchone()[0]
+        return {
+            "queue_depth": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "oldest_queued_age_s": round(time.time() - oldest, 3) if oldest else 0.0,
+        }
+
+
+class JobWorker(threading.Thread):
+    """Background thread that runs queued jobs through ``execute(pipeline, img, height_cm)``."""
+
+    def __init__(self, queue: JobQueue, execute, decode, name: str = "job-worker"):
+        super().__init__(name=name, daemon=True)
+        self.queue = queue
+        self.execute = execute
+        self.decode = decode
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            claimed = self.queue.claim(timeout=1.0)
+            if claimed is None:
+                continue
+            job, image_bytes = claimed
+            try:
+                img = self.decode(image_bytes)
+                result = self.execute(job["pipeline"], img, job["height_cm"])
+                self.queue.complete(job["id"], result)
+            except Exception as e:
+                self.queue.fail(job["id"], str(e))
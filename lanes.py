@@ -0,0 +1,186 @@
+"""
+Priority lanes: separate worker pools per pipeline with a shared slot budget.
+
+Every pipeline runs in its own lane: a dedicated thread pool with its own
+concurrency limit and FIFO wait queue, so a burst of SAM2 requests (seconds
+of CPU each) cannot occupy the threads the ~1 s direct path needs. All lanes
+draw from LANE_SLOTS concurrent slots in total:
+
+- a lane's ``reserved`` slots are never given to other lanes, so the direct
+  path always has capacity even when SAM2 is saturated;
+- when several lanes are waiting for a free slot, it goes to the lane with
+  the lowest virtual time (weighted fair sharing: a lane with weight 3 gets
+  three starts for each start of a weight-1 lane).
+
+Configuration (environment):
+    LANE_SLOTS             Total concurrent pipeline runs (default: CPU count, at least 2)
+    LANE_DIRECT_LIMIT      Max concurrent direct runs (default LANE_SLOTS)
+    LANE_DIRECT_RESERVED   Slots only the direct lane may use (default 1)
+    LANE_DIRECT_WEIGHT     Fair-share weight of the direct lane (default 3)
+    LANE_SAM2_LIMIT        Max concurrent SAM2 runs (default 1; the predictor is
+                           serialised by a lock anyway)
+    LANE_SAM2_RESERVED     Slots only the SAM2 lane may use (default 0)
+    LANE_SAM2_WEIGHT       Fair-share weight of the SAM2 lane (default 1)
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Queue waits kept per lane for the percentiles in stats()
+WAIT_WINDOW = 1024
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round((len(ordered) - 1) * pct / 100.0)))]
+
+
+class Lane:
+    """One pipeline's worker pool, wait queue and counters."""
+
+    def __init__(self, name, limit, reserved=0, weight=1.0):
+        if limit < 1 or reserved < 0 or reserved > limit or weight <= 0:
+            raise ValueError(f"Invalid lane {name}: limit={limit} reserved={reserved} weight={weight}")
+        self.name = name
+        self.limit = limit
+        self.reserved = reserved
+        self.weight = weight
+        self.executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f"lane-{name}")
+        self.waiters = deque()
+        self.running = 0
+        self.vtime = 0.0
+        self.started = 0
+        self.waited = 0
+        self.waits = deque(maxlen=WAIT_WINDOW)
+
+    def stats(self):
+        waits_ms = [w * 1000.0 for w in self.waits]
+        p50, p95 = _percentile(waits_ms, 50), _percentile(waits_ms, 95)
+        return {
+            "limit": self.limit,
+            "reserved": self.reserved,
+            "weight": self.weight,
+            "running": self.running,
+            "queued": len(self.waiters),
+            "started": self.started,
+            "queued_before_start": self.waited,
+            "queue_wait_p50_ms": None if p50 is None else round(p50, 1),
+            "queue_wait_p95_ms": None if p95 is None else round(p95, 1),
+            "queue_wait_max_ms": round(max(waits_ms), 1) if waits_ms else None,
+        }
+
+
+class LaneScheduler:
+    """Runs blocking pipeline calls in per-lane pools within a shared slot budget."""
+
+    def __init__(self, lanes, total_slots):
+        self.lanes = {lane.name: lane for lane in lanes}
+        reserved = sum(lane.reserved for lane in lanes)
+        if reserved > total_slots:
+            raise ValueError(f"Lanes reserve {reserved} slots but only {total_slots} exist")
+        self.total_slots = total_slots
+        self.running = 0
+        self._vclock = 0.0
+
+    @classmethod
+    def from_env(cls, names=("direct", "sam2")):
+        slots = int(os.environ.get("LANE_SLOTS", str(max(2, os.cpu_count() or 1))))
+        defaults = {
+            "direct": {"limit": slots, "reserved": 1, "weight": 3.0},
+            "sam2": {"limit": 1, "reserved": 0, "weight": 1.0},
+        }
+        lanes = []
+        for name in names:
+            d = defaults.get(name, {"limit": slots, "reserved": 0, "weight": 1.0})
+            prefix = f"LANE_{name.upper()}_"
+            lanes.append(Lane(
+                name,
+                limit=min(slots, int(os.environ.get(prefix + "LIMIT", str(d["limit"])))),
+                reserved=int(os.environ.get(prefix + "RESERVED", str(d["reserved"]))),
+                weight=float(os.environ.get(prefix + "WEIGHT", str(d["weight"]))),
+            ))
+        return cls(lanes, slots)
+
+    def capacity(self, name):
+        """Most runs lane ``name`` can have at once, given the other lanes' reservations."""
+        lane = self.lanes[name]
+        others = sum(o.reserved for o in self.lanes.values() if o is not lane)
+        return max(1, min(lane.limit, self.total_slots - others))
+
+    def _can_start(self, lane):
+        if lane.running >= lane.limit:
+            return False
+        # Unused reservations of the other lanes are not available to this one
+        held = sum(max(0, o.reserved - o.running) for o in self.lanes.values() if o is not lane)
+        return self.running + held < self.total_slots
+
+    def _start(self, lane):
+        lane.running += 1
+        self.running += 1
+        lane.started += 1
+        # A lane coming back from idle does not get credit for the time it was idle
+        lane.vtime = max(lane.vtime, self._vclock)
+        self._vclock = lane.vtime
+        lane.vtime += 1.0 / lane.weight
+
+    def _release(self, lane):
+        lane.running -= 1
+        self.running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to waiting lanes, lowest virtual time first."""
+        while True:
+            for lane in self.lanes.values():
+                while lane.waiters and lane.waiters[0].done():
+                    lane.waiters.popleft()  # cancelled while queued
+            ready = [lane for lane in self.lanes.values() if lane.waiters and self._can_start(lane)]
+            if not ready:
+                return
+            lane = min(ready, key=lambda l: l.vtime)
+            self._start(lane)
+            lane.waiters.popleft().set_result(None)
+
+    async def run(self, name, fn):
+        """Run ``fn()`` in lane ``name`` once it gets a slot, and return its result."""
+        lane = self.lanes[name]
+        if not lane.waiters and self._can_start(lane):
+            self._start(lane)
+            lane.waits.append(0.0)
+        else:
+            queued_at = time.perf_counter()
+            granted = asyncio.get_running_loop().create_future()
+            lane.waiters.append(granted)
+            try:
+                await granted
+            except asyncio.CancelledError:
+                if granted.done() and not granted.cancelled():
+                    self._release(lane)  # the slot was handed over as we were cancelled
+                raise
+            lane.waited += 1
+            lane.waits.append(time.perf_counter() - queued_at)
+        loop = asyncio.get_running_loop()
+        try:
+            work = lane.executor.submit(fn)
+        except BaseException:
+            self._release(lane)
+            raise
+        # The slot is held until the thread finishes, even if the caller goes away
+        work.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release, lane))
+        return await asyncio.wrap_future(work)
+
+    def shutdown(self):
+        for lane in self.lanes.values():
+            lane.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "slots": self.total_slots,
+            "running": self.running,
+            "lanes": {name: lane.stats() for name, lane in self.lanes.items()},
+        }
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Load generator for the Person Measurement API.
+
+Drives a running api.py server (for example a local uvicorn) with concurrent
+requests and reports latency percentiles, throughput, error rates and the
+concurrency level at which the server saturates.
+
+Usage:
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 2
+    python load_test.py person.jpg 183 --concurrency 8 --duration 60
+    python load_test.py person.jpg 183 --rate 2 --sam2-fraction 0.1
+    python load_test.py person.jpg 183 --sweep 1,2,4,8,16 --slo-ms 3000
+    python load_test.py person.jpg 183 --transport raw   # compare with the multipart default
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ENDPOINTS = {
+    "direct": "/measure_person",
+    "sam2": "/measure_person_sam2",
+}
+
+# multipart: form upload; raw: image bytes as the body of the /raw endpoint variants
+TRANSPORTS = ("multipart", "raw")
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers (pct in 0-100)."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(samples, elapsed_s):
+    """Aggregate request samples into latency/throughput/error statistics."""
+    latencies = [s["latency_ms"] for s in samples if s["status"] == 200]
+    errors = [s for s in samples if s["status"] != 200]
+    server_errors = [s for s in samples if s["status"] is not None and s["status"] >= 500]
+    rejected = [s for s in samples if s["status"] == 429]
+    total = len(samples)
+    return {
+        "requests": total,
+        "ok": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed_s, 3) if elapsed_s > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "error_rate": round(len(errors) / total, 4) if total else 0.0,
+        "5xx_rate": round(len(server_errors) / total, 4) if total else 0.0,
+        "429_rate": round(len(rejected) / total, 4) if total else 0.0,
+    }
+
+
+class LoadGenerator:
+    """Sends a mix of direct/SAM2 requests with bounded concurrency.
+
+    With ``rate`` set, arrivals are open-loop (Poisson at ``rate`` req/s) and
+    latency is measured from the scheduled arrival time, so client-side
+    queueing behind a saturated server is counted. Without ``rate``, each of
+    the ``concurrency`` threads sends back-to-back requests (closed loop).
+    ``transport`` picks multipart uploads or raw-body requests.
+    """
+
+    def __init__(self, base_url, image_bytes, height_cm, sam2_fraction=0.0,
+                 concurrency=4, rate=None, timeout=120.0, seed=None, transport="multipart"):
+        self.base_url = base_url.rstrip("/")
+        self.image_bytes = image_bytes
+        self.height_cm = height_cm
+        self.sam2_fraction = sam2_fraction
+        self.concurrency = concurrency
+        self.rate = rate
+        self.timeout = timeout
+        self.transport = transport
+        self._rng = random.Random(seed)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.samples = []
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def _pick_pipeline(self):
+        with self._lock:
+            return "sam2" if self._rng.random() < self.sam2_fraction else "direct"
+
+    def _send(self, pipeline, scheduled_at):
+        status = None
+        error = None
+        try:
+            if self.transport == "raw":
+                response = self._session().post(
+                    f"{self.base_url}{ENDPOINTS[pipeline]}/raw",
+                    data=self.image_bytes,
+                    params={"height_cm": self.height_cm},
+                    headers={"Content-Type": "application/octet-stream"},
+                    timeout=self.timeout,
+                )
+            else:
+                response = self._session().post(
+                    f"{self.base_url}{ENDPOINTS[pipeline]}",
+                    files={"file": ("load_test.jpg", self.image_bytes, "image/jpeg")},
+                    data={"height_cm": self.height_cm},
+                    timeout=self.timeout,
+                )
+            status = response.status_code
+            if status != 200:
+                error = response.text[:200]
+        except requests.exceptions.RequestException as e:
+            error = str(e)
+        latency_ms = (time.perf_counter() - scheduled_at) * 1000.0
+        with self._lock:
+            self.samples.append({
+                "pipeline": pipeline,
+                "status": status,
+                "latency_ms": latency_ms,
+                "error": error,
+            })
+
+    def _closed_loop(self, stop_at):
+        while time.perf_counter() < stop_at:
+            self._send(self._pick_pipeline(), time.perf_counter())
+
+    def run(self, duration_s):
+        """Run for ``duration_s`` seconds and return elapsed wall time."""
+        self.samples = []
+        start = time.perf_counter()
+        stop_at = start + duration_s
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            if self.rate:
+                next_at = start
+                while next_at < stop_at:
+                    delay = next_at - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    pool.submit(self._send, self._pick_pipeline(), next_at)
+                    next_at += self._rng.expovariate(self.rate)
+            else:
+                for _ in range(self.concurrency):
+                    pool.submit(self._closed_loop, stop_at)
+        return time.perf_counter() - start
+
+    def report(self, elapsed_s):
+        """Summary overall and per pipeline."""
+        report = {"overall": summarize(self.samples, elapsed_s)}
+        for pipeline in ENDPOINTS:
+            subset = [s for s in self.samples if s["pipeline"] == pipeline]
+            if subset:
+                report[pipeline] = summarize(subset, elapsed_s)
+        return report
+
+
+def find_saturation(levels, min_gain=0.10, slo_ms=None):
+    """Return the first concurrency level where the server stops scaling.
+
+    ``levels`` is a list of (concurrency, overall_summary). Saturation is the
+    first level whose throughput gain over the previous level is below
+    ``min_gain`` or whose p95 latency exceeds ``slo_ms``.
+    """
+    previous = None
+    for concurrency, summary in levels:
+        if slo_ms is not None and summary["p95_ms"] > slo_ms:
+            return concurrency
+        if previous is not None and previous["throughput_rps"] > 0:
+            gain = summary["throughput_rps"] / previous["throughput_rps"] - 1.0
+            if gain < min_gain:
+                return concurrency
+        previous = summary
+    return None
+
+
+def print_report(title, report):
+    print(f"\n📊 {title}")
+    print("-" * 60)
+    for name, s in report.items():
+        print(f"  {name:<8} n={s['requests']:<5} ok={s['ok']:<5} "
+              f"rps={s['throughput_rps']:<7} p50={s['p50_ms']}ms p95={s['p95_ms']}ms "
+              f"p99={s['p99_ms']}ms err={s['error_rate']:.1%} 5xx={s['5xx_rate']:.1%} "
+              f"429={s['429_rate']:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load generator for the measurement API")
+    parser.add_argument("image", help="Image to upload on every request")
+    parser.add_argument("height_cm", type=float, help="Subject height sent with every request")
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--concurrency", type=int, default=4, help="Max in-flight requests")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per run")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Open-loop arrival rate in req/s (default: closed loop)")
+    parser.add_argument("--sam2-fraction", type=float, default=0.0,
+                        help="Fraction of requests sent to /measure_person_sam2")
+    parser.add_argument("--sweep", default=None,
+                        help="Comma-separated concurrency levels to find the saturation point")
+    parser.add_argument("--slo-ms", type=float, default=None,
+                        help="p95 latency above which a sweep level counts as saturated")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout (s)")
+    parser.add_argument("--transport", choices=TRANSPORTS, default="multipart",
+                        help="multipart form uploads or raw image bodies (/raw endpoints)")
+    parser.add_argument("--label", default=None, help="Label for this run, e.g. the hosting tier")
+    parser.add_argument("--json", default=None, help="Write the full report to this JSON file")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the request mix")
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        image_bytes = f.read()
+
+    levels = [int(c) for c in args.sweep.split(",")] if args.sweep else [args.concurrency]
+    results = []
+    for concurrency in levels:
+        generator = LoadGenerator(
+            args.url, image_bytes, args.height_cm,
+            sam2_fraction=args.sam2_fraction,
+            concurrency=concurrency,
+            rate=args.rate,
+            timeout=args.timeout,
+            seed=args.seed,
+            transport=args.transport,
+        )
+        print(f"🔄 concurrency={concurrency} rate={args.rate or 'closed-loop'} "
+              f"transport={args.transport} for {args.duration:.0f}s...")
+        elapsed = generator.run(args.duration)
+        report = generator.report(elapsed)
+        print_report(f"concurrency={concurrency}", report)
+        results.append({"concurrency": concurrency, "report": report})
+
+    output = {
+        "label": args.label,
+        "url": args.url,
+        "rate": args.rate,
+        "sam2_fraction": args.sam2_fraction,
+        "transport": args.transport,
+        "levels": results,
+    }
+    if len(levels) > 1:
+        saturation = find_saturation(
+            [(r["concurrency"], r["report"]["overall"]) for r in results],
+            slo_ms=args.slo_ms,
+        )
+        output["saturation_concurrency"] = saturation
+        print("\n" + "=" * 60)
+        if saturation is None:
+            print("✅ No saturation within the sweep; try higher concurrency levels")
+        else:
+            print(f"⚠️  Saturates at concurrency {saturation}")
+            print("   Size uvicorn --workers so the expected peak concurrency stays below this")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(output, f, indent=2)
+        print(f"Saved report to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
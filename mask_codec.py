@@ -0,0 +1,117 @@
+"""
+COCO-style run-length encoding for binary masks.
+
+A mask is stored as ``{"size": [h, w], "counts": str}``: alternating run
+lengths of 0s and 1s over the column-major (Fortran order) pixels, starting
+with 0s, compressed to the ASCII form used by pycocotools, so clients can
+decode it with ``pycocotools.mask.decode``. ``counts`` may also be a plain
+list of ints (uncompressed RLE).
+
+Area, bounding box and crops are computed from the runs, without
+materialising the full-resolution mask.
+"""
+
+import numpy as np
+
+
+def compress_counts(counts):
+    """Run lengths -> pycocotools' compressed ASCII string."""
+    out = []
+    for i, x in enumerate(counts):
+        x = int(x)
+        if i > 2:
+            x -= int(counts[i - 2])
+        more = True
+        while more:
+            c = x & 0x1F
+            x >>= 5
+            more = x != -1 if c & 0x10 else x != 0
+            if more:
+                c |= 0x20
+            out.append(chr(c + 48))
+    return "".join(out)
+
+
+def decompress_counts(s):
+    """pycocotools' compressed ASCII string -> run lengths."""
+    counts = []
+    p = 0
+    while p < len(s):
+        x = 0
+        k = 0
+        more = True
+        while more:
+            c = ord(s[p]) - 48
+            x |= (c & 0x1F) << (5 * k)
+            more = c & 0x20
+            p += 1
+            k += 1
+            if not more and c & 0x10:
+                x |= -1 << (5 * k)
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+    return counts
+
+
+def _counts(rle):
+    counts = rle["counts"]
+    if isinstance(counts, (str, bytes)):
+        counts = decompress_counts(counts.decode("ascii") if isinstance(counts, bytes) else counts)
+    return np.asarray(counts, dtype=np.int64)
+
+
+def encode(mask, compress=True):
+    """Encode an HxW boolean mask."""
+    h, w = mask.shape
+    flat = np.asarray(mask, dtype=bool).ravel(order="F")
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    bounds = np.concatenate([[0], changes, [flat.size]])
+    counts = np.diff(bounds)
+    if flat.size and flat[0]:
+        counts = np.concatenate([[0], counts])
+    counts = counts.tolist()
+    return {"size": [h, w], "counts": compress_counts(counts) if compress else counts}
+
+
+def area(rle):
+    """Number of foreground pixels."""
+    return int(_counts(rle)[1::2].sum())
+
+
+def bbox(rle):
+    """COCO box ``[x, y, width, height]`` of the foreground ([0, 0, 0, 0] if empty)."""
+    h, _ = rle["size"]
+    counts = _counts(rle)
+    ends = np.cumsum(counts)
+    starts = (ends - counts)[1::2]
+    ends = ends[1::2] - 1  # last pixel of each run of 1s
+    keep = counts[1::2] > 0
+    starts, ends = starts[keep], ends[keep]
+    if starts.size == 0:
+        return [0, 0, 0, 0]
+    col_start, col_end = starts // h, ends // h
+    spans = col_end > col_start  # a run crossing a column covers the full height
+    y0 = 0 if spans.any() else int((starts % h).min())
+    y1 = h - 1 if spans.any() else int((ends % h).max())
+    x0, x1 = int(col_start.min()), int(col_end.max())
+    return [x0, y0, x1 - x0 + 1, y1 - y0 + 1]
+
+
+def crop(rle, rmin, rmax, cmin, cmax):
+    """Decode only ``mask[rmin:rmax, cmin:cmax]``."""
+    h, _ = rle["size"]
+    counts = _counts(rle)
+    lo, hi = cmin * h, cmax * h
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    lengths = np.clip(np.minimum(ends, hi) - np.maximum(starts, lo), 0, None)
+    values = np.arange(counts.size) % 2 == 1
+    columns = np.repeat(values, lengths).reshape(cmax - cmin, h)
+    return np.ascontiguousarray(columns.T[rmin:rmax])
+
+
+def decode(rle):
+    """Decode to an HxW boolean mask."""
+    h, w = rle["size"]
+    return crop(rle, 0, h, 0, w)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Async Python client for the Person Measurement API.
+
+One pooled keep-alive HTTP connection pool (httpx) per client; images are
+sent to the raw-body endpoints by default (no multipart encoding). Requests
+refused with 429/503, and connection errors, are retried with exponential
+backoff, honouring the server's Retry-After. Job submissions carry an
+Idempotency-Key, so a retried submit never creates a second job.
+
+Library:
+    async with MeasurementClient("http://localhost:8000") as client:
+        result = await client.measure("person.jpg", 175, pipeline="sam2")
+        results = await client.measure_many([("a.jpg", 175), ("b.jpg", 182)], concurrency=8)
+        job = await client.submit_job("a.jpg", 175)
+        done = await client.wait_job(job["job_id"])
+
+CLI:
+    python measure_client.py imgs/*.jpg --height-cm 175 --concurrency 8
+    python measure_client.py imgs/*.jpg --height-cm 175 --pipeline sam2 --jobs
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+ENDPOINTS = {"direct": "/measure_person", "sam2": "/measure_person_sam2"}
+RETRY_STATUSES = (429, 503)
+
+
+class MeasurementError(Exception):
+    """The API answered with an error status (after any retries)."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class MeasurementClient:
+    """Async client with a pooled connection, bounded concurrency and retries."""
+
+    def __init__(self, base_url: str = "http://localhost:8000", max_connections: int = 8,
+                 timeout: float = 120.0, max_retries: int = 6, backoff_s: float = 0.5,
+                 max_backoff_s: float = 30.0, raw: bool = True):
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.raw = raw
+        self.retries = 0
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    def _delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff_s)
+        # Full jitter, so many clients backing off do not retry in lockstep
+        return random.uniform(0, min(self.max_backoff_s, self.backoff_s * 2 ** attempt))
+
+    async def _request(self, method: str, path: str, **kwargs) -> dict:
+        """Send with retries on 429/503 and connection errors; returns the JSON body."""
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = await self._http.request(method, path, **kwargs)
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    break
+            self.retries += 1
+            await asyncio.sleep(self._delay(attempt, response))
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get("detail", response.text)
+            except ValueError:
+                detail = response.text
+            raise MeasurementError(response.status_code, str(detail))
+        return response.json()
+
+    @staticmethod
+    async def _image_bytes(image) -> bytes:
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return bytes(image)
+        return await asyncio.to_thread(Path(image).read_bytes)
+
+    async def measure(self, image, height_cm: float, pipeline: str = "direct",
+                      annotate: Optional[str] = None, return_mask: bool = False,
+                      timeout_s: Optional[float] = None) -> dict:
+        """Measure one image (path or bytes); returns the MeasurementResponse dict."""
+        body = await self._image_bytes(image)
+        headers = {"X-Request-Timeout": str(timeout_s)} if timeout_s else {}
+        options = {"annotate": annotate} if annotate else {}
+        if return_mask:
+            options["return_mask"] = "true"
+        if self.raw:
+            headers["Content-Type"] = "application/octet-stream"
+            return await self._request("POST", f"{ENDPOINTS[pipeline]}/raw", content=body,
+                                       params={"height_cm": height_cm, **options}, headers=headers)
+        return await self._request("POST", ENDPOINTS[pipeline], files={"file": ("image.jpg", body)},
+                                   data={"height_cm": str(height_cm), **options}, headers=headers)
+
+    async def measure_many(self, items, pipeline: str = "direct", concurrency: Optional[int] = None,
+                           return_exceptions: bool = True, **options) -> list:
+        """Measure ``(image, height_cm)`` pairs with at most ``concurrency`` in flight.
+
+        Results are in input order; with ``return_exceptions`` a failed item
+        yields its exception instead of cancelling the rest.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.max_connections)
+
+        async def one(image, height_cm):
+            async with semaphore:
+                return await self.measure(image, height_cm, pipeline=pipeline, **options)
+
+        return await asyncio.gather(*(one(image, h) for image, h in items),
+                                    return_exceptions=return_exceptions)
+
+    async def submit_job(self, image, height_cm: float, pipeline: str = "sam2",
+                         idempotency_key: Optional[str] = None) -> dict:
+        """Enqueue a measurement job; returns the JobResponse dict (status ``queued``)."""
+        body = await self._image_bytes(image)
+        return await self._request(
+            "POST", "/jobs", files={"file": ("image.jpg", body)},
+            data={"height_cm": str(height_cm), "pipeline": pipeline},
+            headers={"Idempotency-Key": idempotency_key or uuid.uuid4().hex},
+        )
+
+    async def get_job(self, job_id: str, wait: float = 0.0) -> dict:
+        return await self._request("GET", f"/jobs/{job_id}", params={"wait": wait})
+
+    async def wait_job(self, job_id: str, timeout: Optional[float] = None) -> dict:
+        """Long-poll until the job is done or failed (or ``timeout`` seconds pass)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = 30.0 if deadline is None else max(0.0, min(30.0, deadline - time.monotonic()))
+            job = await self.get_job(job_id, wait=wait)
+            if job["status"] in ("done", "failed") or (deadline is not None and time.monotonic() >= deadline):
+                return job
+
+    async def run_jobs(self, items, pipeline: str = "sam2", concurrency: Optional[int] = None,
+                       timeout: Optional[float] = None) -> list:
+        """Submit ``(image, height_cm)`` pairs as jobs and wait for all; JobResponse dicts in input order."""
+        semaphore = asyncio.Semaphore(concurrency or self.max_connections)
+
+        async def one(image, height_cm):
+            async with semaphore:
+                job = await self.submit_job(image, height_cm, pipeline=pipeline)
+            return await self.wait_job(job["job_id"], timeout=timeout)
+
+        return await asyncio.gather(*(one(image, h) for image, h in items))
+
+
+async def _run_cli(args):
+    items = [(path, args.height_cm) for path in args.images]
+    t = time.perf_counter()
+    async with MeasurementClient(args.url, max_connections=args.concurrency, raw=not args.multipart) as client:
+        if args.jobs:
+            outputs = await client.run_jobs(items, pipeline=args.pipeline)
+            outputs = [job.get("result") or {"ok": False, "error": job.get("error")} for job in outputs]
+        else:
+            outputs = await client.measure_many(items, pipeline=args.pipeline)
+        retries = client.retries
+    failed = 0
+    for path, output in zip(args.images, outputs):
+        if isinstance(output, Exception):
+            output = {"ok": False, "error": str(output)}
+        failed += not output.get("ok")
+        print(json.dumps({"image": path, **output}))
+    elapsed = time.perf_counter() - t
+    print(f"✅ {len(items) - failed}/{len(items)} ok in {elapsed:.1f}s "
+          f"({len(items) / elapsed:.2f} images/s, {retries} retries)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure many images through the API")
+    parser.add_argument("images", nargs="+", help="Image files")
+    parser.add_argument("--height-cm", type=float, required=True, help="Subject height for every image")
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--pipeline", choices=sorted(ENDPOINTS), default="direct")
+    parser.add_argument("--concurrency", type=int, default=8, help="Max requests in flight")
+    parser.add_argument("--jobs", action="store_true", help="Use the /jobs endpoints instead")
+    parser.add_argument("--multipart", action="store_true", help="Send multipart uploads instead of raw bodies")
+    args = parser.parse_args()
+    asyncio.run(_run_cli(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Clip measurement with SAM 2's video predictor + MediaPipe Pose.
+
+Running segment_person_sam2 on every frame of a clip repeats the prompt
+search (and its extra decoder passes) each time. Here the person is
+prompted once, on the keyframe, with the same prompt search as the image
+pipeline; SAM 2's video predictor then propagates the mask through the
+following frames using its streaming memory of recent frames. Each frame's
+person crop is measured with MediaPipe Pose, and the clip estimate is the
+median over the frames that could be measured.
+
+Frames are processed in chunks of SAM2_VIDEO_CHUNK frames: the predictor's
+state (normalised frames and per-frame memory) only ever covers one chunk,
+and the last mask of a chunk seeds the next one, so memory stays bounded
+for clips of any length. If the person is lost, the next frame is prompted
+from scratch.
+
+Needs the torch backend: the video predictor has no ONNX export, so with
+SAM2_BACKEND=onnx clip measurement fails up front.
+
+Configuration (environment):
+    SAM2_VIDEO_CHUNK   Frames per propagation chunk (default 16)
+
+Usage:
+    python3 measure_clip_sam2.py clip.mp4 183
+    python3 measure_clip_sam2.py frames_dir/ 183 --stride 2 --max-frames 60
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from itertools import islice
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+import sam2.sam2_video_predictor as sam2_video_predictor
+
+import mask_codec
+import sam2_runtime
+from deadlines import check_deadline
+from measure_person_sam2 import crop_person, mask_boxes, measure_person_image, segment_person_sam2
+
+CHUNK_FRAMES = int(os.environ.get("SAM2_VIDEO_CHUNK", "16"))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+# Width fields of measure_person_image's result, by their MeasurementResponse names
+WIDTH_FIELDS = {
+    "shoulder_width_cm": "shoulder_width_cm",
+    "hip_width_cm": "hip_bone_width_cm",
+    "waist_width_cm": "waist_width_cm",
+    "chest_width_cm": "chest_width_cm",
+}
+
+# init_state loads frames through a module-level function; see _init_chunk_state
+_init_state_lock = threading.Lock()
+
+
+def read_clip_frames(source, stride=1, max_frames=None):
+    """Yield BGR frames from a video file or a directory of images (sorted by name)."""
+    source = Path(source)
+    if source.is_dir():
+        paths = sorted(p for p in source.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        frames = (cv2.imread(str(p)) for p in paths[::stride])
+    else:
+        frames = _read_video(source, stride)
+    for frame in islice(frames, max_frames):
+        if frame is None:
+            raise ValueError("Unreadable frame in clip")
+        yield frame
+
+
+def _read_video(path, stride):
+    capture = cv2.VideoCapture(str(path))
+    if not capture.isOpened():
+        raise FileNotFoundError(path)
+    try:
+        index = 0
+        while capture.grab():
+            if index % stride == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                yield frame
+            index += 1
+    finally:
+        capture.release()
+
+
+class _ChunkFrames:
+    """A chunk's BGR frames as the predictor's ``images`` sequence, normalised on access."""
+
+    def __init__(self, frames, image_size):
+        self.frames = frames
+        self.image_size = image_size
+        self.mean = torch.tensor((0.485, 0.456, 0.406))[:, None, None]
+        self.std = torch.tensor((0.229, 0.224, 0.225))[:, None, None]
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        rgb = cv2.cvtColor(self.frames[index], cv2.COLOR_BGR2RGB)
+        rgb = cv2.resize(rgb, (self.image_size, self.image_size), interpolation=cv2.INTER_LINEAR)
+        image = torch.from_numpy(rgb).permute(2, 0, 1).float() / 255.0
+        return (image - self.mean) / self.std
+
+
+def _init_chunk_state(predictor, frames):
+    """``predictor.init_state`` over in-memory frames instead of a JPEG folder or MP4.
+
+    Only the current frame is ever normalised to model resolution, so a
+    chunk holds its decoded frames plus the predictor's per-frame memory.
+    """
+    h, w = frames[0].shape[:2]
+    images = _ChunkFrames(frames, predictor.image_size)
+    with _init_state_lock:
+        load = sam2_video_predictor.load_video_frames
+        sam2_video_predictor.load_video_frames = lambda **kwargs: (images, h, w)
+        try:
+            return predictor.init_state(video_path=None, offload_video_to_cpu=True)
+        finally:
+            sam2_video_predictor.load_video_frames = load
+
+
+def _frame_output(frame, mask):
+    """``(cropped, PersonMask)`` for a boolean mask, or ``(frame, None)`` if there is none."""
+    if mask is None:
+        return frame, None
+    areas, boxes = mask_boxes(mask[None])
+    if areas[0] == 0:
+        return frame, None
+    return crop_person(frame, mask_codec.encode(mask), tuple(int(v) for v in boxes[0]))
+
+
+def _keyframe_mask(frame, deadline):
+    """Prompt search on one frame with the image predictor; boolean mask or None."""
+    _, person_mask = segment_person_sam2(None, image=frame, return_mask=True, deadline=deadline)
+    return None if person_mask is None else mask_codec.decode(person_mask.rle)
+
+
+def segment_clip_sam2(frames, chunk_frames=None, deadline=None):
+    """Segment the person through a clip; yields ``(index, cropped, PersonMask or None)``.
+
+    ``frames`` is any iterable of BGR frames (e.g. ``read_clip_frames``); it is
+    consumed one chunk at a time. ``deadline`` is checked before every frame.
+    Raises RuntimeError before reading any frame unless SAM2_BACKEND=torch.
+    """
+    sam2_runtime.require_video_backend()
+    chunk_frames = max(2, chunk_frames or CHUNK_FRAMES)
+    frames = iter(frames)
+    frame = next(frames, None)
+    index = 0
+    while frame is not None:
+        # Keyframe: the image pipeline's prompt search, once
+        mask = _keyframe_mask(frame, deadline)
+        yield (index, *_frame_output(frame, mask))
+        while mask is not None and mask.any():
+            # The last frame of a chunk (and its mask) seeds the next chunk
+            chunk = [frame] + list(islice(frames, chunk_frames - 1))
+            if len(chunk) == 1:
+                return
+            outputs = []
+            with sam2_runtime.inference_context():
+                predictor = sam2_runtime.get_video_predictor()
+                state = _init_chunk_state(predictor, chunk)
+                predictor.add_new_mask(state, frame_idx=0, obj_id=1, mask=mask)
+                for t, _, logits in predictor.propagate_in_video(state):
+                    if t == 0:
+                        continue  # the seed frame was already yielded
+                    check_deadline(deadline, "sam2_propagate")
+                    mask = (logits[0, 0] > 0).numpy()
+                    outputs.append((index + t, *_frame_output(chunk[t], mask)))
+                del state
+            yield from outputs
+            frame = chunk[-1]
+            index += len(chunk) - 1
+        # Person not found, or lost by the end of a chunk: prompt the next frame from scratch
+        frame = next(frames, None)
+        index += 1
+
+
+def measure_clip(frames, real_height_cm, chunk_frames=None, deadline=None):
+    """Segment and measure every frame of a clip; widths are medians over measured frames.
+
+    Returns a dict shaped like the API's MeasurementResponse plus
+    ``frames``, ``measured_frames``, ``per_frame`` and ``timings``.
+    """
+    t_start = time.perf_counter()
+    per_frame = []
+    measure_s = 0.0
+    for index, cropped, person_mask in segment_clip_sam2(frames, chunk_frames, deadline):
+        entry = {"frame": index, "ok": False}
+        if person_mask is None:
+            entry["error"] = "No person mask"
+        else:
+            t = time.perf_counter()
+            result = measure_person_image(cropped, real_height_cm=real_height_cm, draw=False,
+                                          verbose=False, deadline=deadline)
+            measure_s += time.perf_counter() - t
+            if result is None:
+                entry["error"] = "No person detected in segmented image"
+            else:
+                entry.update({"ok": True, "pixel_to_cm": result.get("px_to_cm")})
+                entry.update({key: result.get(src) for key, src in WIDTH_FIELDS.items()})
+        per_frame.append(entry)
+
+    measured = [entry for entry in per_frame if entry["ok"]]
+    summary = {
+        "ok": bool(measured),
+        "height_input_cm": real_height_cm,
+        "frames": len(per_frame),
+        "measured_frames": len(measured),
+    }
+    if not measured:
+        summary["error"] = "No frame could be measured"
+    for key in ("pixel_to_cm", *WIDTH_FIELDS):
+        values = [entry[key] for entry in measured if entry.get(key) is not None]
+        summary[key] = float(np.median(values)) if values else None
+    total_s = time.perf_counter() - t_start
+    summary["timings"] = {"segment_s": round(total_s - measure_s, 3), "measure_s": round(measure_s, 3),
+                          "total_s": round(total_s, 3)}
+    summary["per_frame"] = per_frame
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure a person through a video clip (SAM2 video predictor)")
+    parser.add_argument("clip", help="Video file, or a directory of frame images")
+    parser.add_argument("height_cm", type=float, help="Known subject height in centimeters")
+    parser.add_argument("--stride", type=int, default=1, help="Use every n-th frame")
+    parser.add_argument("--max-frames", type=int, default=None, help="Stop after this many frames")
+    parser.add_argument("--chunk", type=int, default=CHUNK_FRAMES, help="Frames per propagation chunk")
+    parser.add_argument("--json", action="store_true", help="Print the full result (with per-frame values) as JSON")
+    args = parser.parse_args()
+
+    try:
+        sam2_runtime.require_video_backend()
+    except RuntimeError as e:
+        print("❌", e)
+        raise SystemExit(1)
+    result = measure_clip(read_clip_frames(args.clip, args.stride, args.max_frames), args.height_cm,
+                          chunk_frames=args.chunk)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    if not result["ok"]:
+        print("❌", result["error"])
+        raise SystemExit(1)
+    if not args.json:
+        print(f"✅ {result['measured_frames']}/{result['frames']} frames measured "
+              f"in {result['timings']['total_s']:.1f}s")
+        for key in WIDTH_FIELDS:
+            print(f"{key.replace('_cm', '').replace('_', ' ').capitalize():<17}: {result[key]:.1f} cm (median)")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,27 +7,38 @@ and clothing. For improved results, collect calibration data and fit learned rat
 import cv2
 import mediapipe as mp
 import numpy as np
-from matplotlib import pyplot as plt
 
 # Use Tasks API
 from mediapipe.tasks.python.vision import PoseLandmarker
 from mediapipe.tasks.python import BaseOptions
 import urllib.request
 import tempfile
+import threading
 import os
+from typing import NamedTuple
 
-# Cache the pose landmarker to avoid reloading it on every call
-_pose_landmarker_cache = None
+from annotation import render_annotation
+from deadlines import check_deadline
 
-def create_pose_landmarker():
-    """Create or return cached pose landmarker with downloaded model"""
-    global _pose_landmarker_cache
-    
-    # Return cached instance if available
-    if _pose_landmarker_cache is not None:
-        return _pose_landmarker_cache
-    
-    # Download the pose model if not already downloaded
+# Cache the pose landmarker to avoid reloading it on every call; one per thread,
+# since lane and job worker threads run detection concurrently and a MediaPipe
+# graph is not thread-safe
+_pose_landmarkers = threading.local()
+
+# Two-stage (coarse-to-fine ROI) pose inference, opt-in via POSE_ROI=1 (off by default); see detect_pose_roi
+POSE_ROI = os.environ.get("POSE_ROI", "0") == "1"
+# Longest side of the downscaled frame used to locate the person
+ROI_COARSE_MAX_SIDE = 512
+# Padding around the coarse landmarks' box, as a fraction of its height: the nose
+# is the topmost landmark, the ankles sit above the soles and the silhouette
+# extends past the shoulder/hip landmarks, and the model needs some context
+ROI_PAD_Y = 0.15
+ROI_PAD_X = 0.25
+# Above this fraction of the frame, the crop buys nothing over the full frame
+ROI_MAX_AREA_FRACTION = 0.6
+
+def pose_model_path():
+    """Path of the pose model file, downloading it on first use."""
     model_url = 'https://storage.googleapis.com/mediapipe-models/pose_landmarker/pose_landmarker_lite/float16/1/pose_landmarker_lite.task'
     model_dir = os.path.join(os.path.dirname(__file__), 'models')
     os.makedirs(model_dir, exist_ok=True)
@@ -37,10 +48,24 @@ def create_pose_landmarker():
         print("Downloading pose model...")
         urllib.request.urlretrieve(model_url, model_path)
         print("Model downloaded successfully")
+    return model_path
+
+def create_pose_landmarker():
+    """Create or return this thread's cached pose landmarker with downloaded model"""
+    # Return cached instance if available
+    landmarker = getattr(_pose_landmarkers, "landmarker", None)
+    if landmarker is not None:
+        return landmarker
     
     # Create and cache the landmarker
-    _pose_landmarker_cache = PoseLandmarker.create_from_model_path(model_path)
-    return _pose_landmarker_cache
+    landmarker = PoseLandmarker.create_from_model_path(pose_model_path())
+    _pose_landmarkers.landmarker = landmarker
+    return landmarker
+
+def reset_pose_landmarker():
+    """Forget the cached landmarkers (e.g. in a forked worker); the next call recreates them."""
+    global _pose_landmarkers
+    _pose_landmarkers = threading.local()
 
 def _landmark_px(lms, idx, w, h):
     lm = lms[idx]
@@ -50,6 +75,61 @@ def _landmark_px(lms, idx, w, h):
     lm = lms[idx]
     return np.array([lm.x * w, lm.y * h]), lm.visibility
 
+class Landmark(NamedTuple):
+    """Pose landmark in normalized coordinates of the full image."""
+    x: float
+    y: float
+    visibility: float
+
+def _detect(pose_landmarker, image):
+    """Landmarks of the first detected pose in ``image``, or None."""
+    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=np.ascontiguousarray(image))
+    results = pose_landmarker.detect(mp_image)
+    return results.pose_landmarks[0] if results.pose_landmarks else None
+
+def pose_roi(lms, w, h):
+    """Padded crop box ``(x0, y0, x1, y1)`` in pixels around normalized landmarks."""
+    xs = np.clip([lm.x for lm in lms], 0.0, 1.0) * w
+    ys = np.clip([lm.y for lm in lms], 0.0, 1.0) * h
+    body_h = ys.max() - ys.min()
+    pad_x, pad_y = body_h * ROI_PAD_X, body_h * ROI_PAD_Y
+    x0, x1 = int(max(0, xs.min() - pad_x)), int(min(w, np.ceil(xs.max() + pad_x)))
+    y0, y1 = int(max(0, ys.min() - pad_y)), int(min(h, np.ceil(ys.max() + pad_y)))
+    return x0, y0, x1, y1
+
+def detect_pose_roi(pose_landmarker, image, deadline=None):
+    """Coarse-to-fine pose detection for subjects that fill little of the frame.
+
+    A cheap pass on a copy downscaled to ``ROI_COARSE_MAX_SIDE`` locates the
+    person; the second pass runs on a tight crop at native resolution, so
+    the subject fills the landmark model's input, and the landmarks are
+    mapped back to the full image. Falls back to a single full-frame pass
+    when the coarse pass finds nobody or the person already fills most of
+    the frame. Returns (landmarks or None, stats dict).
+    """
+    h, w = image.shape[:2]
+    scale = min(1.0, ROI_COARSE_MAX_SIDE / max(h, w))
+    coarse = cv2.resize(image, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+    check_deadline(deadline, "pose_coarse")
+    lms = _detect(pose_landmarker, coarse)
+    if lms is None:
+        check_deadline(deadline, "pose")
+        return _detect(pose_landmarker, image), {"roi": None, "fallback": "coarse_missed"}
+
+    x0, y0, x1, y1 = pose_roi(lms, w, h)
+    if (x1 - x0) * (y1 - y0) > ROI_MAX_AREA_FRACTION * w * h:
+        check_deadline(deadline, "pose")
+        return _detect(pose_landmarker, image), {"roi": None, "fallback": "large_subject"}
+
+    check_deadline(deadline, "pose_fine")
+    fine = _detect(pose_landmarker, image[y0:y1, x0:x1])
+    if fine is None:
+        # The coarse landmarks are still better than nothing
+        return lms, {"roi": [x0, y0, x1, y1], "fallback": "fine_missed"}
+    cw, ch = x1 - x0, y1 - y0
+    mapped = [Landmark((x0 + lm.x * cw) / w, (y0 + lm.y * ch) / h, lm.visibility) for lm in fine]
+    return mapped, {"roi": [x0, y0, x1, y1], "fallback": None}
+
 def measure_person(
     image_path: str = "person.jpg",
     real_height_cm: float = 177.0,
@@ -58,6 +138,10 @@ def measure_person(
     draw: bool = True,
     verbose: bool = True,
     return_image: bool = False,
+    image: np.ndarray = None,
+    annotate: str = None,
+    deadline=None,
+    roi: bool = None,
 ):
     """Compute body width estimates from a single full-body image.
 
@@ -72,11 +156,23 @@ def measure_person(
     min_detection_confidence : float
         Minimum detection confidence for pose inference.
     draw : bool
-        Whether to render annotated image (matplotlib).
+        Whether to display the annotated image (matplotlib).
     verbose : bool
         Whether to print summary measurements.
     return_image : bool
         If True, include annotated image (RGB array) in the result dict.
+    image : np.ndarray, optional
+        Already-decoded BGR image; when given, ``image_path`` is not read.
+    annotate : str, optional
+        "jpeg" or "webp": attach a reduced-size encoded preview with landmarks
+        and measurement lines as ``annotated_image`` (bytes). Needs no display.
+    deadline : deadlines.Deadline, optional
+        Checked before pose detection and annotation; raises
+        ``deadlines.RequestAborted`` when expired or cancelled.
+    roi : bool, optional
+        Two-stage pose inference (``detect_pose_roi``): locate the person on a
+        downscaled frame, then detect on a native-resolution crop. Defaults to
+        the POSE_ROI environment variable. The crop box is reported as ``pose_roi``.
 
     Returns
     -------
@@ -85,27 +181,29 @@ def measure_person(
         On failure: {"ok": False, "error": str}.
     """
 
-    image = cv2.imread(image_path)
+    if image is None:
+        image = cv2.imread(image_path)
     if image is None:
         return {"ok": False, "error": f"Image not found: {image_path}"}
 
     h, w = image.shape[:2]
-    
-    # Convert to MediaPipe Image format
-    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image)
+    if roi is None:
+        roi = POSE_ROI
 
     # Create pose landmarker
     pose_landmarker = create_pose_landmarker()
     
     # Detect pose
-    results = pose_landmarker.detect(mp_image)
+    roi_stats = None
+    if roi:
+        lms, roi_stats = detect_pose_roi(pose_landmarker, image, deadline)
+    else:
+        check_deadline(deadline, "pose")
+        lms = _detect(pose_landmarker, image)
 
-    if not results.pose_landmarks:
+    if lms is None:
         return {"ok": False, "error": "No person detected"}
 
-    # Get the first (and typically only) pose
-    lms = results.pose_landmarks[0]
-
     def get(idx):
         return _landmark_px(lms, idx, w, h)
 
@@ -147,10 +245,12 @@ def measure_person(
     # Multi-slice torso sampling between shoulders & hips (linear interpolation)
     slice_fracs = [0.30, 0.40, 0.50, 0.60, 0.70]
     slice_widths_cm = []
+    slice_lines = []
     for f in slice_fracs:
         left_point = l_shoulder * (1 - f) + l_hip * f
         right_point = r_shoulder * (1 - f) + r_hip * f
         slice_widths_cm.append(np.linalg.norm(left_point - right_point) * px_to_cm)
+        slice_lines.append((left_point, right_point))
 
     # Waist heuristic: minimal width slice (inward taper assumption)
     waist_width_cm = float(min(slice_widths_cm))
@@ -169,6 +269,8 @@ def measure_person(
         "slice_fracs": slice_fracs,
         "visibility": visibility,
     }
+    if roi_stats is not None:
+        result["pose_roi"] = roi_stats["roi"]
 
     if verbose:
         print(f"Height (input)   : {real_height_cm:.1f} cm")
@@ -176,8 +278,24 @@ def measure_person(
         print(f"Chest width      : {chest_width_cm:.1f} cm")
         print(f"Waist width      : {waist_width_cm:.1f} cm")
         print(f"Hip width        : {hip_width_cm:.1f} cm")
+        if roi_stats is not None:
+            print(f"Pose ROI         : {roi_stats['roi']} ({roi_stats['fallback'] or 'cropped'})")
 
-    if draw:
+    if annotate:
+        check_deadline(deadline, "annotate")
+        result["annotated_image"] = render_annotation(
+            image,
+            landmarks_px=[(lm.x * w, lm.y * h) for lm in lms],
+            lines=[(l_shoulder, r_shoulder), (l_hip, r_hip)] + slice_lines,
+            labels=[
+                f"Height {real_height_cm:.1f}cm",
+                f"Shoulders {shoulder_width_cm:.1f}cm Waist {waist_width_cm:.1f}cm",
+            ],
+            fmt=annotate,
+        )
+        result["annotated_image_format"] = annotate
+
+    if draw or return_image:
         annotated = image.copy()
         # Draw landmarks manually since Tasks API drawing is different
         for landmark in lms:
@@ -202,10 +320,13 @@ def measure_person(
             (0, 255, 255),
             2,
         )
-        plt.figure(figsize=(7, 10))
-        plt.imshow(cv2.cvtColor(annotated, cv2.COLOR_BGR2RGB))
-        plt.axis("off")
-        plt.show()
+        if draw:
+            from matplotlib import pyplot as plt
+
+            plt.figure(figsize=(7, 10))
+            plt.imshow(cv2.cvtColor(annotated, cv2.COLOR_BGR2RGB))
+            plt.axis("off")
+            plt.show()
         if return_image:
             result["annotated_image_rgb"] = cv2.cvtColor(annotated, cv2.COLOR_BGR2RGB)
 
@@ -219,13 +340,25 @@ if __name__ == "__main__":
     parser.add_argument("height_cm", type=float, help="Known subject height in centimeters (e.g. 183)")
     parser.add_argument("--draw", action="store_true", help="Display annotated image")
     parser.add_argument("--quiet", action="store_true", help="Suppress verbose output")
+    parser.add_argument("--save-annotation", default=None,
+                        help="Write a headless annotated preview (.jpg or .webp) to this path")
+    parser.add_argument("--roi", action="store_true",
+                        help="Two-stage pose inference: locate the person, then detect on a native-resolution crop")
     args = parser.parse_args()
 
-    output = measure_person(str(args.image), real_height_cm=float(args.height_cm), draw=args.draw, verbose=(not args.quiet))
+    annotate = None
+    if args.save_annotation:
+        annotate = "webp" if args.save_annotation.lower().endswith(".webp") else "jpeg"
+    output = measure_person(str(args.image), real_height_cm=float(args.height_cm), draw=args.draw,
+                            verbose=(not args.quiet), annotate=annotate, roi=args.roi or None)
     if not output.get("ok"):
         print("Error:", output.get("error"))
         raise SystemExit(1)
 
+    if annotate:
+        with open(args.save_annotation, "wb") as f:
+            f.write(output["annotated_image"])
+
     # Print concise results only when --quiet is used
     # If not quiet, `measure_person` already printed verbose output
     if args.quiet:
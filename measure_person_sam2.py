@@ -18,142 +18,225 @@ Usage:
 """
 
 import sys
+import threading
+import time
+from typing import NamedTuple
+
 import cv2
 import numpy as np
-from matplotlib import pyplot as plt
 import mediapipe as mp
 
 # Use Tasks API
 from mediapipe.tasks.python.vision import PoseLandmarker
 from mediapipe.tasks.python import BaseOptions
-import urllib.request
-import os
+
+import mask_codec
+from annotation import render_annotation
+from debug_sink import get_debug_sink
+from measure_person import pose_model_path
+from deadlines import check_deadline
 
 try:
-    from sam2.build_sam import build_sam2
-    from sam2.sam2_image_predictor import SAM2ImagePredictor
+    import sam2_runtime
+    from sam2_runtime import SAM2_CHECKPOINT, SAM2_CONFIG
 except ImportError:
     print("Please install sam2: pip install sam2")
     sys.exit(1)
 
-# Create pose landmarker (reuse the same function)
+# Pose landmarkers, one per thread: a MediaPipe graph is not shared between
+# concurrent callers, and re-creating it for every image is slow
+_pose_landmarkers = threading.local()
+
 def create_pose_landmarker():
-    """Create pose landmarker with downloaded model"""
-    # Download the pose model if not already downloaded
-    model_url = 'https://storage.googleapis.com/mediapipe-models/pose_landmarker/pose_landmarker_lite/float16/1/pose_landmarker_lite.task'
-    model_dir = os.path.join(os.path.dirname(__file__), 'models')
-    os.makedirs(model_dir, exist_ok=True)
-    model_path = os.path.join(model_dir, 'pose_landmarker_lite.task')
+    """Create (once per thread) the pose landmarker, downloading the model if needed"""
+    landmarker = getattr(_pose_landmarkers, "landmarker", None)
+    if landmarker is None:
+        landmarker = PoseLandmarker.create_from_model_path(pose_model_path())
+        _pose_landmarkers.landmarker = landmarker
+    return landmarker
+
+def reset_pose_landmarkers():
+    """Forget cached landmarkers (e.g. in a forked worker); the next call recreates them."""
+    global _pose_landmarkers
+    _pose_landmarkers = threading.local()
+
+def mask_boxes(masks):
+    """Areas and bounding boxes of a (K, H, W) mask stack in single reductions.
+
+    Returns ``(areas, boxes)``; ``boxes[k]`` is ``(rmin, rmax, cmin, cmax)``
+    (inclusive), or -1s for an empty mask.
+    """
+    masks = masks.astype(bool, copy=False)
+    k, h, w = masks.shape
+    rows = masks.any(axis=2)  # (K, H)
+    cols = masks.any(axis=1)  # (K, W)
+    areas = np.count_nonzero(masks.reshape(k, -1), axis=1)
+    has = rows.any(axis=1)
+    rmin = np.where(has, rows.argmax(axis=1), -1)
+    rmax = np.where(has, h - 1 - rows[:, ::-1].argmax(axis=1), -1)
+    cmin = np.where(has, cols.argmax(axis=1), -1)
+    cmax = np.where(has, w - 1 - cols[:, ::-1].argmax(axis=1), -1)
+    return areas, np.stack([rmin, rmax, cmin, cmax], axis=1)
+
+
+class PersonMask(NamedTuple):
+    """Person mask kept as COCO RLE over the full image, plus the crop box."""
+
+    rle: dict
+    box: tuple  # (rmin, rmax, cmin, cmax) of the cropped image
+
+    def crop(self):
+        """Dense boolean mask aligned with the cropped image."""
+        return mask_codec.crop(self.rle, *self.box)
+
+
+def _find_person_mask(predictor, h, w, prompt_points, deadline=None):
+    """Prompt SAM 2 for the person.
+
+    Returns ``(mask or None, center mask ratio, bbox or None)`` with ``mask``
+    a 0/1 plane of the predictor output and ``bbox`` as
+    ``(rmin, rmax, cmin, cmax)``. Prompt points used are appended to
+    ``prompt_points``. ``deadline`` is checked before each predict call.
+    """
+    # Strategy 1: center point, keep the largest of the multimask outputs
+    center = [w//2, h//2]
+    prompt_points.append(center)
+    check_deadline(deadline, "sam2_predict")
+    masks, _, _ = predictor.predict(
+        point_coords=np.array([center]),
+        point_labels=np.array([1]),
+        multimask_output=True  # Get multiple masks to choose the best
+    )
+    areas, boxes = mask_boxes(masks)
+    best = int(np.argmax(areas))
+    mask_ratio = areas[best] / (h * w)
+    if mask_ratio >= 0.1:
+        return masks[best], mask_ratio, tuple(int(v) for v in boxes[best])
+
+    # Mask too small (< 10% of image): try points at common person locations
+    # (upper body, torso, lower body). The torso point is the center point,
+    # so only the other two are decoded, together in one batched call.
+    print(f"Warning: Mask too small ({mask_ratio:.1%} of image), trying different strategy...")
+    test_points = [[w//2, h//3], center, [w//2, 2*h//3]]
+    prompt_points += test_points
+    check_deadline(deadline, "sam2_fallback")
+    extra, _, _ = predictor.predict(
+        point_coords=np.array([[test_points[0]], [test_points[2]]]),
+        point_labels=np.ones((2, 1)),
+        multimask_output=True
+    )
+    extra_areas, extra_boxes = mask_boxes(extra.reshape(-1, h, w))
+    # Candidates in the original prompt order, so ties keep the first mask
+    n = masks.shape[0]
+    all_masks = (extra[0], masks, extra[1])
+    all_areas = np.concatenate([extra_areas[:n], areas, extra_areas[n:]])
+    all_boxes = np.concatenate([extra_boxes[:n], boxes, extra_boxes[n:]])
+    best = int(np.argmax(all_areas))
+    if all_areas[best] == 0:
+        return None, mask_ratio, None
+    return all_masks[best // n][best % n], mask_ratio, tuple(int(v) for v in all_boxes[best])
+
+def crop_person(image, rle, bbox):
+    """Crop ``image`` to the mask's bounding box ``(rmin, rmax, cmin, cmax)`` plus padding.
+
+    Returns ``(cropped, PersonMask)``.
+    """
+    h, w = image.shape[:2]
+    rmin, rmax, cmin, cmax = bbox
     
-    if not os.path.exists(model_path):
-        print("Downloading pose model...")
-        urllib.request.urlretrieve(model_url, model_path)
-        print("Model downloaded successfully")
+    # Add generous padding to ensure full body (head and feet) is included
+    # More padding vertically (50%) to capture head/feet, less horizontally (20%)
+    padding_vertical = int(0.50 * (rmax - rmin))
+    padding_horizontal = int(0.20 * (cmax - cmin))
+    rmin = max(0, rmin - padding_vertical)
+    rmax = min(h, rmax + padding_vertical)
+    cmin = max(0, cmin - padding_horizontal)
+    cmax = min(w, cmax + padding_horizontal)
     
-    return PoseLandmarker.create_from_model_path(model_path)
-
-# SAM 2 checkpoint - update this path based on your downloaded model
-SAM2_CHECKPOINT = "sam2.1_hiera_small.pt"
-SAM2_CONFIG = "configs/sam2.1/sam2.1_hiera_s.yaml"
+    # Crop image to bounding box
+    return image[rmin:rmax, cmin:cmax], PersonMask(rle, (rmin, rmax, cmin, cmax))
 
 # --- SAM 2 segmentation ---
-def segment_person_sam2(image_path):
-    """Segment person using SAM 2 and crop to bounding box."""
-    image = cv2.imread(image_path)
+def segment_person_sam2(image_path, image=None, return_mask=False, debug_sink=None, deadline=None):
+    """Segment person using SAM 2 and crop to bounding box.
+
+    Pass an already-decoded BGR ``image`` to skip reading ``image_path``.
+    With ``return_mask=True`` returns ``(cropped, mask)`` where ``mask`` is a
+    PersonMask (None if segmentation failed); ``mask.rle`` covers the full
+    image and ``mask.crop()`` decodes the part aligned with ``cropped``.
+    Crops, masks, prompt points and timings go to ``debug_sink`` (default:
+    the SAM2_DEBUG_DIR sink from debug_sink.py, which is off unless configured).
+    ``deadline`` (deadlines.Deadline) is checked between stages and raises
+    ``deadlines.RequestAborted`` once expired or cancelled.
+    """
+    sink = debug_sink if debug_sink is not None else get_debug_sink()
+    # Unsampled requests build no debug records or mask crops
+    debug = sink.sampled()
+    t_start = time.perf_counter()
+    timings = {}
+    if image is None:
+        image = cv2.imread(image_path)
     if image is None:
         raise FileNotFoundError(image_path)
     image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    
-    # Build SAM 2 model
-    sam2_model = build_sam2(SAM2_CONFIG, SAM2_CHECKPOINT, device='cpu')
-    predictor = SAM2ImagePredictor(sam2_model)
-    
-    predictor.set_image(image_rgb)
-    
-    # Use automatic mask generation to find the person
-    # Try multiple strategies: center point, and if that fails, try automatic
     h, w = image.shape[:2]
+    prompt_points = []
     
-    # Strategy 1: Try center point
-    input_point = np.array([[w//2, h//2]])
-    input_label = np.array([1])
-    
-    masks, scores, _ = predictor.predict(
-        point_coords=input_point,
-        point_labels=input_label,
-        multimask_output=True  # Get multiple masks to choose the best
-    )
-    
-    # Select the largest mask (likely the person)
-    largest_idx = np.argmax([m.sum() for m in masks])
-    mask = masks[largest_idx].astype(bool)
-    
-    # Check if mask is reasonable (should be at least 10% of image)
-    mask_ratio = mask.sum() / (h * w)
-    if mask_ratio < 0.1:
-        print(f"Warning: Mask too small ({mask_ratio:.1%} of image), trying different strategy...")
-        # Try points at common person locations (upper-middle, middle, lower-middle)
-        test_points = np.array([
-            [w//2, h//3],   # upper body
-            [w//2, h//2],   # torso  
-            [w//2, 2*h//3]  # lower body
-        ])
-        best_mask = None
-        best_size = 0
+    # The cached predictor holds per-image state between set_image and predict
+    with sam2_runtime.predictor_lock, sam2_runtime.inference_context():
+        # Build SAM 2 model (once per process)
+        predictor = sam2_runtime.get_predictor()
+        timings["load_model_s"] = time.perf_counter() - t_start
         
-        for point in test_points:
-            masks_temp, _, _ = predictor.predict(
-                point_coords=point.reshape(1, 2),
-                point_labels=np.array([1]),
-                multimask_output=True
-            )
-            for m in masks_temp:
-                if m.sum() > best_size:
-                    best_size = m.sum()
-                    best_mask = m
+        check_deadline(deadline, "sam2_set_image")
+        t = time.perf_counter()
+        predictor.set_image(image_rgb)
+        timings["set_image_s"] = time.perf_counter() - t
         
-        if best_mask is not None and best_size > 0:
-            mask = best_mask.astype(bool)
-        else:
-            print("Warning: SAM 2 segmentation failed, using original image")
-            return image
+        t = time.perf_counter()
+        mask, mask_ratio, bbox = _find_person_mask(predictor, h, w, prompt_points, deadline)
+        # Keep only the compact form; the mask stacks are released here
+        rle = mask_codec.encode(mask) if mask is not None else None
+        del mask
+        timings["predict_s"] = time.perf_counter() - t
     
-    # Find bounding box of the mask
-    rows = np.any(mask, axis=1)
-    cols = np.any(mask, axis=0)
+    def debug_record(status, **extra):
+        timings["total_s"] = time.perf_counter() - t_start
+        return {"status": status, "image_size": [w, h], "prompt_points": prompt_points,
+                "mask_ratio": float(mask_ratio), "timings": timings, **extra}
     
-    if not rows.any() or not cols.any():
+    if rle is None:
         # No valid mask, return original image
         print("Warning: SAM 2 segmentation failed, using original image")
-        return image
-    
-    rmin, rmax = np.where(rows)[0][[0, -1]]
-    cmin, cmax = np.where(cols)[0][[0, -1]]
-    
-    # Add generous padding to ensure full body (head and feet) is included
-    # More padding vertically (50%) to capture head/feet, less horizontally (20%)
-    padding_vertical = int(0.50 * (rmax - rmin))
-    padding_horizontal = int(0.20 * (cmax - cmin))
-    rmin = max(0, rmin - padding_vertical)
-    rmax = min(h, rmax + padding_vertical)
-    cmin = max(0, cmin - padding_horizontal)
-    cmax = min(w, cmax + padding_horizontal)
+        if debug:
+            sink.submit(debug_record("failed"))
+        return (image, None) if return_mask else image
     
-    # Crop image to bounding box
-    cropped = image[rmin:rmax, cmin:cmax]
+    cropped, person_mask = crop_person(image, rle, bbox)
+    rmin, rmax, cmin, cmax = person_mask.box
     
-    # Debug: save cropped image
-    import os
-    debug_path = image_path.replace('.png', '_cropped.png').replace('.jpeg', '_cropped.jpeg').replace('.jpg', '_cropped.jpg')
-    cv2.imwrite(debug_path, cropped)
-    print(f"Saved cropped image to {debug_path}")
-    print(f"Original size: {w}x{h}, Cropped size: {cropped.shape[1]}x{cropped.shape[0]}")
-    print(f"Bbox: r[{rmin}-{rmax}], c[{cmin}-{cmax}]")
+    # Debug artifacts are written off the hot path by the sink (if sampled)
+    if debug:
+        record = debug_record(
+            "ok",
+            bbox={"rmin": int(rmin), "rmax": int(rmax), "cmin": int(cmin), "cmax": int(cmax)},
+            cropped_size=[cropped.shape[1], cropped.shape[0]],
+        )
+        sink.submit(record, {"crop": cropped, "mask": person_mask.crop()})
     
+    if return_mask:
+        return cropped, person_mask
     return cropped
 
 # --- MediaPipe measurement ---
-def measure_person_image(image, real_height_cm=177.0, draw=True, verbose=True):
+def measure_person_image(image, real_height_cm=177.0, draw=True, verbose=True, mask=None, annotate=None,
+                         deadline=None):
+    """Measure widths on a (segmented) image.
+
+    With ``annotate`` ("jpeg" or "webp") the result includes a reduced-size
+    encoded preview as ``annotated_image``, overlaying ``mask`` if given.
+    ``deadline`` is checked before pose detection and annotation.
+    """
     h, w = image.shape[:2]
     
     # Convert to MediaPipe Image format
@@ -163,6 +246,7 @@ def measure_person_image(image, real_height_cm=177.0, draw=True, verbose=True):
     pose_landmarker = create_pose_landmarker()
     
     # Detect pose
+    check_deadline(deadline, "pose")
     results = pose_landmarker.detect(mp_image)
 
     if not results.pose_landmarks:
@@ -189,10 +273,12 @@ def measure_person_image(image, real_height_cm=177.0, draw=True, verbose=True):
     hip_bone_width = np.linalg.norm(l_hip - r_hip) * px_to_cm
     slice_fracs = [0.30, 0.40, 0.50, 0.60, 0.70]
     slice_widths_cm = []
+    slice_lines = []
     for f in slice_fracs:
         left_point = l_shoulder * (1 - f) + l_hip * f
         right_point = r_shoulder * (1 - f) + r_hip * f
         slice_widths_cm.append(np.linalg.norm(left_point - right_point) * px_to_cm)
+        slice_lines.append((left_point, right_point))
     waist_width = float(min(slice_widths_cm))
     chest_approx = slice_widths_cm[0] * 1.03
     if verbose:
@@ -208,11 +294,13 @@ def measure_person_image(image, real_height_cm=177.0, draw=True, verbose=True):
             x, y = int(landmark.x * w), int(landmark.y * h)
             cv2.circle(annotated, (x, y), 5, (0, 255, 0), -1)
         
+        from matplotlib import pyplot as plt
+
         plt.figure(figsize=(7, 10))
         plt.imshow(cv2.cvtColor(annotated, cv2.COLOR_BGR2RGB))
         plt.axis("off")
         plt.show()
-    return {
+    result = {
         "shoulder_width_cm": shoulder_width,
         "hip_bone_width_cm": hip_bone_width,
         "waist_width_cm": waist_width,
@@ -220,6 +308,21 @@ def measure_person_image(image, real_height_cm=177.0, draw=True, verbose=True):
         "slice_widths_cm": slice_widths_cm,
         "px_to_cm": px_to_cm,
     }
+    if annotate:
+        check_deadline(deadline, "annotate")
+        result["annotated_image"] = render_annotation(
+            image,
+            landmarks_px=[(lm.x * w, lm.y * h) for lm in lms],
+            lines=[(l_shoulder, r_shoulder), (l_hip, r_hip)] + slice_lines,
+            mask=mask,
+            labels=[
+                f"Height {real_height_cm:.1f}cm",
+                f"Shoulders {shoulder_width:.1f}cm Waist {waist_width:.1f}cm",
+            ],
+            fmt=annotate,
+        )
+        result["annotated_image_format"] = annotate
+    return result
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
@@ -229,6 +332,10 @@ if __name__ == "__main__":
     real_height_cm = float(sys.argv[2])
     print("Segmenting person with SAM 2...")
     masked_img = segment_person_sam2(image_path)
+    # Keep the cropped image next to the input for inspection
+    debug_path = image_path.replace('.png', '_cropped.png').replace('.jpeg', '_cropped.jpeg').replace('.jpg', '_cropped.jpg')
+    cv2.imwrite(debug_path, masked_img)
+    print(f"Saved cropped image to {debug_path}")
     print("Measuring with MediaPipe...")
     result = measure_person_image(masked_img, real_height_cm=real_height_cm, draw=True, verbose=True)
     print("Result:", result)
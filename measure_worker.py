@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Long-lived measurement worker speaking JSONL over stdin/stdout.
+
+The measure_person*.py CLIs pay interpreter start, imports and model load for
+every image. This worker loads the models once and then measures one job per
+input line, writing one result line per job as soon as it finishes, so shell
+pipelines and services in other languages can use it as a cheap subprocess.
+
+Input, one JSON object per line:
+    {"id": "a1", "path": "imgs/a.jpg", "height_cm": 175, "pipeline": "sam2"}
+    {"id": "a2", "image_b64": "<base64 JPEG/PNG>", "height_cm": 182}
+Optional keys: "pipeline" (default --pipeline), "annotate" ("jpeg"/"webp",
+returned base64) and "return_mask" (SAM2 person mask as COCO RLE). Without
+"id", the 1-based input line number is used.
+
+Output, one JSON object per line, shaped like the API's MeasurementResponse
+plus "id" and "elapsed_s":
+    {"id": "a1", "ok": true, "shoulder_width_cm": 41.2, ..., "elapsed_s": 5.91}
+    {"id": "a2", "ok": false, "error": "No person detected"}
+Only results go to stdout; logs go to stderr.
+
+With --workers N, jobs run in N forked processes that share the model
+weights loaded before the fork (see prefork.py); results then arrive in
+completion order unless --ordered. Set SAM2_TORCH_THREADS so that
+N x threads does not exceed the CPU count.
+
+Usage:
+    python measure_worker.py < jobs.jsonl > results.jsonl
+    python measure_worker.py --pipeline sam2 --workers 4 < jobs.jsonl
+    ls imgs/*.jpg | jq -Rc '{path: ., height_cm: 175}' | python measure_worker.py
+"""
+
+import argparse
+import base64
+import json
+import multiprocessing
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from pipelines import PIPELINES, SAM2_AVAILABLE
+import prefork
+
+# Set by main(): the pipeline used when a job does not name one
+default_pipeline = "direct"
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def load_image(job):
+    """Decode the job's image from "path" or "image_b64" (BGR)."""
+    if "image_b64" in job:
+        data = np.frombuffer(base64.b64decode(job["image_b64"]), np.uint8)
+        img = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    elif "path" in job:
+        img = cv2.imread(job["path"])
+    else:
+        raise ValueError('Job needs "path" or "image_b64"')
+    if img is None:
+        raise ValueError("Invalid or unreadable image")
+    return img
+
+
+def run_job(numbered_line):
+    """Measure one input line; returns the result line (without newline)."""
+    line_no, line = numbered_line
+    t = time.perf_counter()
+    job_id = line_no
+    try:
+        job = json.loads(line)
+        job_id = job.get("id", line_no)
+        pipeline = job.get("pipeline", default_pipeline)
+        if pipeline not in PIPELINES:
+            raise ValueError(f"Unknown pipeline: {pipeline}")
+        if pipeline == "sam2" and not SAM2_AVAILABLE:
+            raise ValueError("SAM2 is not available")
+        result = PIPELINES[pipeline](
+            load_image(job), float(job["height_cm"]),
+            annotate=job.get("annotate"), return_mask=bool(job.get("return_mask", False)),
+        )
+        result = dict(result)
+    except Exception as e:
+        result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    result = {"id": job_id, **result, "elapsed_s": round(time.perf_counter() - t, 3)}
+    return json.dumps(result, default=_json_default)
+
+
+def read_jobs(stream):
+    for line_no, line in enumerate(stream, 1):
+        if line.strip():
+            yield line_no, line
+
+
+def warm_pose(pipeline):
+    """Create this process's pose landmarker for ``pipeline`` ahead of the first job."""
+    if pipeline == "sam2":
+        from measure_person_sam2 import create_pose_landmarker
+    else:
+        from measure_person import create_pose_landmarker
+    create_pose_landmarker()
+
+
+def _init_worker(pipeline):
+    global default_pipeline
+    default_pipeline = pipeline
+    prefork.after_fork()
+    warm_pose(pipeline)
+
+
+def load_models(pipeline):
+    """Load the weights the default pipeline needs, before any worker is forked."""
+    t = time.perf_counter()
+    if pipeline == "sam2":
+        prefork.load_shared_models()
+    else:
+        prefork.pose_model_path()
+    print(f"✅ Models loaded for '{pipeline}' ({time.perf_counter() - t:.1f}s)")
+
+
+def main():
+    global default_pipeline
+    parser = argparse.ArgumentParser(description="JSONL measurement worker (stdin -> stdout)")
+    parser.add_argument("--pipeline", choices=sorted(PIPELINES), default="direct",
+                        help="Pipeline for jobs that do not name one; its models are loaded up front")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (default 1, in-process)")
+    parser.add_argument("--ordered", action="store_true",
+                        help="With --workers > 1, write results in input order instead of as they finish")
+    args = parser.parse_args()
+    if args.pipeline == "sam2" and not SAM2_AVAILABLE:
+        parser.error("SAM2 is not available")
+
+    results = sys.stdout
+    sys.stdout = sys.stderr  # pipelines print warnings; stdout carries only results
+    default_pipeline = args.pipeline
+    load_models(args.pipeline)
+
+    count = 0
+    t = time.perf_counter()
+    if args.workers <= 1:
+        warm_pose(args.pipeline)
+        outputs = map(run_job, read_jobs(sys.stdin))
+        pool = None
+    else:
+        pool = multiprocessing.get_context("fork").Pool(
+            args.workers, initializer=_init_worker, initargs=(args.pipeline,))
+        imap = pool.imap if args.ordered else pool.imap_unordered
+        outputs = imap(run_job, read_jobs(sys.stdin))
+    try:
+        for output in outputs:
+            results.write(output + "\n")
+            results.flush()
+            count += 1
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    print(f"✅ {count} job(s) in {time.perf_counter() - t:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
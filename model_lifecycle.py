@@ -0,0 +1,125 @@
+"""
+SAM2 model lifecycle: unload when idle or over a memory budget, reload on demand.
+
+On small instances (512 MB - 1 GB) keeping SAM2 resident next to MediaPipe
+can be the difference between fitting and being OOM-killed. A background
+thread watches the process and drops the SAM2 predictor when it has been
+idle for SAM2_IDLE_UNLOAD_S, or sooner when resident memory is above
+SAM2_MEMORY_BUDGET_MB. The next SAM2 request reloads it (the API also
+prefetches as soon as a SAM2 request or job arrives). MediaPipe and the
+direct pipeline are never unloaded and keep serving while SAM2 reloads.
+
+Configuration (environment):
+    SAM2_IDLE_UNLOAD_S      Idle seconds before unloading (default 0 = never)
+    SAM2_MEMORY_BUDGET_MB   Resident-memory budget for the process (default 0 = none);
+                            above it SAM2 is unloaded after SAM2_BUDGET_GRACE_S idle
+    SAM2_BUDGET_GRACE_S     Idle seconds required before a budget unload (default 5)
+
+Not used in pre-fork workers that inherited the master's SAM2 weights
+(gunicorn_conf.py): RSS counts those shared pages in every worker, and
+unloading would only trade the shared copy for a private one on reload.
+"""
+
+import os
+import threading
+
+import sam2_runtime
+
+
+def resident_mb():
+    """Current resident set size of this process in MB (Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        return None
+
+
+class ModelLifecycle:
+    """Background idle/budget unloader for the process-wide SAM2 predictor."""
+
+    def __init__(self, idle_unload_s=0.0, memory_budget_mb=0.0, budget_grace_s=5.0, interval_s=None):
+        self.idle_unload_s = idle_unload_s
+        self.memory_budget_mb = memory_budget_mb
+        self.budget_grace_s = budget_grace_s
+        limits = [t for t in (idle_unload_s, budget_grace_s if memory_budget_mb else 0) if t > 0]
+        self.interval_s = interval_s or max(1.0, min(limits, default=30.0) / 4)
+        self.idle_unloads = 0
+        self.budget_unloads = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            idle_unload_s=float(os.environ.get("SAM2_IDLE_UNLOAD_S", "0")),
+            memory_budget_mb=float(os.environ.get("SAM2_MEMORY_BUDGET_MB", "0")),
+            budget_grace_s=float(os.environ.get("SAM2_BUDGET_GRACE_S", "5")),
+        )
+
+    @property
+    def enabled(self):
+        return self.idle_unload_s > 0 or self.memory_budget_mb > 0
+
+    def start(self):
+        if self.enabled and sam2_runtime.shared_weights:
+            print("⚠️  SAM2 weights are shared with the pre-fork master; "
+                  "SAM2_IDLE_UNLOAD_S / SAM2_MEMORY_BUDGET_MB are ignored")
+            return
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sam2-lifecycle", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"⚠️  SAM2 lifecycle check failed: {e}")
+
+    def check(self):
+        """Unload SAM2 if the idle or memory policy says so; returns the reason or None."""
+        idle = sam2_runtime.idle_seconds()
+        if not sam2_runtime.is_loaded() or idle is None:
+            return None
+        reason = None
+        if self.idle_unload_s > 0 and idle >= self.idle_unload_s:
+            reason = "idle"
+        elif self.memory_budget_mb > 0 and idle >= self.budget_grace_s:
+            rss = resident_mb()
+            if rss is not None and rss > self.memory_budget_mb:
+                reason = "budget"
+        if reason and sam2_runtime.unload():
+            if reason == "idle":
+                self.idle_unloads += 1
+            else:
+                self.budget_unloads += 1
+            print(f"💤 Unloaded SAM2 model ({reason}, idle {idle:.0f}s)")
+            return reason
+        return None
+
+    def note_demand(self):
+        """A SAM2 request or job is on its way: start loading the model now."""
+        sam2_runtime.prefetch()
+
+    def stats(self):
+        idle = sam2_runtime.idle_seconds()
+        last_load_s = sam2_runtime.lifecycle_counters["last_load_s"]
+        return {
+            "loaded": sam2_runtime.is_loaded(),
+            "model_mb": round(sam2_runtime.loaded_model_bytes() / 1024 / 1024, 1),
+            "process_rss_mb": round(resident_mb() or 0.0, 1),
+            "idle_s": None if idle is None else round(idle, 1),
+            "loads": sam2_runtime.lifecycle_counters["loads"],
+            "unloads": sam2_runtime.lifecycle_counters["unloads"],
+            "idle_unloads": self.idle_unloads,
+            "budget_unloads": self.budget_unloads,
+            "last_load_s": None if last_load_s is None else round(last_load_s, 2),
+            "idle_unload_s": self.idle_unload_s,
+            "memory_budget_mb": self.memory_budget_mb,
+            "shared_weights": sam2_runtime.shared_weights,
+            "unloader_running": self._thread is not None,
+        }
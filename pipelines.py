@@ -0,0 +1,142 @@
+"""
+Measurement pipelines shared by the API endpoints and background workers.
+
+Each pipeline takes a decoded OpenCV (BGR) image and the subject height and
+returns a dict shaped like the API's MeasurementResponse. An optional
+``deadline`` (deadlines.Deadline) is checked between stages.
+
+The pipelines in ``PIPELINES`` first pass the image through the quality gate
+(quality_gate.py), which reports its findings in ``quality``; with
+QUALITY_GATE=reject, failing images return ``ok: false`` without running
+any inference.
+"""
+
+import functools
+
+from deadlines import check_deadline
+from measure_person import measure_person as measure_person_basic
+from quality_gate import get_quality_gate
+
+# Try to import SAM2 functions (optional)
+try:
+    from measure_person_sam2 import segment_person_sam2, measure_person_image
+    SAM2_AVAILABLE = True
+except ImportError:
+    print("⚠️  SAM2 not available - SAM2 endpoints will return error")
+    SAM2_AVAILABLE = False
+    segment_person_sam2 = None
+    measure_person_image = None
+
+
+def run_direct(img, height_cm, annotate=None, return_mask=False, deadline=None):
+    """MediaPipe Pose directly on the image.
+
+    ``annotate`` ("jpeg"/"webp") attaches an encoded preview as ``annotated_image``.
+    There is no segmentation here, so ``return_mask`` is ignored.
+    """
+    return measure_person_basic(
+        image_path=None,
+        real_height_cm=height_cm,
+        draw=False,  # Don't show plots in API
+        verbose=False,  # Don't print to console
+        return_image=False,  # Don't return image data
+        image=img,
+        annotate=annotate,
+        deadline=deadline
+    )
+
+
+def run_sam2(img, height_cm, annotate=None, return_mask=False, deadline=None):
+    """SAM2 segmentation, then MediaPipe Pose on the cropped person.
+
+    ``annotate`` ("jpeg"/"webp") attaches an encoded preview of the crop with
+    the mask overlay as ``annotated_image``. ``return_mask`` attaches the
+    person mask over the full input image as COCO RLE (``person_mask_rle``).
+    """
+    if not SAM2_AVAILABLE:
+        raise RuntimeError("SAM2 is not available on this deployment")
+
+    # Segment with SAM2
+    segmented_img, mask = segment_person_sam2(None, image=img, return_mask=True, deadline=deadline)
+
+    # Measure with MediaPipe
+    result = measure_person_image(
+        segmented_img,
+        real_height_cm=height_cm,
+        draw=False,  # Don't show plots in API
+        verbose=False,  # Don't print to console
+        mask=mask.crop() if annotate and mask is not None else None,
+        annotate=annotate,
+        deadline=deadline
+    )
+
+    if result is None:
+        return {"ok": False, "error": "No person detected in segmented image"}
+
+    # Convert result to match the expected format
+    formatted = {
+        "ok": True,
+        "height_input_cm": height_cm,
+        "pixel_to_cm": result.get("px_to_cm"),
+        "shoulder_width_cm": result.get("shoulder_width_cm"),
+        "hip_width_cm": result.get("hip_bone_width_cm"),  # Note: different key name
+        "waist_width_cm": result.get("waist_width_cm"),
+        "chest_width_cm": result.get("chest_width_cm"),
+        "torso_slice_widths_cm": result.get("slice_widths_cm"),
+        "slice_fracs": [0.30, 0.40, 0.50, 0.60, 0.70],  # Default slice fractions
+    }
+    if annotate:
+        formatted["annotated_image"] = result["annotated_image"]
+        formatted["annotated_image_format"] = annotate
+    if return_mask and mask is not None:
+        formatted["person_mask_rle"] = mask.rle
+    return formatted
+
+
+# Result fields that scale linearly with the input height (px_to_cm is
+# real_height_cm / effective_height_px in both pipelines)
+HEIGHT_SCALED_FIELDS = (
+    "pixel_to_cm",
+    "shoulder_width_cm",
+    "hip_width_cm",
+    "waist_width_cm",
+    "chest_width_cm",
+)
+
+
+def rescale_result(result, from_height_cm, to_height_cm):
+    """Convert a result measured at ``from_height_cm`` to ``to_height_cm``."""
+    if not result.get("ok") or from_height_cm == to_height_cm:
+        return result
+    ratio = to_height_cm / from_height_cm
+    scaled = dict(result)
+    scaled["height_input_cm"] = to_height_cm
+    for key in HEIGHT_SCALED_FIELDS:
+        if scaled.get(key) is not None:
+            scaled[key] = scaled[key] * ratio
+    if scaled.get("torso_slice_widths_cm") is not None:
+        scaled["torso_slice_widths_cm"] = [w * ratio for w in scaled["torso_slice_widths_cm"]]
+    return scaled
+
+
+def gate_quality(run):
+    """Wrap pipeline ``run`` so the quality gate runs before any inference."""
+    @functools.wraps(run)
+    def gated(img, height_cm, deadline=None, **options):
+        gate = get_quality_gate()
+        if not gate.enabled:
+            return run(img, height_cm, deadline=deadline, **options)
+        check_deadline(deadline, "quality_gate")
+        report = gate.check(img)
+        if report.rejected:
+            return report.rejection()
+        result = dict(run(img, height_cm, deadline=deadline, **options))
+        result["quality"] = report.as_dict()
+        return result
+    return gated
+
+
+PIPELINES = {
+    "direct": gate_quality(run_direct),
+    "sam2": gate_quality(run_sam2),
+}
@@ -0,0 +1,49 @@
+"""
+Pre-fork model sharing for multi-worker deployments (see gunicorn_conf.py).
+
+``load_shared_models()`` runs once in the gunicorn master before workers are
+forked: it fetches the pose model file and loads the SAM2 torch weights, so
+every worker maps the same physical pages copy-on-write instead of holding
+its own copy. ``after_fork()`` runs in each worker and re-creates the state
+that is not fork-safe: MediaPipe graphs (created per worker by the API
+lifespan), torch thread settings, the predictor lock and ONNX Runtime
+sessions.
+
+Configuration (environment):
+    PREFORK_LOAD_SAM2   0 = do not load SAM2 in the master (default 1)
+"""
+
+import gc
+import os
+import time
+
+from measure_person import pose_model_path, reset_pose_landmarker
+
+try:
+    import sam2_runtime
+    from measure_person_sam2 import reset_pose_landmarkers as reset_sam2_pose_landmarkers
+except ImportError:
+    sam2_runtime = None
+
+
+def load_shared_models():
+    """Load model weights in the master process, before workers are forked."""
+    pose_model_path()  # download once; the landmarker itself is created per worker
+    if (sam2_runtime is not None and os.environ.get("PREFORK_LOAD_SAM2", "1") != "0"
+            and sam2_runtime.runtime_config["backend"] == "torch"):
+        t = time.perf_counter()
+        with sam2_runtime.predictor_lock:
+            sam2_runtime.get_predictor()
+        print(f"✅ SAM2 weights loaded in master ({time.perf_counter() - t:.1f}s), shared by workers")
+    # Move everything allocated so far out of the GC's reach, so collections in
+    # the workers do not write to (and thereby copy) the shared pages
+    gc.collect()
+    gc.freeze()
+
+
+def after_fork():
+    """Re-initialise fork-unsafe inference state in a freshly forked worker."""
+    reset_pose_landmarker()
+    if sam2_runtime is not None:
+        reset_sam2_pose_landmarkers()
+        sam2_runtime.after_fork()
@@ -0,0 +1,176 @@
+"""
+Cheap image quality gate run before pose / SAM2 inference.
+
+Failures such as "No person detected" otherwise surface only after full
+pose inference, or after seconds of SAM2 segmentation. The gate measures a
+grayscale thumbnail in a few milliseconds and rejects (or just flags)
+images that are too small, extremely elongated, blurry, or badly exposed:
+
+- resolution: shorter side below QUALITY_MIN_SIDE_PX;
+- aspect: longer / shorter side above QUALITY_MAX_ASPECT;
+- blur: variance of the Laplacian of the thumbnail below QUALITY_MIN_SHARPNESS
+  (computed at a fixed thumbnail size, so it does not depend on resolution);
+- exposure: mean brightness outside QUALITY_MIN_BRIGHTNESS..QUALITY_MAX_BRIGHTNESS,
+  or more than QUALITY_MAX_CLIPPED of the pixels crushed to black / blown to white.
+
+Configuration (environment):
+    QUALITY_GATE            flag (default: measure anyway, report reasons), reject or off
+    QUALITY_MIN_SIDE_PX     Smallest accepted shorter side (default 256)
+    QUALITY_MAX_ASPECT      Largest accepted long/short side ratio (default 4)
+    QUALITY_MIN_SHARPNESS   Smallest accepted Laplacian variance (default 20)
+    QUALITY_MIN_BRIGHTNESS  Darkest accepted mean brightness, 0-255 (default 30)
+    QUALITY_MAX_BRIGHTNESS  Brightest accepted mean brightness, 0-255 (default 230)
+    QUALITY_MAX_CLIPPED     Largest accepted fraction of black or white pixels (default 0.5)
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+GATE_MODES = ("reject", "flag", "off")
+# Longest side of the thumbnail the blur and exposure checks run on
+THUMB_SIDE = 512
+# Pixel values counted as crushed to black / blown to white
+CLIP_LOW, CLIP_HIGH = 5, 250
+
+
+class QualityReport(NamedTuple):
+    """Outcome of the gate for one image; ``reasons`` is empty when it passed."""
+    reasons: list
+    metrics: dict
+    rejected: bool
+
+    def as_dict(self) -> dict:
+        return {"passed": not self.reasons, "rejected": self.rejected, "reasons": self.reasons, **self.metrics}
+
+    def rejection(self) -> dict:
+        """Pipeline result for a rejected image, shaped like MeasurementResponse."""
+        return {
+            "ok": False,
+            "error": "Image quality check failed: " + ", ".join(self.reasons),
+            "quality": self.as_dict(),
+        }
+
+
+class QualityGate:
+    """Checks resolution, aspect, blur and exposure; counts outcomes by reason."""
+
+    def __init__(self, mode="flag", min_side_px=256, max_aspect=4.0, min_sharpness=20.0,
+                 min_brightness=30.0, max_brightness=230.0, max_clipped=0.5):
+        if mode not in GATE_MODES:
+            raise ValueError(f"QUALITY_GATE must be one of {GATE_MODES}, got {mode!r}")
+        self.mode = mode
+        self.min_side_px = min_side_px
+        self.max_aspect = max_aspect
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped = max_clipped
+        self.checked = 0
+        self.rejected = 0
+        self.flagged = 0
+        self.check_s = 0.0
+        self.reasons = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ.get
+        return cls(
+            mode=env("QUALITY_GATE", "flag"),
+            min_side_px=int(env("QUALITY_MIN_SIDE_PX", "256")),
+            max_aspect=float(env("QUALITY_MAX_ASPECT", "4")),
+            min_sharpness=float(env("QUALITY_MIN_SHARPNESS", "20")),
+            min_brightness=float(env("QUALITY_MIN_BRIGHTNESS", "30")),
+            max_brightness=float(env("QUALITY_MAX_BRIGHTNESS", "230")),
+            max_clipped=float(env("QUALITY_MAX_CLIPPED", "0.5")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def measure(self, img) -> dict:
+        """Quality metrics of a BGR (or grayscale) image, from a thumbnail."""
+        h, w = img.shape[:2]
+        scale = THUMB_SIDE / max(h, w)
+        thumb = img
+        if scale < 1.0:
+            size = (max(1, round(w * scale)), max(1, round(h * scale)))
+            # INTER_AREA straight from a 12 MP frame costs tens of ms; a bilinear
+            # resize to twice the size plus an integer 2x area step averages
+            # enough to keep sensor noise from reading as sharpness, in ~5 ms
+            thumb = cv2.resize(img, (2 * size[0], 2 * size[1]), interpolation=cv2.INTER_LINEAR)
+        gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY) if thumb.ndim == 3 else thumb
+        if scale < 1.0:
+            gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+        clipped = np.count_nonzero((gray <= CLIP_LOW) | (gray >= CLIP_HIGH)) / gray.size
+        return {
+            "width": w,
+            "height": h,
+            "aspect": round(max(h, w) / max(1, min(h, w)), 3),
+            "sharpness": round(float(cv2.Laplacian(gray, cv2.CV_64F).var()), 2),
+            "brightness": round(float(gray.mean()), 1),
+            "clipped_fraction": round(clipped, 3),
+        }
+
+    def reasons_for(self, metrics: dict) -> list:
+        reasons = []
+        if min(metrics["width"], metrics["height"]) < self.min_side_px:
+            reasons.append("low_resolution")
+        if metrics["aspect"] > self.max_aspect:
+            reasons.append("extreme_aspect_ratio")
+        if metrics["sharpness"] < self.min_sharpness:
+            reasons.append("blurry")
+        if metrics["brightness"] < self.min_brightness:
+            reasons.append("underexposed")
+        elif metrics["brightness"] > self.max_brightness:
+            reasons.append("overexposed")
+        if metrics["clipped_fraction"] > self.max_clipped and not {"underexposed", "overexposed"} & set(reasons):
+            reasons.append("clipped_exposure")
+        return reasons
+
+    def check(self, img) -> QualityReport:
+        """Measure ``img`` and count the outcome; ``rejected`` is only set in reject mode."""
+        t = time.perf_counter()
+        metrics = self.measure(img)
+        reasons = self.reasons_for(metrics)
+        elapsed = time.perf_counter() - t
+        metrics["check_ms"] = round(elapsed * 1000.0, 2)
+        rejected = bool(reasons) and self.mode == "reject"
+        with self._lock:
+            self.checked += 1
+            self.check_s += elapsed
+            self.reasons.update(reasons)
+            if rejected:
+                self.rejected += 1
+            elif reasons:
+                self.flagged += 1
+        return QualityReport(reasons, metrics, rejected)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "checked": self.checked,
+                "rejected": self.rejected,
+                "flagged": self.flagged,
+                "reasons": dict(sorted(self.reasons.items())),
+                "mean_check_ms": round(self.check_s / self.checked * 1000.0, 2) if self.checked else None,
+            }
+
+
+_quality_gate = None
+
+
+def get_quality_gate():
+    """Process-wide gate configured from the environment on first use."""
+    global _quality_gate
+    if _quality_gate is None:
+        _quality_gate = QualityGate.from_env()
+    return _quality_gate
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Deterministic replay of a captured traffic corpus (see traffic_capture.py).
+
+`replay` resends every captured request to a server, preserving the original
+inter-arrival gaps (optionally sped up), and records latency and the
+measurement output. `compare` diffs two replay runs, e.g. the current build
+against a candidate build, for both latency and numerical drift.
+
+Usage:
+    python replay_traffic.py replay /data/capture --url http://localhost:8000 --out baseline.jsonl
+    python replay_traffic.py replay /data/capture --url http://localhost:8001 --speed 4 --out candidate.jsonl
+    python replay_traffic.py compare baseline.jsonl candidate.jsonl --tolerance-cm 0.5
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from load_test import summarize
+from traffic_capture import load_corpus, object_path
+
+# Compared with an absolute tolerance in cm
+MEASUREMENT_FIELDS = [
+    "shoulder_width_cm",
+    "hip_width_cm",
+    "waist_width_cm",
+    "chest_width_cm",
+]
+# cm per pixel (~0.3): compared with a relative tolerance instead
+SCALE_FIELD = "pixel_to_cm"
+
+
+def replay(corpus_dir, url, speed=1.0, concurrency=8, timeout=120.0):
+    """Resend the corpus and return one result dict per captured request.
+
+    ``speed`` scales the original arrival rate (2.0 = twice as fast);
+    ``speed=0`` sends as fast as ``concurrency`` allows.
+    """
+    records = load_corpus(corpus_dir)
+    local = threading.local()
+    results = []
+    lock = threading.Lock()
+
+    def send(record, scheduled_at):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        with open(object_path(corpus_dir, record["sha256"]), "rb") as f:
+            image_bytes = f.read()
+        status = None
+        body = None
+        try:
+            response = session.post(
+                f"{url.rstrip('/')}{record['endpoint']}",
+                files={"file": ("replay.jpg", image_bytes, "application/octet-stream")},
+                data={"height_cm": record["height_cm"]},
+                headers={"X-Replay": "1"},  # keeps replays out of the server's own capture
+                timeout=timeout,
+            )
+            status = response.status_code
+            try:
+                body = response.json()
+            except ValueError:
+                body = {"raw": response.text[:200]}
+        except requests.exceptions.RequestException as e:
+            body = {"error": str(e)}
+        latency_ms = (time.perf_counter() - scheduled_at) * 1000.0
+        with lock:
+            results.append({
+                "seq": record["seq"],
+                "endpoint": record["endpoint"],
+                "sha256": record["sha256"],
+                "height_cm": record["height_cm"],
+                "status": status,
+                "latency_ms": latency_ms,
+                "response": body,
+            })
+
+    if not records:
+        return results, 0.0
+    start = time.perf_counter()
+    first_arrival = records[0]["arrival_time"]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for record in records:
+            offset = (record["arrival_time"] - first_arrival) / speed if speed > 0 else 0.0
+            scheduled_at = start + offset
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, record, scheduled_at)
+    elapsed = time.perf_counter() - start
+    results.sort(key=lambda r: r["seq"])
+    return results, elapsed
+
+
+def load_run(path):
+    with open(path) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    meta = lines[0] if lines and lines[0].get("type") == "meta" else {}
+    results = [r for r in lines if r.get("type") != "meta"]
+    return meta, results
+
+
+def compare_runs(baseline, candidate, tolerance_cm=0.5, tolerance_scale=0.01):
+    """Latency summaries and per-request measurement drift between two runs.
+
+    Widths drift by their absolute difference in cm; the pixel_to_cm scale
+    by its difference relative to the baseline.
+    """
+    base_meta, base_results = baseline
+    cand_meta, cand_results = candidate
+    by_seq = {r["seq"]: r for r in cand_results}
+
+    drifted = []
+    status_mismatch = 0
+    max_drift = 0.0
+    max_scale_drift = 0.0
+    compared = 0
+    for base in base_results:
+        cand = by_seq.get(base["seq"])
+        if cand is None:
+            continue
+        base_body = base.get("response") or {}
+        cand_body = cand.get("response") or {}
+        if base["status"] != cand["status"] or base_body.get("ok") != cand_body.get("ok"):
+            status_mismatch += 1
+            continue
+        if base["status"] != 200 or not base_body.get("ok"):
+            continue
+        compared += 1
+        diffs = {}
+        for field in MEASUREMENT_FIELDS:
+            a, b = base_body.get(field), cand_body.get(field)
+            if a is None or b is None:
+                continue
+            diffs[field] = abs(a - b)
+        worst = max(diffs.values()) if diffs else 0.0
+        max_drift = max(max_drift, worst)
+        scale_drift = 0.0
+        a, b = base_body.get(SCALE_FIELD), cand_body.get(SCALE_FIELD)
+        if a and b is not None:
+            scale_drift = abs(b - a) / abs(a)
+            diffs[f"{SCALE_FIELD}_rel"] = round(scale_drift, 4)
+        max_scale_drift = max(max_scale_drift, scale_drift)
+        if worst > tolerance_cm or scale_drift > tolerance_scale:
+            drifted.append({"seq": base["seq"], "sha256": base["sha256"], "diffs": diffs})
+
+    return {
+        "baseline": summarize(base_results, base_meta.get("elapsed_s", 0.0)),
+        "candidate": summarize(cand_results, cand_meta.get("elapsed_s", 0.0)),
+        "compared": compared,
+        "status_mismatch": status_mismatch,
+        "max_drift": round(max_drift, 4),
+        "max_scale_drift": round(max_scale_drift, 4),
+        "drifted": drifted,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay and compare captured API traffic")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_replay = sub.add_parser("replay", help="Resend a captured corpus to a server")
+    p_replay.add_argument("corpus", help="Capture directory (CAPTURE_DIR)")
+    p_replay.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    p_replay.add_argument("--speed", type=float, default=1.0,
+                          help="Arrival rate multiplier (1 = original, 0 = as fast as possible)")
+    p_replay.add_argument("--concurrency", type=int, default=8, help="Max in-flight requests")
+    p_replay.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout (s)")
+    p_replay.add_argument("--out", required=True, help="Output JSONL with one result per request")
+
+    p_compare = sub.add_parser("compare", help="Compare two replay runs")
+    p_compare.add_argument("baseline", help="Replay output of the reference build")
+    p_compare.add_argument("candidate", help="Replay output of the build under test")
+    p_compare.add_argument("--tolerance-cm", type=float, default=0.5,
+                           help="Max allowed absolute difference per width measurement")
+    p_compare.add_argument("--tolerance-scale", type=float, default=0.01,
+                           help="Max allowed relative difference of pixel_to_cm (0.01 = 1%%)")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        print(f"🔄 Replaying {args.corpus} against {args.url} (speed={args.speed})...")
+        results, elapsed = replay(args.corpus, args.url, speed=args.speed,
+                                  concurrency=args.concurrency, timeout=args.timeout)
+        with open(args.out, "w") as f:
+            meta = {"type": "meta", "url": args.url, "speed": args.speed, "elapsed_s": elapsed}
+            f.write(json.dumps(meta) + "\n")
+            for r in results:
+                f.write(json.dumps(r) + "\n")
+        s = summarize(results, elapsed)
+        print(f"✅ {s['requests']} requests in {elapsed:.1f}s: rps={s['throughput_rps']} "
+              f"p50={s['p50_ms']}ms p95={s['p95_ms']}ms p99={s['p99_ms']}ms "
+              f"err={s['error_rate']:.1%} 5xx={s['5xx_rate']:.1%}")
+        print(f"Saved results to {args.out}")
+        return
+
+    report = compare_runs(load_run(args.baseline), load_run(args.candidate),
+                          tolerance_cm=args.tolerance_cm, tolerance_scale=args.tolerance_scale)
+    print("📊 LATENCY")
+    for name in ("baseline", "candidate"):
+        s = report[name]
+        print(f"  {name:<10} p50={s['p50_ms']}ms p95={s['p95_ms']}ms p99={s['p99_ms']}ms "
+              f"rps={s['throughput_rps']} err={s['error_rate']:.1%}")
+    print("📏 NUMERICAL DRIFT")
+    print(f"  compared        : {report['compared']}")
+    print(f"  status mismatch : {report['status_mismatch']}")
+    print(f"  max drift       : {report['max_drift']} cm")
+    print(f"  max scale drift : {report['max_scale_drift']:.2%} (pixel_to_cm)")
+    print(f"  over tolerance  : {len(report['drifted'])} "
+          f"(> {args.tolerance_cm} cm or > {args.tolerance_scale:.1%} scale)")
+    for d in report["drifted"][:10]:
+        print(f"    seq={d['seq']} {d['sha256'][:12]} {d['diffs']}")
+    if report["drifted"] or report["status_mismatch"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+ONNX Runtime predictor for SAM 2 (image encoder + prompt/mask decoder).
+
+Drop-in replacement for ``SAM2ImagePredictor`` as used by
+``segment_person_sam2``: ``set_image(image_rgb)`` runs the encoder once,
+``predict(point_coords, point_labels, multimask_output)`` runs the decoder.
+Point prompts may be ``(N, 2)`` (one prompt) or ``(B, N, 2)`` (a batch of
+prompts decoded in a single call), exactly like the torch predictor.
+
+The graphs are produced by ``export_sam2_onnx.py``.
+"""
+
+import os
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+ENCODER_FILE = "sam2_encoder.onnx"
+DECODER_FILE = "sam2_decoder.onnx"
+
+IMAGE_SIZE = 1024
+PIXEL_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+PIXEL_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+MASK_THRESHOLD = 0.0
+
+
+def int8_file(name):
+    """File name of the int8-quantized variant of a graph (export_sam2_onnx.py --int8)."""
+    return name.replace(".onnx", ".int8.onnx")
+
+
+def preprocess(image_rgb, image_size=IMAGE_SIZE):
+    """RGB uint8 HxWx3 -> normalised 1x3xSxS float32, as SAM2Transforms does."""
+    h, w = image_rgb.shape[:2]
+    interp = cv2.INTER_AREA if max(h, w) > image_size else cv2.INTER_LINEAR
+    resized = cv2.resize(image_rgb, (image_size, image_size), interpolation=interp)
+    x = (resized.astype(np.float32) / 255.0 - PIXEL_MEAN) / PIXEL_STD
+    return np.ascontiguousarray(x.transpose(2, 0, 1)[None])
+
+
+class ONNXSAM2Predictor:
+    """SAM 2 image predictor backed by ONNX Runtime sessions."""
+
+    def __init__(self, model_dir, threads=None, encoder_file=ENCODER_FILE, decoder_file=DECODER_FILE):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        providers = ["CPUExecutionProvider"]
+        self.model_paths = [os.path.join(model_dir, encoder_file), os.path.join(model_dir, decoder_file)]
+        self.encoder = ort.InferenceSession(self.model_paths[0], options, providers=providers)
+        self.decoder = ort.InferenceSession(self.model_paths[1], options, providers=providers)
+        meta = self.decoder.get_modelmeta().custom_metadata_map
+        self.stability_delta = float(meta.get("stability_delta", 0.05))
+        self.stability_thresh = float(meta.get("stability_thresh", 0.98))
+        self._features = None
+        self._orig_hw = None
+
+    def set_image(self, image):
+        """Encode an RGB uint8 image; features are kept for ``predict``."""
+        self._orig_hw = image.shape[:2]
+        image_embed, feat_s0, feat_s1 = self.encoder.run(None, {"image": preprocess(image)})
+        self._features = {"image_embed": image_embed, "high_res_feat_0": feat_s0, "high_res_feat_1": feat_s1}
+
+    def reset_predictor(self):
+        self._features = None
+        self._orig_hw = None
+
+    def _select(self, masks, iou, multimask_output):
+        """Pick output tokens like SAM2's MaskDecoder.forward (all 4 tokens in)."""
+        if multimask_output:
+            return masks[:, 1:], iou[:, 1:]
+        # Single mask: token 0 unless unstable, then the best multimask token
+        single, single_iou = masks[:, :1], iou[:, :1]
+        flat = single.reshape(single.shape[0], -1)
+        area_i = (flat > self.stability_delta).sum(-1)
+        area_u = (flat > -self.stability_delta).sum(-1)
+        stable = np.where(area_u > 0, area_i / np.maximum(area_u, 1), 1.0) >= self.stability_thresh
+        best = np.argmax(iou[:, 1:], axis=-1) + 1
+        rows = np.arange(masks.shape[0])
+        out_masks = np.where(stable[:, None, None, None], single, masks[rows, best][:, None])
+        out_iou = np.where(stable[:, None], single_iou, iou[rows, best][:, None])
+        return out_masks, out_iou
+
+    def predict(self, point_coords, point_labels, multimask_output=True, return_logits=False,
+                normalize_coords=True):
+        """Decode masks for point prompts in original-image pixel coordinates.
+
+        Returns ``(masks, iou_predictions, low_res_masks)`` with the same shapes
+        as ``SAM2ImagePredictor.predict``: ``(C, H, W)`` for ``(N, 2)`` points,
+        ``(B, C, H, W)`` for ``(B, N, 2)``.
+        """
+        if self._features is None:
+            raise RuntimeError("An image must be set with .set_image(...) before mask prediction.")
+        coords = np.asarray(point_coords, dtype=np.float32)
+        labels = np.asarray(point_labels, dtype=np.float32)
+        unbatched = coords.ndim == 2
+        if unbatched:
+            coords, labels = coords[None], labels[None]
+        h, w = self._orig_hw
+        if normalize_coords:
+            coords = coords / np.array([w, h], dtype=np.float32) * IMAGE_SIZE
+
+        low_res, iou = self.decoder.run(None, {**self._features, "point_coords": coords, "point_labels": labels})
+        low_res, iou = self._select(low_res, iou, multimask_output)
+
+        b, c = low_res.shape[:2]
+        # Bilinear, half-pixel centres: matches F.interpolate(align_corners=False)
+        planes = low_res.reshape(b * c, *low_res.shape[2:])
+        masks = np.stack([cv2.resize(p, (w, h), interpolation=cv2.INTER_LINEAR) for p in planes])
+        masks = masks.reshape(b, c, h, w)
+        if not return_logits:
+            masks = (masks > MASK_THRESHOLD).astype(np.float32)
+        low_res = np.clip(low_res, -32.0, 32.0)
+        if unbatched:
+            return masks[0], iou[0], low_res[0]
+        return masks, iou, low_res
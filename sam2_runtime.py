@@ -0,0 +1,313 @@
+"""
+SAM 2 model runtime: configuration, cached predictor and inference context.
+
+The predictor is built once per process and reused; segmentation runs under
+`torch.inference_mode()` (no autograd bookkeeping) and, optionally, bfloat16
+autocast. The predictor keeps per-image state between `set_image` and
+`predict`, so callers must hold `predictor_lock` across both.
+
+`get_video_predictor()` returns a SAM2VideoPredictor for clip segmentation
+(torch backend only). It keeps no per-clip state itself (that lives in the
+inference state dict of each clip), so it needs no lock while in use.
+
+Configuration (environment, read at import; override with `configure()`):
+    SAM2_TORCH_THREADS   Intra-op threads per process (default: torch default,
+                         i.e. every core; set to cores / workers when several
+                         workers share a host)
+    SAM2_BF16            1 = bfloat16 autocast on CPU
+    SAM2_COMPILE         1 = torch.compile the image encoder
+    SAM2_INT8            1 = int8 weights: dynamic quantization of the Linear layers
+                         (torch) or the *.int8.onnx graphs (onnx); overrides bf16
+    SAM2_BACKEND         "torch" (default) or "onnx" (ONNX Runtime graphs from
+                         export_sam2_onnx.py; bf16/compile do not apply)
+    SAM2_ONNX_DIR        Directory holding the exported graphs (default sam2_onnx)
+    SAM2_WEIGHTS         Torch weights file (default SAM2_CHECKPOINT); a .safetensors
+                         file from convert_sam2_weights.py is memory-mapped instead
+                         of unpickled into process memory
+"""
+
+import contextlib
+import ctypes
+import gc
+import os
+import threading
+import time
+
+import torch
+from sam2.build_sam import build_sam2, build_sam2_video_predictor
+from sam2.sam2_image_predictor import SAM2ImagePredictor
+
+# SAM 2 checkpoint - update this path based on your downloaded model
+SAM2_CHECKPOINT = "sam2.1_hiera_small.pt"
+SAM2_CONFIG = "configs/sam2.1/sam2.1_hiera_s.yaml"
+
+
+def _env_flag(name):
+    return os.environ.get(name, "0").lower() in ("1", "true", "yes")
+
+
+BACKENDS = ("torch", "onnx")
+
+runtime_config = {
+    "threads": int(os.environ.get("SAM2_TORCH_THREADS", "0")) or None,
+    "bf16": _env_flag("SAM2_BF16"),
+    "compile": _env_flag("SAM2_COMPILE"),
+    "int8": _env_flag("SAM2_INT8"),
+    "backend": os.environ.get("SAM2_BACKEND", "torch"),
+    "onnx_dir": os.environ.get("SAM2_ONNX_DIR", "sam2_onnx"),
+    "weights": os.environ.get("SAM2_WEIGHTS", SAM2_CHECKPOINT),
+}
+
+if runtime_config["backend"] not in BACKENDS:
+    raise ValueError(f"Unknown SAM2 backend: {runtime_config['backend']} (SAM2_BACKEND must be one of {BACKENDS})")
+
+predictor_lock = threading.Lock()
+_predictor_cache = None
+_video_predictor_cache = None
+_predictor_bytes = 0
+_last_used = None
+lifecycle_counters = {"loads": 0, "unloads": 0, "last_load_s": None}
+# True in a forked worker whose predictor holds the master's weights copy-on-write
+shared_weights = False
+
+
+def configure(**overrides):
+    """Update runtime settings; the predictor is rebuilt on next use."""
+    global _predictor_cache, _video_predictor_cache
+    unknown = set(overrides) - set(runtime_config)
+    if unknown:
+        raise ValueError(f"Unknown SAM2 runtime settings: {sorted(unknown)}")
+    backend = overrides.get("backend", runtime_config["backend"])
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown SAM2 backend: {backend}")
+    with predictor_lock:
+        runtime_config.update(overrides)
+        _predictor_cache = None
+        _video_predictor_cache = None
+
+
+def _release_freed_memory():
+    """Hand freed heap pages (e.g. replaced float weights) back to the OS."""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass  # not glibc
+
+
+@contextlib.contextmanager
+def _skip_weight_init():
+    """Make torch.nn.init's in-place initialisers no-ops while building a model."""
+    names = [n for n in dir(torch.nn.init) if n.endswith("_") and not n.startswith("_")]
+    saved = {n: getattr(torch.nn.init, n) for n in names}
+    for n in names:
+        setattr(torch.nn.init, n, lambda tensor, *args, **kwargs: tensor)
+    try:
+        yield
+    finally:
+        for n, fn in saved.items():
+            setattr(torch.nn.init, n, fn)
+
+
+def load_sam2_model(weights):
+    """Build the SAM 2 model on CPU from a .pt checkpoint or a .safetensors file.
+
+    Safetensors weights are memory-mapped and assigned to the model without
+    a copy: pages are read from the file on first use, shared with other
+    processes through the page cache, and never duplicated in anonymous
+    memory while loading.
+    """
+    if not weights.endswith(".safetensors"):
+        return build_sam2(SAM2_CONFIG, weights, device='cpu')
+    from safetensors.torch import load_file
+    # Every parameter is replaced by the strict load below, so skip random init
+    with _skip_weight_init():
+        sam2_model = build_sam2(SAM2_CONFIG, None, device='cpu')
+    sam2_model.load_state_dict(load_file(weights), strict=True, assign=True)
+    # The uninitialised parameters replaced above are garbage now
+    _release_freed_memory()
+    return sam2_model
+
+
+def _load_state_dict(weights):
+    if weights.endswith(".safetensors"):
+        from safetensors.torch import load_file
+        return load_file(weights)
+    return torch.load(weights, map_location="cpu", weights_only=True)["model"]
+
+
+def require_video_backend():
+    """Raise unless the configured backend can build the video predictor."""
+    if runtime_config["backend"] != "torch":
+        raise RuntimeError("Clip segmentation needs the torch backend (SAM2_BACKEND=torch)")
+
+
+def build_video_predictor():
+    """Build a SAM2VideoPredictor according to ``runtime_config`` (torch backend only).
+
+    The video predictor is another module class over the same weights. When
+    the image predictor is loaded as plain float weights, its tensors are
+    assigned to the video model, so both share one copy; otherwise the
+    weights file is loaded. Call with ``predictor_lock`` held.
+    """
+    require_video_backend()
+    if runtime_config["threads"]:
+        torch.set_num_threads(runtime_config["threads"])
+    with _skip_weight_init():
+        video_predictor = build_sam2_video_predictor(SAM2_CONFIG, None, device="cpu")
+    image_model = getattr(_predictor_cache, "model", None)
+    if image_model is not None and not (runtime_config["int8"] or runtime_config["compile"]):
+        state = image_model.state_dict()
+    else:
+        state = _load_state_dict(runtime_config["weights"])
+    # Weights of a model built under inference_mode are inference tensors, which
+    # can only be assigned (and given requires_grad) in inference mode
+    with torch.inference_mode():
+        video_predictor.load_state_dict(state, strict=True, assign=True)
+    del state
+    _release_freed_memory()
+    video_predictor.eval()
+    if runtime_config["int8"]:
+        torch.ao.quantization.quantize_dynamic(video_predictor, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        _release_freed_memory()
+    return video_predictor
+
+
+def get_video_predictor():
+    """Return the process-wide video predictor, building it on first use."""
+    global _video_predictor_cache, _last_used
+    with predictor_lock:
+        if _video_predictor_cache is None:
+            _video_predictor_cache = build_video_predictor()
+        _last_used = time.monotonic()
+        return _video_predictor_cache
+
+
+def build_predictor():
+    """Build a new predictor according to ``runtime_config``."""
+    if runtime_config["backend"] == "onnx":
+        from sam2_onnx import DECODER_FILE, ENCODER_FILE, ONNXSAM2Predictor, int8_file
+        files = {}
+        if runtime_config["int8"]:
+            files = {"encoder_file": int8_file(ENCODER_FILE), "decoder_file": int8_file(DECODER_FILE)}
+        return ONNXSAM2Predictor(runtime_config["onnx_dir"], threads=runtime_config["threads"], **files)
+    if runtime_config["backend"] != "torch":
+        raise ValueError(f"Unknown SAM2 backend: {runtime_config['backend']}")
+    if runtime_config["threads"]:
+        torch.set_num_threads(runtime_config["threads"])
+    sam2_model = load_sam2_model(runtime_config["weights"])
+    sam2_model.eval()
+    if runtime_config["int8"]:
+        # Linear layers dominate the Hiera encoder and the mask decoder transformer
+        torch.ao.quantization.quantize_dynamic(sam2_model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        _release_freed_memory()
+    if runtime_config["compile"]:
+        sam2_model.image_encoder = torch.compile(sam2_model.image_encoder)
+    return SAM2ImagePredictor(sam2_model)
+
+
+def get_predictor():
+    """Return the process-wide predictor, building it on first use.
+
+    Call with ``predictor_lock`` held.
+    """
+    global _predictor_cache, _predictor_bytes, _last_used
+    if _predictor_cache is None:
+        t = time.perf_counter()
+        _predictor_cache = build_predictor()
+        _predictor_bytes = predictor_memory_bytes(_predictor_cache)
+        lifecycle_counters["loads"] += 1
+        lifecycle_counters["last_load_s"] = time.perf_counter() - t
+    _last_used = time.monotonic()
+    return _predictor_cache
+
+
+def _tensor_bytes(value):
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(v) for v in value)
+    return 0
+
+
+def predictor_memory_bytes(predictor):
+    """Size of the model weights held by ``predictor`` (torch or ONNX)."""
+    if hasattr(predictor, "model"):
+        # Quantized Linear layers keep (weight, bias) tuples in their state dict
+        return sum(_tensor_bytes(v) for v in predictor.model.state_dict().values())
+    return sum(os.path.getsize(path) for path in getattr(predictor, "model_paths", ()))
+
+
+def is_loaded():
+    return _predictor_cache is not None
+
+
+def idle_seconds():
+    """Seconds since the predictor was last handed out (None if never used)."""
+    return None if _last_used is None else time.monotonic() - _last_used
+
+
+def loaded_model_bytes():
+    return _predictor_bytes if _predictor_cache is not None else 0
+
+
+def unload(blocking=False):
+    """Drop the cached predictor and return its memory to the OS.
+
+    Without ``blocking``, gives up (returns False) if a segmentation is
+    running; the next ``get_predictor()`` rebuilds the model.
+    """
+    global _predictor_cache, _video_predictor_cache, _predictor_bytes
+    if not predictor_lock.acquire(blocking=blocking):
+        return False
+    try:
+        if _predictor_cache is None:
+            return False
+        _predictor_cache = None
+        # It may share the image predictor's weights; drop it so they are freed
+        _video_predictor_cache = None
+        _predictor_bytes = 0
+        lifecycle_counters["unloads"] += 1
+    finally:
+        predictor_lock.release()
+    _release_freed_memory()
+    return True
+
+
+def after_fork():
+    """Re-initialise per-process state in a forked worker.
+
+    Torch weights loaded before the fork stay shared copy-on-write; the lock,
+    the thread pool and the predictor's per-image state are reset. ONNX
+    Runtime sessions own thread pools that do not survive fork, so the ONNX
+    predictor is rebuilt on first use.
+    """
+    global predictor_lock, _predictor_cache, _last_used, shared_weights
+    predictor_lock = threading.Lock()
+    if runtime_config["threads"]:
+        torch.set_num_threads(runtime_config["threads"])
+    if _predictor_cache is not None:
+        if runtime_config["backend"] == "onnx":
+            _predictor_cache = None
+        else:
+            _predictor_cache.reset_predictor()
+            _last_used = time.monotonic()
+            shared_weights = True
+
+
+def prefetch():
+    """Load the predictor on a background thread if it is not loaded."""
+    def load():
+        with predictor_lock:
+            get_predictor()
+    if _predictor_cache is None:
+        threading.Thread(target=load, name="sam2-prefetch", daemon=True).start()
+
+
+def inference_context():
+    """Context for SAM2 forward passes: inference mode plus optional bf16 autocast."""
+    stack = contextlib.ExitStack()
+    stack.enter_context(torch.inference_mode())
+    if runtime_config["bf16"] and not runtime_config["int8"] and runtime_config["backend"] == "torch":
+        stack.enter_context(torch.autocast("cpu", dtype=torch.bfloat16))
+    return stack
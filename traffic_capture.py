@@ -0,0 +1,126 @@
+"""
+Opt-in production traffic capture for the measurement API.
+
+Capture is off unless CAPTURE_DIR is set:
+    CAPTURE_DIR=/data/capture        # corpus directory
+    CAPTURE_SAMPLE_RATE=0.05         # fraction of requests to store (default 1.0)
+
+Requests are handed to a background writer (``submit``), so hashing and disk
+writes never run on the request path; when the writer falls behind, or a
+write fails, the request is simply not captured.
+
+Corpus layout:
+    <CAPTURE_DIR>/objects/<sha256>.bin   # uploaded image bytes, content-addressed
+    <CAPTURE_DIR>/requests.jsonl         # one line per sampled request
+
+Replay a corpus with replay_traffic.py.
+"""
+
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Optional
+
+
+class TrafficCapture:
+    """Samples requests into a local content-addressed corpus."""
+
+    def __init__(self, directory: str, sample_rate: float = 1.0, max_pending: int = 32):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.objects_dir = os.path.join(directory, "objects")
+        self.index_path = os.path.join(directory, "requests.jsonl")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self.captured = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["TrafficCapture"]:
+        """Build from CAPTURE_DIR / CAPTURE_SAMPLE_RATE, or None when disabled."""
+        directory = os.environ.get("CAPTURE_DIR")
+        if not directory:
+            return None
+        return cls(directory, float(os.environ.get("CAPTURE_SAMPLE_RATE", "1.0")))
+
+    def object_path(self, digest: str) -> str:
+        return object_path(self.directory, digest)
+
+    def submit(self, endpoint: str, image_bytes: bytes, height_cm: float,
+               arrival_time: Optional[float] = None):
+        """Queue the request for the background writer if sampled; never blocks or raises."""
+        if random.random() >= self.sample_rate:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+                self._thread.start()
+        arrival_time = arrival_time if arrival_time is not None else time.time()
+        try:
+            self._queue.put_nowait((endpoint, image_bytes, height_cm, arrival_time))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            endpoint, image_bytes, height_cm, arrival_time = self._queue.get()
+            try:
+                self.capture(endpoint, image_bytes, height_cm, arrival_time)
+                self.captured += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"⚠️  Traffic capture write failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "directory": self.directory,
+            "captured": self.captured,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "pending": self._queue.qsize(),
+        }
+
+    def capture(self, endpoint: str, image_bytes: bytes, height_cm: float,
+                arrival_time: Optional[float] = None) -> str:
+        """Store the request; returns the image digest."""
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(image_bytes)
+            os.replace(tmp_path, path)
+        record = {
+            "arrival_time": arrival_time if arrival_time is not None else time.time(),
+            "endpoint": endpoint,
+            "height_cm": height_cm,
+            "sha256": digest,
+            "size_bytes": len(image_bytes),
+        }
+        with self._lock:
+            with open(self.index_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        return digest
+
+
+def object_path(directory: str, digest: str) -> str:
+    """Path of a captured image in the corpus at ``directory``."""
+    return os.path.join(directory, "objects", f"{digest}.bin")
+
+
+def load_corpus(directory: str) -> list:
+    """Read the corpus index sorted by arrival time."""
+    with open(os.path.join(directory, "requests.jsonl")) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda r: r["arrival_time"])
+    for seq, record in enumerate(records):
+        record["seq"] = seq
+    return records